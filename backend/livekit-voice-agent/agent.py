@@ -6,28 +6,67 @@ from livekit.plugins import noise_cancellation, silero, cartesia, openai
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
 from datetime import datetime, timedelta
 import asyncio
+import json
+import os
+import time
+import uuid
 
 # Import LangGraph components for tool workflow
 import operator
-from typing import Annotated, TypedDict, cast
-from langchain_core.messages import AnyMessage, HumanMessage, SystemMessage, ToolMessage, AIMessage
+from typing import Annotated, Optional, TypedDict, cast
+from langchain_core.messages import AnyMessage, HumanMessage, ToolMessage, AIMessage
+from langchain_core.runnables import RunnableConfig
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.config import get_stream_writer
 from langgraph.graph import END, StateGraph
-from tools.flights_finder import flights_finder, FlightsInput
-from tools.hotels_finder import hotels_finder, HotelsInput
+from tools.agent_tools import (
+    fare_matrix, filter_flights, filter_hotels, flights_finder, hotels_finder, more_results, plan_itinerary,
+    result_details, watch_price,
+)
+from tools.results import compact_result
 from pydantic import BaseModel
+from checkpointer import BoundedMemorySaver
+from streaming import message_text, stream_graph
+from context import ContextStats, ContextWindow, estimate_tokens
+from metrics import METRICS_MULTIPROC_DIR, METRICS_PORT, record_voice_metrics, span, timed
+from prefetch import Prefetcher
+from fastpath import FastPathRouter
+from price_watch import aend_room_watches
+from turns import Turn, TurnManager
 
 load_dotenv(".env.local")
 
+# Upper bound for a single tool call before it is reported as timed out
+TOOL_TIMEOUT = float(os.getenv('TOOL_TIMEOUT', '30'))
+# Speak and publish replies sentence by sentence instead of once the graph finishes
+STREAM_RESPONSES = os.getenv('STREAM_RESPONSES', '1') == '1'
+
 
 # Define state for LangGraph
 class AgentState(TypedDict):
     messages: Annotated[list[AnyMessage], operator.add]
+    # Rolling summary of turns that no longer fit the context window
+    summary: str
+    # Index of the first message not yet folded into the summary
+    summarized_upto: int
 
 
 # Define tools and system prompts
-TOOLS = [flights_finder, hotels_finder]
+TOOLS = [flights_finder, hotels_finder, fare_matrix, result_details, more_results, filter_flights, filter_hotels,
+         watch_price, plan_itinerary]
+
+# Progress messages sent to the user while a tool runs
+TOOL_STATUS = {
+    'flights_finder': 'Searching flights…',
+    'hotels_finder': 'Searching hotels…',
+    'fare_matrix': 'Comparing fares across your dates…',
+    'result_details': 'Looking up the details…',
+    'more_results': 'Getting more options…',
+    'filter_flights': 'Narrowing down the flights…',
+    'filter_hotels': 'Narrowing down the hotels…',
+    'watch_price': 'Setting up a price watch…',
+    'plan_itinerary': 'Planning your itinerary…',
+}
 
 TOOLS_SYSTEM_PROMPT = """You are a professional Travel Assistant AI. Your role is to help users plan their trips, provide travel recommendations, and assist with travel-related inquiries.
 
@@ -65,6 +104,10 @@ Your conversation should follow this professional workflow:
 5. BOOKING ASSISTANCE
    - Help compare flight options and prices using the flights_finder tool when specific airports and dates are provided
    - Suggest accommodation options using the hotels_finder tool when specific locations and dates are provided
+   - When the user wants more options from a search, page through it with the more_results tool instead of searching again
+   - For follow-ups like "cheapest nonstop", "arrive before 6pm", "business class" or "4-star under $200", narrow down the earlier search with the filter_flights or filter_hotels tool instead of searching again
+   - For trips through several cities, plan all flights and hotels at once with the plan_itinerary tool instead of searching each leg and stay separately
+   - When the user wants to hear about price changes ("let me know if this fare drops"), set up a watch with the watch_price tool using the same search parameters
    - Recommend travel insurance options
    - Provide links to trusted booking platforms
 
@@ -108,27 +151,62 @@ EMAILS_SYSTEM_PROMPT = """Format the travel information as a clear response for
 
 
 class TravelAgent:
-    def __init__(self):
+    def __init__(self, tools=None, tool_timeout: float = TOOL_TIMEOUT, checkpointer=None, llm=None,
+                 context_window: Optional[ContextWindow] = None, prefetcher: Optional[Prefetcher] = None,
+                 router: Optional[FastPathRouter] = None):
+        tools = tools or TOOLS
         # Use the tool name attribute for consistent access
-        self._tools = {t.name: t for t in TOOLS}
-        # Get Google API key from environment variables
-        import os
-        api_key = os.getenv('GOOGLE_API_KEY')
-        if not api_key:
-            raise ValueError('GOOGLE_API_KEY environment variable is not set')
-        self._tools_llm = ChatGoogleGenerativeAI(model='gemini-1.5-flash', google_api_key=api_key).bind_tools(TOOLS)
+        self._tools = {t.name: t for t in tools}
+        self.tool_timeout = tool_timeout
+        if llm is None:
+            # Get Google API key from environment variables
+            api_key = os.getenv('GOOGLE_API_KEY')
+            if not api_key:
+                raise ValueError('GOOGLE_API_KEY environment variable is not set')
+            llm = ChatGoogleGenerativeAI(model='gemini-1.5-flash', google_api_key=api_key)
+        self._tools_llm = llm.bind_tools(tools)
+        self.context_window = context_window or ContextWindow()
+        self.context_stats = ContextStats()
+        # Speculative searches started from what the conversation has revealed so far
+        self.prefetcher = prefetcher or Prefetcher()
+        # Fully specified searches skip the LLM's tool-calling round trip
+        self.router = router or FastPathRouter()
 
         builder = StateGraph(AgentState)
-        builder.add_node('call_tools_llm', self.call_tools_llm)
-        builder.add_node('invoke_tools', self.invoke_tools)
-        builder.add_node('format_response', self.format_response)
-        builder.set_entry_point('call_tools_llm')
+        builder.add_node('fast_path', timed('node', 'fast_path')(self.fast_path))
+        builder.add_node('call_tools_llm', timed('node', 'call_tools_llm')(self.call_tools_llm))
+        builder.add_node('invoke_tools', timed('node', 'invoke_tools')(self.invoke_tools))
+        builder.add_node('format_response', timed('node', 'format_response')(self.format_response))
+        builder.set_entry_point('fast_path')
 
+        builder.add_conditional_edges('fast_path', self.exists_action, {'more_tools': 'invoke_tools', 'format_response': 'call_tools_llm'})
         builder.add_conditional_edges('call_tools_llm', self.exists_action, {'more_tools': 'invoke_tools', 'format_response': 'format_response'})
         builder.add_edge('invoke_tools', 'call_tools_llm')
         builder.add_edge('format_response', END)
-        memory = MemorySaver()
-        self.graph = builder.compile(checkpointer=memory)
+        # Conversation state is kept per thread, bounded in count, size and idle time
+        self.checkpointer = checkpointer or BoundedMemorySaver()
+        self.graph = builder.compile(checkpointer=self.checkpointer)
+
+    def end_session(self, thread_id: str) -> None:
+        """Drop the conversation state of a finished session."""
+        self.checkpointer.delete_thread(thread_id)
+        self.prefetcher.end_session(thread_id)
+        print(f'Session {thread_id} ended, checkpointer: {self.checkpointer.stats()}, '
+              f'prompts: {self.context_stats.as_dict()}, prefetch: {self.prefetcher.stats()}, '
+              f'fast path: {self.router.stats()}')
+
+    async def close_interrupted_turn(self, config: RunnableConfig) -> None:
+        """Answer the tool calls a cancelled turn left pending, so the thread stays valid for the LLM."""
+        state = await self.graph.aget_state(config)
+        messages = state.values.get('messages', [])
+        # Only the last turn can have been cut short
+        start = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+        answered = {m.tool_call_id for m in messages[start:] if isinstance(m, ToolMessage)}
+        pending = [c for m in messages[start:] if isinstance(m, AIMessage) for c in m.tool_calls if c['id'] not in answered]
+        if pending:
+            await self.graph.aupdate_state(config, {'messages': [
+                ToolMessage(tool_call_id=c['id'], name=c['name'], content='Cancelled: the user moved on to a new request.')
+                for c in pending]}, as_node='invoke_tools')
 
     @staticmethod
     def exists_action(state: AgentState):
@@ -142,52 +220,113 @@ class TravelAgent:
         return 'format_response'
 
     def format_response(self, state: AgentState):
-        # Format the final response for the user
-        final_message = state['messages'][-1].content if state['messages'] else "I've completed the travel research for you."
-        return {'messages': [final_message]}
+        # The final AIMessage already holds the reply; appending its text again would
+        # make it re-enter later prompts as a human message
+        if state['messages']:
+            return {'messages': []}
+        return {'messages': [AIMessage(content="I've completed the travel research for you.")]}
 
-    def call_tools_llm(self, state: AgentState):
-        messages = state['messages']
-        messages = [SystemMessage(content=TOOLS_SYSTEM_PROMPT)] + messages
-        message = self._tools_llm.invoke(messages)
-        return {'messages': [message]}
+    def fast_path(self, state: AgentState):
+        # Turn a fully specified search request straight into its tool call
+        last_message = state['messages'][-1]
+        if not isinstance(last_message, HumanMessage):
+            return {'messages': []}
+        # Only the opening request of a conversation: later ones may rely on what was said before
+        # ("we are three", "make it business"), which the router cannot see
+        if state.get('summary') or any(isinstance(m, HumanMessage) for m in state['messages'][:-1]):
+            return {'messages': []}
+        call = self.router.route(message_text(last_message.content))
+        if call is None or call[0] not in self._tools:
+            return {'messages': []}
+        name, params = call
+        return {'messages': [AIMessage(content='', tool_calls=[{
+            'name': name, 'args': {'params': params.model_dump(exclude_none=True)}, 'id': f'fastpath-{uuid.uuid4().hex[:8]}'}])]}
+
+    async def call_tools_llm(self, state: AgentState):
+        # Keep the prompt within budget: recent turns verbatim, older ones summarized
+        messages, summary, summarized_upto = self.context_window.build(
+            TOOLS_SYSTEM_PROMPT, state['messages'], state.get('summary', ''), state.get('summarized_upto', 0))
+        message = await self._tools_llm.ainvoke(messages)
+        # Prefer the provider's prompt token count when it reports one
+        usage = getattr(message, 'usage_metadata', None) or {}
+        self.context_stats.record(usage.get('input_tokens') or estimate_tokens(messages))
+        return {'messages': [message], 'summary': summary, 'summarized_upto': summarized_upto}
 
-    def invoke_tools(self, state: AgentState):
+    @staticmethod
+    def _emit_status(text: str) -> None:
+        # Custom stream events reach callers of graph.astream(); a no-op outside a graph run
+        try:
+            get_stream_writer()({'status': text})
+        except (RuntimeError, KeyError):
+            pass
+
+    async def _run_tool(self, t, config: Optional[RunnableConfig] = None) -> ToolMessage:
+        thread_id = (config or {}).get('configurable', {}).get('thread_id')
+        if thread_id and isinstance(t['args'], dict):
+            self.prefetcher.on_tool_call(thread_id, t['name'], t['args'])
+        # Unknown names are grouped so a hallucinated tool name cannot add metric series
+        with span('tool', t['name'] if t['name'] in self._tools else 'unknown') as tool_span:
+            result = await self._call_tool(t, config)
+            tool_span.failed = ('error' in result) if isinstance(result, dict) else str(result).startswith(('Error', 'bad tool'))
+        if thread_id and isinstance(t['args'], dict):
+            self.prefetcher.on_tool_result(thread_id, t['name'], t['args'], result)
+        # Only compact summaries go to the LLM; full records stay in the (SQLite-backed) result store
+        return ToolMessage(tool_call_id=t['id'], name=t['name'], content=await asyncio.to_thread(compact_result, result))
+
+    async def _call_tool(self, t, config: Optional[RunnableConfig] = None):
+        print(f'Calling: {t}')
+        self._emit_status(TOOL_STATUS.get(t['name'], f"Running {t['name']}…"))
+        if not t['name'] in self._tools:
+            print('\n ....bad tool name....')
+            result = 'bad tool name, retry'
+        else:
+            # Use the correct invocation pattern - pass the args directly as a dict
+            # Use model_dump() if args is a Pydantic model, otherwise use as-is
+            try:
+                # Check if args is a Pydantic BaseModel instance
+                tool_args = t['args']
+                if isinstance(t['args'], BaseModel):
+                    tool_args = t['args'].model_dump()
+                elif not isinstance(t['args'], dict):
+                    # Fallback for older Pydantic versions or other types
+                    tool_args = t['args'].dict() if hasattr(t['args'], 'dict') else t['args']
+                # wait_for cancels the call once it runs past its timeout
+                result = await asyncio.wait_for(self._tools[t['name']].ainvoke(tool_args, config), self.tool_timeout)
+            except asyncio.TimeoutError:
+                print(f"Tool {t['name']} timed out after {self.tool_timeout:g}s")
+                result = f"Error invoking tool: timed out after {self.tool_timeout:g} seconds"
+            except Exception as e:
+                print(f"Error invoking tool {t['name']}: {e}")
+                result = f"Error invoking tool: {str(e)}"
+        return result
+
+    async def invoke_tools(self, state: AgentState, config: RunnableConfig):
         last_message = state['messages'][-1]
         # Check if the last message is an AIMessage with tool_calls attribute
         if not isinstance(last_message, AIMessage) or not hasattr(last_message, 'tool_calls'):
             # If not, return empty results
             return {'messages': []}
-            
-        tool_calls = last_message.tool_calls
-        results = []
-        for t in tool_calls:
-            print(f'Calling: {t}')
-            if not t['name'] in self._tools:
-                print('\n ....bad tool name....')
-                result = 'bad tool name, retry'
-            else:
-                # Use the correct invocation pattern - pass the args directly as a dict
-                # Use model_dump() if args is a Pydantic model, otherwise use as-is
-                try:
-                    # Check if args is a Pydantic BaseModel instance
-                    tool_args = t['args']
-                    if isinstance(t['args'], BaseModel):
-                        tool_args = t['args'].model_dump()
-                    elif not isinstance(t['args'], dict):
-                        # Fallback for older Pydantic versions or other types
-                        tool_args = t['args'].dict() if hasattr(t['args'], 'dict') else t['args']
-                    result = self._tools[t['name']].invoke(tool_args)
-                except Exception as e:
-                    print(f"Error invoking tool {t['name']}: {e}")
-                    result = f"Error invoking tool: {str(e)}"
-            results.append(ToolMessage(tool_call_id=t['id'], name=t['name'], content=str(result)))
+
+        # Run all tool calls of the turn concurrently; gather keeps results in call order
+        results = await asyncio.gather(*(self._run_tool(t, config) for t in last_message.tool_calls))
         print('Back to the model!')
-        return {'messages': results}
+        return {'messages': list(results)}
+
+
+_travel_agent: Optional[TravelAgent] = None
+
+
+def get_travel_agent() -> TravelAgent:
+    """Return the process-wide TravelAgent so sessions share one LLM client and compiled graph."""
+    global _travel_agent
+    if _travel_agent is None:
+        _travel_agent = TravelAgent()
+    return _travel_agent
 
 
 class Assistant(Agent):
-    def __init__(self) -> None:
+    def __init__(self, thread_id: Optional[str] = None, travel_agent: Optional[TravelAgent] = None,
+                 stream: bool = STREAM_RESPONSES, turns: Optional[TurnManager] = None) -> None:
         # Get current date for context
         today = datetime.now()
         formatted_date = today.strftime("%A, %B %d, %Y")
@@ -198,14 +337,78 @@ class Assistant(Agent):
             Ask for specific details like departure/arrival cities and dates for flights,
             or location and dates for hotels when users request this information."""
         )
-        self.travel_agent = TravelAgent()
+        self.travel_agent = travel_agent or get_travel_agent()
+        # Each session keeps its own conversation thread in the checkpointer
+        self.thread_id = thread_id or uuid.uuid4().hex
+        self.stream = stream
+        # A new user turn cancels the one still running, so stale replies are never sent
+        self.turns = turns or TurnManager()
+
+    def _room(self):
+        # Use getattr to safely access room attribute, falling back to the job's room
+        room = getattr(self, 'room', None)
+        if room is None:
+            try:
+                room = agents.get_job_context().room
+            except RuntimeError:
+                room = None
+        return room
+
+    async def _stream_response(self, inputs: AgentState, config, turn: Turn) -> None:
+        """Speak and publish the reply sentence by sentence while the graph is still running."""
+        room = self._room()
+        try:
+            session = self.session
+        except RuntimeError:
+            session = None
+        sentences: asyncio.Queue = asyncio.Queue()
+
+        async def speech_text():
+            while (sentence := await sentences.get()) is not None:
+                yield sentence
+
+        speech = None
+        try:
+            async for kind, text in stream_graph(self.travel_agent.graph, inputs, config):
+                if not turn.current:
+                    break
+                if kind == 'status':
+                    if room:
+                        await room.local_participant.publish_data(text, topic='agent_status')
+                    continue
+                # Start TTS on the first sentence and keep feeding it as more arrive
+                if session is not None and speech is None:
+                    speech = session.say(speech_text())
+                sentences.put_nowait(text)
+                if room:
+                    await room.local_participant.publish_data(text)
+        finally:
+            sentences.put_nowait(None)
+            if speech is not None and not turn.current:
+                # Stop speaking a reply the user has already moved on from
+                speech.interrupt()
+
+    async def on_user_turn_completed(self, turn_ctx, new_message) -> None:
+        # A spoken request while a chat turn is still running barges in on it
+        self.turns.supersede()
+        await super().on_user_turn_completed(turn_ctx, new_message)
 
     async def on_chat_received(self, message: agents.ChatMessage) -> None:
         """Handle incoming chat messages and use tools when needed."""
+        with span('turn', 'chat') as turn_span:
+            # None when a newer message superseded this one before it finished
+            ok = await self.turns.run(lambda turn: self._handle_chat(message, turn))
+            turn_span.failed = ok is False
+
+    async def _handle_chat(self, message: agents.ChatMessage, turn: Turn) -> bool:
+        """Run one chat turn; return False if it failed and an apology was sent instead."""
         try:
             # Process the message through our LangGraph workflow
-            from langchain_core.runnables import RunnableConfig
-            config = RunnableConfig(configurable={"thread_id": "1"})
+            # Price watches are reported to the session's room
+            config = RunnableConfig(configurable={"thread_id": self.thread_id,
+                                                  "room": getattr(self._room(), 'name', None)})
+            if turn.interrupted:
+                await self.travel_agent.close_interrupted_turn(config)
             
             # Extract content from ChatMessage - handle both string and list cases
             if isinstance(message.content, str):
@@ -222,47 +425,103 @@ class Assistant(Agent):
             # Create properly typed inputs
             human_message = HumanMessage(content=content)
             inputs = {"messages": [human_message]}
-            
-            # Run the graph
-            result = await asyncio.get_event_loop().run_in_executor(
-                None, lambda: self.travel_agent.graph.invoke(cast(AgentState, inputs), config)
-            )
+
+            if self.stream:
+                await self._stream_response(cast(AgentState, inputs), config, turn)
+                return True
+
+            # Run the graph natively on the event loop
+            result = await self.travel_agent.graph.ainvoke(cast(AgentState, inputs), config)
             
             # Extract the final response
             final_response = result['messages'][-1]
             if isinstance(final_response, str):
                 response_text = final_response
             elif hasattr(final_response, 'content'):
-                response_text = final_response.content
+                response_text = message_text(final_response.content)
             else:
                 response_text = str(final_response)
             
-            # Send the response back through LiveKit
-            # Use getattr to safely access room attribute
-            room = getattr(self, 'room', None)
-            if room:
+            # Send the response back through LiveKit, unless a newer message took over
+            room = self._room()
+            if room and turn.current:
                 await room.local_participant.publish_data(response_text)
+            return True
             
         except Exception as e:
             error_msg = f"I encountered an error while processing your request: {str(e)}. Let me try to help you in a different way."
-            room = getattr(self, 'room', None)
-            if room:
+            room = self._room()
+            if room and turn.current:
                 await room.local_participant.publish_data(error_msg)
+            return False
+
+
+def prewarm(proc: agents.JobProcess):
+    """Load the VAD model and build the shared graph once per process, before any job arrives."""
+    start = time.perf_counter()
+    proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["travel_agent"] = get_travel_agent()
+    print(f"Prewarmed worker process in {time.perf_counter() - start:.2f}s")
 
 
 async def entrypoint(ctx: agents.JobContext):
+    job_start = time.perf_counter()
+    # Fall back to loading in the job when the process was not prewarmed
+    warm = "vad" in ctx.proc.userdata
+    vad = ctx.proc.userdata["vad"] if warm else silero.VAD.load()
+
     session = AgentSession(
         stt="assemblyai/universal-streaming:en",
         llm="google/gemini-2.5-flash",
         tts="cartesia/sonic-2:9626c31c-bec5-4cca-baa8-f8ba9e84c8bc",
-        vad=silero.VAD.load(),
+        vad=vad,
+        # The turn detector model is loaded once per worker by the inference executor;
+        # this is only the lightweight per-session handle to it
         turn_detection=MultilingualModel(),
     )
 
+    # Report time-to-first-greeting so cold and warm job starts can be compared
+    greeted = False
+
+    @session.on("agent_state_changed")
+    def _on_agent_state_changed(ev):
+        nonlocal greeted
+        if ev.new_state == "speaking" and not greeted:
+            greeted = True
+            print(f"Time to first greeting ({'warm' if warm else 'cold'} start): {time.perf_counter() - job_start:.2f}s")
+
+    # Feed STT, end-of-utterance, LLM and TTS latencies into the worker's metrics
+    @session.on("metrics_collected")
+    def _on_metrics_collected(ev):
+        record_voice_metrics(ev.metrics)
+
+    # Scope the conversation thread to this room and job
+    assistant = Assistant(thread_id=f"{ctx.room.name}:{ctx.job.id}")
+
+    # The REST service's shared price watcher sends changes on the room's watches to the
+    # price_watch data topic; tell the user about them as they arrive
+    @ctx.room.on("data_received")
+    def _on_data_received(packet):
+        # Only the server sends on this topic; a participant could otherwise make the agent say anything
+        if packet.topic != 'price_watch' or packet.participant is not None:
+            return
+        try:
+            change = json.loads(packet.data)
+        except ValueError:
+            return
+        if change.get('message'):
+            session.say(change['message'])
+
+    async def end_session():
+        assistant.travel_agent.end_session(assistant.thread_id)
+        await aend_room_watches(ctx.room.name)
+
+    ctx.add_shutdown_callback(end_session)
+
     # Start the session directly without an avatar
     await session.start(
         room=ctx.room,
-        agent=Assistant(),
+        agent=assistant,
         room_input_options=RoomInputOptions(
             # For telephony applications, use `BVCTelephony` instead for best results
             noise_cancellation=noise_cancellation.BVC(), 
@@ -275,4 +534,9 @@ async def entrypoint(ctx: agents.JobContext):
 
 
 if __name__ == "__main__":
-    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint))
\ No newline at end of file
+    worker_options = {}
+    if METRICS_PORT:
+        # Job processes write their metrics to a shared directory that the worker's
+        # Prometheus endpoint aggregates at /metrics
+        worker_options.update(prometheus_port=int(METRICS_PORT), prometheus_multiproc_dir=METRICS_MULTIPROC_DIR)
+    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm, **worker_options))
\ No newline at end of file
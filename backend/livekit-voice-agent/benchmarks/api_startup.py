@@ -0,0 +1,82 @@
+'''
+Measure how long the REST service takes to import and how much memory it
+holds once imported, in fresh interpreters.
+
+"lean" imports main as it is: only the search functions, FastAPI and httpx.
+"eager" first imports what main used to pull in at import time (the
+LangChain tool wrappers and uvicorn), which is what every worker process
+paid for before the search core was split from the tool wrappers.
+
+    python -m benchmarks.api_startup --runs 5
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+_PROBE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+{imports}
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+    "langchain": "langchain_core" in sys.modules,
+}}))
+'''
+
+_VARIANTS = {
+    'lean': '',
+    'eager': 'import tools.agent_tools, uvicorn',
+}
+
+
+def _probe(imports: str) -> dict:
+    output = subprocess.run([sys.executable, '-c', _PROBE.format(imports=imports)], capture_output=True,
+                            text=True, check=True, cwd=os.getcwd()).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    for name, imports in _VARIANTS.items():
+        # One discarded run, so both variants start from warm bytecode and page caches
+        _probe(imports)
+        runs = [_probe(imports) for _ in range(args.runs)]
+        results[name] = {
+            'seconds': statistics.median(r['seconds'] for r in runs),
+            'rss_mb': statistics.median(r['rss_mb'] for r in runs),
+            'modules': runs[-1]['modules'],
+            'langchain': runs[-1]['langchain'],
+        }
+        print(f"{name}: import {results[name]['seconds'] * 1e3:.0f} ms, peak RSS {results[name]['rss_mb']:.1f} MB, "
+              f"{results[name]['modules']} modules, langchain_core loaded={results[name]['langchain']}")
+
+    lean, eager = results['lean'], results['eager']
+    print(f"lean startup saves {(eager['seconds'] - lean['seconds']) * 1e3:.0f} ms and "
+          f"{eager['rss_mb'] - lean['rss_mb']:.1f} MB per process")
+
+    failures = []
+    if lean['langchain']:
+        failures.append('importing main loads LangChain')
+    if lean['seconds'] >= eager['seconds'] or lean['rss_mb'] >= eager['rss_mb']:
+        failures.append('lean startup is not faster and smaller than eager startup')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+'''
+Exercise per-session turn management of chat turns.
+
+- barge-in: a message is sent while the previous one is still waiting on a
+  slow tool. The old turn should be cancelled along with its tool call,
+  nothing from it should be published, and the thread should stay valid
+  for the LLM, so the new turn is answered normally.
+- bounded: many sessions send a message at once through a limiter with a
+  few slots; no more turns than that should run at once, the rest queue.
+
+    python -m benchmarks.barge_in --sessions 12 --slots 3
+'''
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+
+from benchmarks.fake_llm import ScriptedChatModel
+
+OLD_REPLY = 'The cheapest flight to London is 480 dollars.'
+NEW_REPLY = 'The cheapest flight to Paris is 390 dollars.'
+
+
+class FakeRoom:
+    '''Records what the assistant publishes, as (seconds since start, topic, text).'''
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.published = []
+        self.local_participant = SimpleNamespace(publish_data=self._publish)
+
+    async def _publish(self, text: str, topic: str = '') -> None:
+        self.published.append((time.perf_counter() - self.start, topic, text))
+
+
+def _flight_call(destination: str) -> AIMessage:
+    return AIMessage(content='', tool_calls=[{'name': 'flights_finder', 'id': 'call', 'args': {'params': {
+        'departure_airport': 'JFK', 'arrival_airport': destination, 'outbound_date': '2026-12-20'}}}])
+
+
+def build_agent(args, tool_latency: float, calls: dict):
+    from agent import TravelAgent
+
+    async def search(params: dict) -> dict:
+        calls['started'] += 1
+        try:
+            await asyncio.sleep(tool_latency)
+        except asyncio.CancelledError:
+            calls['cancelled'] += 1
+            raise
+        calls['finished'] += 1
+        return {'flights': []}
+
+    llm = ScriptedChatModel(turns=[[_flight_call('LHR'), AIMessage(content=OLD_REPLY)],
+                                   [_flight_call('CDG'), AIMessage(content=NEW_REPLY)]],
+                            first_token_delay=args.llm_delay, token_delay=0.0)
+    tool = StructuredTool.from_function(coroutine=search, name='flights_finder', description='Fake flight search')
+    return TravelAgent(tools=[tool], llm=llm)
+
+
+async def barge_in(args) -> dict:
+    from livekit import agents
+    from agent import Assistant
+
+    calls = {'started': 0, 'cancelled': 0, 'finished': 0}
+    travel_agent = build_agent(args, args.tool_latency, calls)
+    room = FakeRoom()
+    assistant = Assistant(thread_id='barge-in', travel_agent=travel_agent)
+    assistant._room = lambda: room
+
+    first = asyncio.create_task(assistant.on_chat_received(
+        agents.ChatMessage(role='user', content=['Flights from JFK to London on 2026-12-20?'])))
+    # Interrupt while the first turn waits on its flight search
+    await asyncio.sleep(args.llm_delay + args.tool_latency / 2)
+    interrupted_at = time.perf_counter() - room.start
+    await assistant.on_chat_received(
+        agents.ChatMessage(role='user', content=['Actually, make that Paris.']))
+    await first
+
+    replies = [(at, text) for at, topic, text in room.published if not topic]
+    state = await travel_agent.graph.aget_state({'configurable': {'thread_id': 'barge-in'}})
+    cancelled_results = [m for m in state.values['messages']
+                         if isinstance(m, ToolMessage) and m.content.startswith('Cancelled')]
+    return {
+        'calls': calls,
+        'superseded': assistant.turns.superseded,
+        'old_published': any(OLD_REPLY in text for _, text in replies),
+        'new_published': any(NEW_REPLY in text for _, text in replies),
+        'new_reply_after': next((at - interrupted_at for at, text in replies if NEW_REPLY in text), None),
+        'cancelled_results': len(cancelled_results),
+    }
+
+
+async def bounded(args) -> dict:
+    from livekit import agents
+    from agent import Assistant
+    from turns import TurnLimiter, TurnManager
+
+    calls = {'started': 0, 'cancelled': 0, 'finished': 0}
+    travel_agent = build_agent(args, args.tool_latency, calls)
+    limiter = TurnLimiter(limit=args.slots)
+    peak = {'running': 0, 'waiting': 0}
+
+    async def sample():
+        while True:
+            peak['running'] = max(peak['running'], limiter.running)
+            peak['waiting'] = max(peak['waiting'], limiter.waiting)
+            await asyncio.sleep(0.01)
+
+    async def session(n: int) -> int:
+        room = FakeRoom()
+        assistant = Assistant(thread_id=f'bounded-{n}', travel_agent=travel_agent, turns=TurnManager(limiter))
+        assistant._room = lambda: room
+        await assistant.on_chat_received(agents.ChatMessage(role='user', content=['Flights to London?']))
+        return sum(OLD_REPLY in text for _, topic, text in room.published if not topic)
+
+    sampler = asyncio.create_task(sample())
+    start = time.perf_counter()
+    replies = await asyncio.gather(*(session(n) for n in range(args.sessions)))
+    elapsed = time.perf_counter() - start
+    sampler.cancel()
+    return {'elapsed': elapsed, 'replied': sum(1 for r in replies if r), **{f'peak_{k}': v for k, v in peak.items()}}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--llm-delay', type=float, default=0.2)
+    parser.add_argument('--tool-latency', type=float, default=1.0)
+    parser.add_argument('--sessions', type=int, default=12)
+    parser.add_argument('--slots', type=int, default=3)
+    args = parser.parse_args()
+
+    # The LLM client is replaced by the scripted model, so any key will do
+    os.environ.setdefault('GOOGLE_API_KEY', 'fake-key')
+    failures = []
+
+    result = asyncio.run(barge_in(args))
+    print(f"barge-in: {result['superseded']} turn superseded, tool calls {result['calls']}")
+    print(f"barge-in: stale reply published={result['old_published']}, new reply published "
+          f"{result['new_reply_after']:.3f}s after the interruption, "
+          f"{result['cancelled_results']} cancelled tool call(s) closed in the thread")
+    if result['old_published'] or not result['new_published']:
+        failures.append('the superseded turn published its reply, or the new one did not')
+    if result['calls']['cancelled'] != 1 or result['cancelled_results'] != 1:
+        failures.append('the superseded turn kept its tool call running or left it unanswered')
+
+    result = asyncio.run(bounded(args))
+    print(f"bounded: {args.sessions} sessions through {args.slots} slots in {result['elapsed']:.2f}s, "
+          f"peak running {result['peak_running']}, peak queue depth {result['peak_waiting']}, "
+          f"{result['replied']} replied")
+    if result['peak_running'] > args.slots or result['replied'] != args.sessions:
+        failures.append('more turns ran at once than the limiter allows, or some never replied')
+
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
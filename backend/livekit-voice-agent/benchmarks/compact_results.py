@@ -0,0 +1,110 @@
+'''
+Compare the size of tool results sent to the LLM before and after projection.
+
+Uses the recorded SerpAPI responses in benchmarks/fixtures, shaped the way
+flights_finder and hotels_finder return them. "before" is the str(result)
+the agent used to send, "after" is compact_result(). Token counts are an
+estimate of 4 characters per token. The LLM turn that reads each result is
+timed offline with the scripted fake model, whose prefill cost grows with
+the prompt, and should be faster after projection. With --live each prompt
+is also sent to Gemini and the reported prompt tokens and latency are
+printed (needs GOOGLE_API_KEY).
+
+    python -m benchmarks.compact_results [--prompt-token-delay 0.0001] [--live]
+'''
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+def load_fixture(engine: str) -> dict:
+    with open(FIXTURES / f'{engine}.json', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def tool_results() -> dict:
+    flights = load_fixture('google_flights')
+    hotels = load_fixture('google_hotels')
+    return {
+        'flights_finder': {'flights': flights.get('best_flights', []) + flights.get('other_flights', [])},
+        'hotels_finder': {'hotels': hotels.get('properties', [])},
+    }
+
+
+def turn_messages(name: str, content: str) -> list:
+    # The prompt of the LLM turn that reads a tool result
+    from agent import TOOLS_SYSTEM_PROMPT
+
+    return [
+        SystemMessage(content=TOOLS_SYSTEM_PROMPT),
+        HumanMessage(content='Find me options from JFK to London, 2026-12-20 to 2026-12-28.'),
+        AIMessage(content='', tool_calls=[{'name': name, 'args': {}, 'id': 'call-1'}]),
+        ToolMessage(tool_call_id='call-1', name=name, content=content),
+    ]
+
+
+async def measure_offline(name: str, content: str, prompt_token_delay: float) -> float:
+    from benchmarks.fake_llm import ScriptedChatModel
+
+    llm = ScriptedChatModel(script=[AIMessage(content='The cheapest option is $480 with one stop.')],
+                            first_token_delay=0.0, token_delay=0.0, prompt_token_delay=prompt_token_delay)
+    messages = turn_messages(name, content)
+    start = time.perf_counter()
+    await llm.ainvoke(messages)
+    return time.perf_counter() - start
+
+
+async def measure_live(name: str, content: str) -> tuple[int, float]:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    llm = ChatGoogleGenerativeAI(model='gemini-1.5-flash', google_api_key=os.environ['GOOGLE_API_KEY'])
+    messages = turn_messages(name, content)
+    start = time.perf_counter()
+    response = await llm.ainvoke(messages)
+    elapsed = time.perf_counter() - start
+    return (response.usage_metadata or {}).get('input_tokens', 0), elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--prompt-token-delay', type=float, default=0.0001,
+                        help='Seconds of fake LLM prefill per prompt token')
+    parser.add_argument('--live', action='store_true', help='measure prompt tokens and latency with Gemini')
+    args = parser.parse_args()
+
+    from tools.results import compact_result
+
+    failures = []
+    for name, result in tool_results().items():
+        before = str(result)
+        after = compact_result(result)
+        print(f'{name}:')
+        print(f'  before: {len(before):7d} chars  ~{len(before) // 4:6d} tokens')
+        print(f'  after:  {len(after):7d} chars  ~{len(after) // 4:6d} tokens  ({len(after) / len(before):.1%})')
+        slow = asyncio.run(measure_offline(name, before, args.prompt_token_delay))
+        fast = asyncio.run(measure_offline(name, after, args.prompt_token_delay))
+        print(f'  fake LLM turn: {slow:.2f}s before, {fast:.2f}s after')
+        if len(after) >= len(before) or fast >= slow:
+            failures.append(f'{name} results did not make the prompt smaller and the LLM turn faster')
+        if args.live:
+            for label, content in (('before', before), ('after', after)):
+                tokens, elapsed = asyncio.run(measure_live(name, content))
+                print(f'  live {label}: {tokens} prompt tokens, {elapsed:.2f}s')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+'''
+Show that concurrent async searches overlap instead of queueing.
+
+Runs one search against a local fake upstream, then N at once, and checks that
+the concurrent batch finishes in roughly the time of a single search. Every
+search is for a different date, so none is answered from the cache or
+coalesced with another and each reaches the upstream.
+
+    python -m benchmarks.concurrent_search --concurrency 20 --latency 0.5
+'''
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+from benchmarks.fake_serpapi import FakeSerpApi
+
+
+async def run(concurrency: int) -> tuple[float, float]:
+    from tools.agent_tools import flights_finder
+    from tools.flights_finder import FlightsInput
+    from tools.search_client import aclose_search_client
+
+    def params(day: int) -> dict:
+        outbound = date(2026, 12, 1) + timedelta(days=day)
+        return {"params": FlightsInput(departure_airport='JFK', arrival_airport='LHR',
+                                       outbound_date=outbound.isoformat(),
+                                       return_date=(outbound + timedelta(days=8)).isoformat()).model_dump()}
+
+    start = time.perf_counter()
+    result = await flights_finder.ainvoke(params(0))
+    single = time.perf_counter() - start
+    assert 'flights' in result, result
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(flights_finder.ainvoke(params(day)) for day in range(1, concurrency + 1)))
+    batch = time.perf_counter() - start
+    assert all('flights' in r for r in results), results
+
+    await aclose_search_client()
+    return single, batch
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.5)
+    args = parser.parse_args()
+
+    with FakeSerpApi(latency=args.latency) as upstream:
+        # The search client reads its upstream settings on first import
+        os.environ['SERPAPI_BASE_URL'] = upstream.url
+        os.environ.setdefault('SERPAPI_API_KEY', 'fake-key')
+        os.environ.setdefault('SERPAPI_RATE_LIMIT', '0')
+        single, batch = asyncio.run(run(args.concurrency))
+
+    print(f'single search:            {single:.3f}s')
+    print(f'{args.concurrency} concurrent searches: {batch:.3f}s')
+    print(f'upstream requests:        {upstream.requests}')
+    if upstream.requests != args.concurrency + 1:
+        print('FAIL: searches were served from the cache instead of the upstream')
+        return 1
+    if batch > single * 2:
+        print('FAIL: concurrent searches are being serialized')
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
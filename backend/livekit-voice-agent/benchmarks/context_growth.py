@@ -0,0 +1,80 @@
+'''
+Track prompt size and LLM latency over a long session.
+
+Plays a scripted conversation in which every turn runs a flight search
+(returning the recorded fixture) and gets a reply, once with the full
+history in every prompt as before and once with the context window. The
+fake LLM charges `--prompt-token-delay` seconds per
+prompt token, so latency follows prompt size the way prefill does.
+
+    python -m benchmarks.context_growth --turns 50
+'''
+import argparse
+import asyncio
+import sys
+import time
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.tools import StructuredTool
+
+from benchmarks.compact_results import tool_results
+from benchmarks.fake_llm import ScriptedChatModel
+
+REPLY = ('The cheapest option is an Iberia nonstop for 480 dollars, leaving JFK at 9:08 PM. '
+         'Aer Lingus has a morning departure for 939 dollars. Shall I check hotels as well?')
+
+
+class FullHistory:
+    '''The previous behavior: system prompt plus every message, every call.'''
+
+    def build(self, system_prompt, messages, summary='', summarized_upto=0):
+        prompt = [SystemMessage(content=system_prompt)] + [m for m in messages if isinstance(m, BaseMessage)]
+        return prompt, summary, summarized_upto
+
+
+async def run_session(turns: int, prompt_token_delay: float, context_window=None) -> list:
+    from agent import TravelAgent
+
+    fixture = tool_results()['flights_finder']
+
+    async def search(params: dict) -> dict:
+        return fixture
+
+    llm = ScriptedChatModel(
+        script=[
+            AIMessage(content='', tool_calls=[{'name': 'flights_finder', 'args': {'params': {}}, 'id': 'call'}]),
+            AIMessage(content=REPLY),
+        ],
+        first_token_delay=0.0, token_delay=0.0, prompt_token_delay=prompt_token_delay,
+    )
+    tool = StructuredTool.from_function(coroutine=search, name='flights_finder', description='Fake flight search')
+    agent = TravelAgent(tools=[tool], llm=llm, context_window=context_window)
+
+    samples = []
+    config = {'configurable': {'thread_id': 'session'}}
+    for turn in range(1, turns + 1):
+        start = time.perf_counter()
+        await agent.graph.ainvoke({'messages': [HumanMessage(content=f'Turn {turn}: any cheaper flights to London?')]},
+                                  config)
+        samples.append((turn, agent.context_stats.last_prompt_tokens, time.perf_counter() - start))
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--turns', type=int, default=50)
+    parser.add_argument('--prompt-token-delay', type=float, default=0.0001)
+    args = parser.parse_args()
+
+    unbounded = asyncio.run(run_session(args.turns, args.prompt_token_delay, FullHistory()))
+    bounded = asyncio.run(run_session(args.turns, args.prompt_token_delay))
+
+    print(f"{'turn':>5} {'unbounded tokens':>17} {'latency':>8} {'bounded tokens':>15} {'latency':>8}")
+    for (turn, u_tokens, u_time), (_, b_tokens, b_time) in zip(unbounded, bounded):
+        if turn in (1, 2, 5, 10, 20, 30, 40, 50) or turn == args.turns:
+            print(f'{turn:5d} {u_tokens:17d} {u_time:7.3f}s {b_tokens:15d} {b_time:7.3f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
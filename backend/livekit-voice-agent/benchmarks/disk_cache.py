@@ -0,0 +1,158 @@
+'''
+Measure the shared on-disk search cache.
+
+Reports lookup latency for memory hits, disk hits, stale-while-revalidate
+hits and upstream misses, then runs several worker processes searching
+overlapping routes against a local fake upstream, once with private
+in-memory caches only and once sharing the disk cache, and compares their
+hit rates.
+
+    python -m benchmarks.disk_cache --processes 4 --searches 40 --routes 20 --latency 0.1
+'''
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_serpapi import FakeSerpApi
+
+ROUTES = ['LHR', 'CDG', 'FRA', 'AMS', 'MAD', 'FCO', 'BCN', 'LIS', 'DUB', 'ZRH',
+          'VIE', 'CPH', 'OSL', 'ARN', 'HEL', 'PRG', 'WAW', 'BUD', 'ATH', 'IST']
+
+
+def _flights(arrival: str):
+    from tools.flights_finder import FlightsInput
+    return FlightsInput(departure_airport='JFK', arrival_airport=arrival,
+                        outbound_date='2026-12-20', return_date='2026-12-28')
+
+
+async def _timed(lookups: int, lookup) -> float:
+    start = time.perf_counter()
+    for _ in range(lookups):
+        await lookup()
+    return (time.perf_counter() - start) / lookups
+
+
+async def hit_path(db_path: str, lookups: int) -> dict:
+    from tools.cache import SearchCache, cache_key
+    from tools.disk_cache import DiskCache
+    from tools.flights_finder import afind_flights
+    import tools.flights_finder as flights_module
+
+    params = _flights('LHR')
+    key = cache_key('google_flights', params)
+    disk = DiskCache(db_path)
+    result = {}
+
+    # Upstream miss: a fresh key every time
+    miss_cache = SearchCache()
+    flights_module.search_cache = miss_cache
+    start = time.perf_counter()
+    for i in range(5):
+        await afind_flights(_flights(ROUTES[i + 1]))
+    result['miss'] = (time.perf_counter() - start) / 5
+
+    # Memory hit
+    memory_cache = SearchCache(disk=disk)
+    flights_module.search_cache = memory_cache
+    await afind_flights(params)
+    result['memory_hit'] = await _timed(lookups, lambda: afind_flights(params))
+
+    # Disk hit: a memory tier that holds nothing, as in a freshly started process
+    flights_module.search_cache = SearchCache(max_entries=0, disk=disk)
+    result['disk_hit'] = await _timed(lookups, lambda: afind_flights(params))
+
+    # Stale hit: the entry is past its TTL but inside the stale window
+    stale_cache = SearchCache(max_entries=0, disk=disk, ttl=0.0, stale_ttl=600)
+    stale_cache.set(key, memory_cache.get(key)[1])
+    flights_module.search_cache = stale_cache
+    start = time.perf_counter()
+    await afind_flights(params)
+    result['stale_hit'] = time.perf_counter() - start
+    await asyncio.sleep(0.5)
+    result['stale_refreshes'] = stale_cache.refreshes
+
+    flights_module.search_cache = memory_cache
+    return result
+
+
+def _worker(seed: int, searches: int, routes: int, queue) -> None:
+    async def run():
+        from tools.cache import search_cache
+        from tools.flights_finder import afind_flights
+        from tools.search_client import aclose_search_client
+
+        rng = random.Random(seed)
+        for _ in range(searches):
+            result = await afind_flights(_flights(rng.choice(ROUTES[:routes])))
+            assert 'flights' in result, result
+        await aclose_search_client()
+        return search_cache.stats()
+
+    queue.put(asyncio.run(run()))
+
+
+def cross_process(upstream: FakeSerpApi, db_path: str, args) -> dict:
+    # Children inherit the environment, which the cache and client read on import
+    os.environ['SEARCH_DISK_CACHE_PATH'] = db_path
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    before = upstream.requests
+    start = time.perf_counter()
+    workers = [context.Process(target=_worker, args=(seed, args.searches, args.routes, queue))
+               for seed in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    stats = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    lookups = args.processes * args.searches
+    upstream_requests = upstream.requests - before
+    return {
+        'elapsed': time.perf_counter() - start,
+        'lookups': lookups,
+        'upstream_requests': upstream_requests,
+        'hit_rate': 1 - upstream_requests / lookups,
+        'disk_hits': sum(s['disk_hits'] for s in stats),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--searches', type=int, default=40)
+    parser.add_argument('--routes', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, FakeSerpApi(latency=args.latency) as upstream:
+        os.environ['SERPAPI_BASE_URL'] = upstream.url
+        os.environ.setdefault('SERPAPI_API_KEY', 'fake-key')
+
+        hits = asyncio.run(hit_path(os.path.join(tmp, 'hit-path.sqlite3'), args.lookups))
+        print(f"upstream miss:   {hits['miss'] * 1e3:8.2f} ms")
+        print(f"memory hit:      {hits['memory_hit'] * 1e6:8.1f} us")
+        print(f"disk hit:        {hits['disk_hit'] * 1e6:8.1f} us")
+        print(f"stale hit:       {hits['stale_hit'] * 1e6:8.1f} us ({hits['stale_refreshes']} background refresh)")
+
+        private = cross_process(upstream, '', args)
+        shared = cross_process(upstream, os.path.join(tmp, 'shared.sqlite3'), args)
+
+    print(f'\n{args.processes} processes x {args.searches} searches over {args.routes} routes:')
+    for name, run in (('private memory caches', private), ('shared disk cache', shared)):
+        print(f"{name:22s} hit rate {run['hit_rate']:6.1%}, {run['upstream_requests']:4d} upstream requests, "
+              f"{run['elapsed']:.2f}s")
+    if shared['hit_rate'] <= private['hit_rate']:
+        print('FAIL: processes are not sharing cached results')
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
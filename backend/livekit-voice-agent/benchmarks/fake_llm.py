@@ -0,0 +1,90 @@
+import asyncio
+import json
+import re
+import time
+import uuid
+from typing import Any, AsyncIterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class ScriptedChatModel(BaseChatModel):
+    '''
+    Chat model stand-in that replays a fixed script with realistic timing.
+
+    The reply is picked by how many AI messages follow the latest human
+    message, so `script[0]` answers a new user turn (typically a tool call)
+    and `script[1]` answers the tool results. This keeps concurrent sessions
+    independent. Replies are streamed word by word after `first_token_delay`,
+    with `token_delay` between words. `prompt_token_delay` adds time per
+    estimated prompt token to model prefill cost growing with the context.
+    For multi-turn conversations, `turns` holds one script per user turn.
+    '''
+
+    script: List[AIMessage] = []
+    turns: List[List[AIMessage]] = []
+    first_token_delay: float = 0.3
+    token_delay: float = 0.02
+    prompt_token_delay: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return 'scripted'
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> 'ScriptedChatModel':
+        return self
+
+    def _next(self, messages: List[BaseMessage]) -> AIMessage:
+        position = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage):
+                position += 1
+        script = self.script
+        if self.turns:
+            turn = sum(1 for m in messages if isinstance(m, HumanMessage)) - 1
+            script = self.turns[min(max(turn, 0), len(self.turns) - 1)]
+        reply = script[min(position, len(script) - 1)]
+        # Fresh tool call IDs per reply, as a real model would produce
+        tool_calls = [{**call, 'id': f'call-{uuid.uuid4().hex[:8]}'} for call in reply.tool_calls]
+        return AIMessage(content=reply.content, tool_calls=tool_calls)
+
+    def _prefill(self, messages: List[BaseMessage]) -> float:
+        chars = sum(len(m.content) if isinstance(m.content, str) else len(str(m.content)) for m in messages)
+        return self.first_token_delay + self.prompt_token_delay * chars / 4
+
+    def _tokens(self, message: AIMessage) -> List[str]:
+        return re.findall(r'\S+\s*', message.content if isinstance(message.content, str) else '')
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        message = self._next(messages)
+        time.sleep(self._prefill(messages) + self.token_delay * len(self._tokens(message)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        message = self._next(messages)
+        await asyncio.sleep(self._prefill(messages) + self.token_delay * len(self._tokens(message)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        message = self._next(messages)
+        await asyncio.sleep(self._prefill(messages))
+        for token in self._tokens(message):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(self.token_delay)
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content='', tool_call_chunks=[
+                {'name': call['name'], 'args': json.dumps(call['args']), 'id': call['id'], 'index': i}
+                for i, call in enumerate(message.tool_calls)
+            ]))
@@ -0,0 +1,166 @@
+'''
+Local stand-in for the SerpAPI `/search` endpoint.
+
+Replays the recorded google_flights / google_hotels responses in
+benchmarks/fixtures with configurable latency and error rate, so searches
+can be exercised and load-tested without network access or quota. Point the
+app at it with SERPAPI_BASE_URL, or run it standalone:
+
+    python -m benchmarks.fake_serpapi --port 8765 --latency 0.5 --error-rate 0.05
+'''
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+ENGINES = ('google_flights', 'google_hotels')
+_FLIGHT_TIME = re.compile(rb'"(\d{4}-\d{2}-\d{2} \d{2}:\d{2})"')
+
+
+class FakeSerpApi:
+    '''
+    Threaded HTTP server answering `/search` from recorded fixtures.
+
+    Each request sleeps `latency` seconds, plus or minus up to `jitter`, and
+    fails with a 503 with probability `error_rate`. Request and error counts
+    are kept for assertions. Flight times are moved by the days between the
+    recorded and the requested outbound date, so searches for different days
+    get flights on those days.
+    '''
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, error_rate: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._responses: Dict[str, bytes] = {}
+        self._recorded: Dict[str, Optional[str]] = {}
+        for engine in ENGINES:
+            self.set_response(engine, json.loads((FIXTURES / f'{engine}.json').read_bytes()))
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    def set_response(self, engine: str, data: Dict) -> None:
+        '''Answer later `engine` searches with `data` instead of the recorded fixture.'''
+        body = json.dumps(data).encode()
+        with self._lock:
+            self._responses[engine] = body
+            self._recorded[engine] = (data.get('search_parameters') or {}).get('outbound_date')
+
+    def _body(self, engine: str, outbound_date: Optional[str]) -> bytes:
+        with self._lock:
+            body, recorded = self._responses[engine], self._recorded[engine]
+        if not outbound_date or not recorded or outbound_date == recorded:
+            return body
+        shift = date.fromisoformat(outbound_date) - date.fromisoformat(recorded)
+
+        def move(match):
+            try:
+                moved = datetime.strptime(match[1].decode(), '%Y-%m-%d %H:%M') + shift
+            except ValueError:
+                # Recorded responses have the odd out-of-range time; replay it as is
+                return match[0]
+            return b'"' + moved.strftime('%Y-%m-%d %H:%M').encode() + b'"'
+
+        return _FLIGHT_TIME.sub(move, body)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _next_request(self) -> tuple[float, bool]:
+        with self._lock:
+            self.requests += 1
+            delay = max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0.0)
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        return delay, failed
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _reply(self, status: int, body: bytes) -> None:
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up, e.g. a cancelled search
+                    pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                engine = query.get('engine', [''])[0]
+                delay, failed = fake._next_request()
+                time.sleep(delay)
+                if url.path != '/search' or engine not in fake._responses:
+                    self._reply(400, json.dumps({'error': f'Unsupported engine {engine!r}'}).encode())
+                elif failed:
+                    self._reply(503, json.dumps({'error': 'Fake upstream error'}).encode())
+                else:
+                    self._reply(200, fake._body(engine, query.get('outbound_date', [None])[0]))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'FakeSerpApi':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeSerpApi':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeSerpApi(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                       host=args.host, port=args.port)
+    print(f'Fake SerpAPI listening on {fake.url} (export SERPAPI_BASE_URL={fake.url})')
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake._server.server_close()
+
+
+if __name__ == '__main__':
+    main()
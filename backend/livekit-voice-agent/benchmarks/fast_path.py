@@ -0,0 +1,196 @@
+'''
+Measure the fast-path router on a corpus of sample utterances.
+
+Each utterance is labelled with the search it fully specifies, if any. The
+router's hit rate, its accuracy on the ones it routes and the ones it
+should have left to the LLM are reported. Then every routable utterance is
+run through the graph against a local fake upstream, with the router
+enabled and disabled (the scripted model then makes the same tool call
+itself), to show the turn latency saved.
+
+    python -m benchmarks.fast_path --llm-delay 0.8
+'''
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import date
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from benchmarks.fake_llm import ScriptedChatModel
+from benchmarks.fake_serpapi import FakeSerpApi
+
+TODAY = date(2026, 10, 18)
+
+
+def _flights(origin, destination, outbound, back=None, adults=1, children=0):
+    params = {'departure_airport': origin, 'arrival_airport': destination, 'outbound_date': outbound,
+              'adults': adults, 'children': children}
+    if back:
+        params['return_date'] = back
+    return ('flights_finder', params)
+
+
+def _hotels(city, check_in, check_out, adults=1, children=0, rooms=1):
+    return ('hotels_finder', {'q': city, 'check_in_date': check_in, 'check_out_date': check_out,
+                              'adults': adults, 'children': children, 'rooms': rooms})
+
+
+CORPUS = [
+    ('Flights from JFK to LHR on 2026-12-20 returning 2026-12-28 for two adults',
+     _flights('JFK', 'LHR', '2026-12-20', '2026-12-28', adults=2)),
+    ('I need a flight from New York to London on December 20th, back on the 28th',
+     _flights('JFK', 'LHR', '2026-12-20', '2026-12-28')),
+    ('Find flights from NYC to Paris December 20 to December 28', _flights('JFK', 'CDG', '2026-12-20', '2026-12-28')),
+    ('One way flight from San Francisco to Tokyo on Nov 3 for 2 adults and 1 child',
+     _flights('SFO', 'NRT', '2026-11-03', adults=2, children=1)),
+    ('Flights from Chicago to Los Angeles tomorrow', _flights('ORD', 'LAX', '2026-10-19')),
+    ('Can you look up flights from Boston to Miami on December 30 back on the 3rd',
+     _flights('BOS', 'MIA', '2026-12-30', '2027-01-03')),
+    ('Fly from Dubai to Karachi on 5 January 2027', _flights('DXB', 'KHI', '2027-01-05')),
+    ('flights from lahore to istanbul on the 14th of november for three passengers',
+     _flights('LHE', 'IST', '2026-11-14', adults=3)),
+    ('Search flights from Madrid to Rome on Dec 2 returning Dec 6', _flights('MAD', 'FCO', '2026-12-02', '2026-12-06')),
+    ('Hotels in Paris from December 20 to December 27 for 2 adults',
+     _hotels('Paris', '2026-12-20', '2026-12-27', adults=2)),
+    ('Book me a hotel in London Dec 1 to Dec 5, 2 rooms', _hotels('London', '2026-12-01', '2026-12-05', rooms=2)),
+    ('I need a place to stay in Tokyo from November 10 to November 15',
+     _hotels('Tokyo', '2026-11-10', '2026-11-15')),
+    ('Find a hotel in Barcelona 2026-11-20 to 2026-11-23 for 2 adults and 2 kids',
+     _hotels('Barcelona', '2026-11-20', '2026-11-23', adults=2, children=2)),
+    ('hotels in new york city december 31 to january 2', _hotels('New York', '2026-12-31', '2027-01-02')),
+    # Left to the LLM: vague, hedged, or asking for something the search inputs cannot express
+    ('I want to go somewhere warm in December', None),
+    ('Flights to London next week', None),
+    ('What is the cheapest flight from JFK to LHR on 2026-12-20?', None),
+    ('Nonstop flights from New York to London on December 20', None),
+    ('We need flights from Boston to Denver on November 12', None),
+    ('Flights from JFK to LHR on December 20 in the morning', None),
+    ('Hotels in Paris near the Eiffel Tower from December 20 to December 27', None),
+    ('A 4 star hotel in Rome from Dec 3 to Dec 9', None),
+    ('Flights and hotels in Lisbon from Nov 5 to Nov 9', None),
+    ('Round trip flight from Seattle to Honolulu on December 18', None),
+    ('Flights from Gotham to Metropolis on December 1', None),
+    ('Flights from New York to London from December 20 to 28', None),
+    ('Flights from New York to London December 20 through 28', None),
+    ('Flights from New York to London on December 20 for a week', None),
+    ('Flights from New York to London on December 20 for two', None),
+    ('Flights from New York to London on December 20 for my wife and me', None),
+    ('Flights from New York to London on December 20 with my husband', None),
+    ('Hotel in Paris for two from December 20 to December 27', None),
+    ('Flights from JFK to LHR on dec 20 and to CDG on dec 23', None),
+    ('Fly from Paris Texas to London on December 20', None),
+    ('A hotel at the Hilton in Paris from December 20 to December 23', None),
+    ('Flights from JFK to LHR on December 20 at 9am', None),
+    ('Flights from JFK to LHR on December 20 with Delta', None),
+    ('Flights from JFK to LHR on December 20 on United', None),
+    ('Flights from JFK to LHR on December 20 arriving by noon', None),
+    ('Hotels in Paris with free parking from December 20 to December 23', None),
+    ('Hotels in Paris in Montmartre from December 20 to December 23', None),
+    ('Hotel in Madrid from December 10 to December 8', None),
+    ('Show me more options', None),
+    ('Tell me about the first one', None),
+    ('Is the Savoy close to the theatres?', None),
+    ('Thanks, that is all!', None),
+]
+
+
+def follow_up_routed() -> bool:
+    # A request that is fully specified on its own, after a turn that already set the party size
+    from agent import TravelAgent
+    from fastpath import FastPathRouter
+
+    agent = TravelAgent(llm=ScriptedChatModel(script=[]), router=FastPathRouter(enabled=True, today=lambda: TODAY))
+    state = {'messages': [HumanMessage(content='We are three adults'), AIMessage(content='Where to?'),
+                          HumanMessage(content='Flights from JFK to LHR on December 20')]}
+    return bool(agent.fast_path(state)['messages'])
+
+
+def evaluate() -> dict:
+    from fastpath import FastPathRouter
+
+    router = FastPathRouter(enabled=True, today=lambda: TODAY)
+    correct = wrong = missed = 0
+    for text, expected in CORPUS:
+        call = router.route(text)
+        got = (call[0], call[1].model_dump(exclude_none=True, exclude_defaults=False)) if call else None
+        if expected is None:
+            wrong += got is not None
+        elif got is None:
+            missed += 1
+        elif got[0] == expected[0] and all(got[1].get(k) == v for k, v in expected[1].items()) \
+                and got[1].get('return_date') == expected[1].get('return_date'):
+            correct += 1
+        else:
+            wrong += 1
+            print(f'  wrong: {text!r} -> {got}')
+    routable = sum(1 for _, expected in CORPUS if expected)
+    return {'utterances': len(CORPUS), 'routable': routable, 'hits': router.hits, 'correct': correct,
+            'wrong': wrong, 'missed': missed}
+
+
+async def turn_latency(fast_path: bool, llm_delay: float) -> float:
+    from agent import TravelAgent
+    from fastpath import FastPathRouter
+    from tools.cache import search_cache
+    from tools.search_client import aclose_search_client
+
+    durations = []
+    for number, (text, expected) in enumerate(CORPUS):
+        if expected is None:
+            continue
+        name, params = expected
+        llm = ScriptedChatModel(script=[
+            AIMessage(content='', tool_calls=[{'name': name, 'args': {'params': params}, 'id': 'call'}]),
+            AIMessage(content='Here are the options I found.'),
+        ], first_token_delay=llm_delay, token_delay=0.01)
+        agent = TravelAgent(llm=llm, router=FastPathRouter(enabled=fast_path, today=lambda: TODAY))
+        search_cache.clear()
+        config = {'configurable': {'thread_id': f'fast-path-{fast_path}-{number}'}}
+        start = time.perf_counter()
+        await agent.graph.ainvoke({'messages': [HumanMessage(content=text)]}, config)
+        durations.append(time.perf_counter() - start)
+        agent.end_session(config['configurable']['thread_id'])
+    await aclose_search_client()
+    return sum(durations) / len(durations)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--llm-delay', type=float, default=0.8, help='time to first token of the LLM')
+    parser.add_argument('--latency', type=float, default=0.3, help='fake upstream latency')
+    args = parser.parse_args()
+
+    with FakeSerpApi(latency=args.latency) as upstream:
+        # The search client reads its upstream settings on first import
+        os.environ['SERPAPI_BASE_URL'] = upstream.url
+        os.environ.setdefault('SERPAPI_API_KEY', 'fake-key')
+        result = evaluate()
+        follow_up = follow_up_routed()
+        print(f"{result['utterances']} utterances, {result['routable']} fully specified: "
+              f"{result['hits']} routed by the fast path, {result['correct']} correctly, "
+              f"{result['wrong']} wrongly, {result['missed']} left to the LLM")
+        print(f"hit rate {result['hits'] / result['utterances']:.0%} of all turns, "
+              f"{result['correct'] / result['routable']:.0%} of fully specified ones")
+        with_llm = asyncio.run(turn_latency(False, args.llm_delay))
+        with_fast_path = asyncio.run(turn_latency(True, args.llm_delay))
+
+    print(f'turn latency, tool call from the LLM: {with_llm:.3f}s')
+    print(f'turn latency, fast path:              {with_fast_path:.3f}s (saved {with_llm - with_fast_path:.3f}s)')
+    if result['wrong']:
+        print('FAIL: the fast path routed an utterance it should not have, or with wrong inputs')
+        return 1
+    if follow_up:
+        print('FAIL: the fast path routed a follow-up turn without its earlier context')
+        return 1
+    if with_fast_path >= with_llm:
+        print('FAIL: the fast path did not shorten the turn')
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+'''
+Exercise the multi-city itinerary planner against a local fake upstream.
+
+- plan: a three-city trip with hotels is planned in one call. Legs and
+  stays should be searched concurrently, so the plan takes a couple of
+  upstream round trips instead of one per search, and one tool call instead
+  of one LLM turn per search. A trip with more than ITINERARY_MAX_STOPS
+  stops should be refused without searching.
+- stopover: a same-day stopover where the cheapest flight in does not land
+  in time for the cheapest flight out. The plan should pick the cheapest
+  combination that connects.
+- gaps: a stay whose hotels have no prices, then legs without flights. The
+  plan should say which stay or leg is missing and leave out totals it
+  cannot compute instead of understating them.
+
+    python -m benchmarks.itinerary --latency 0.3
+'''
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from benchmarks.fake_serpapi import FakeSerpApi
+
+
+def _trip(optimize: str = 'price'):
+    from tools.itinerary import ItineraryInput, ItineraryStop
+
+    return ItineraryInput(origin='New York', optimize=optimize, adults=2, stops=[
+        ItineraryStop(city='London', arrive_date='2026-12-20', leave_date='2026-12-23'),
+        ItineraryStop(city='Paris', arrive_date='2026-12-23', leave_date='2026-12-27'),
+    ])
+
+
+def _stopover():
+    from tools.itinerary import ItineraryInput, ItineraryStop
+
+    return ItineraryInput(origin='JFK', return_home=False, stops=[
+        ItineraryStop(city='LHR', arrive_date='2026-12-20', leave_date='2026-12-20'),
+        ItineraryStop(city='CDG', arrive_date='2026-12-20', leave_date='2026-12-20'),
+    ])
+
+
+def _gaps():
+    from tools.itinerary import ItineraryInput, ItineraryStop
+
+    return ItineraryInput(origin='JFK', stops=[ItineraryStop(city='LHR', arrive_date='2027-01-10',
+                                                             leave_date='2027-01-12')])
+
+
+async def run(upstream: FakeSerpApi) -> dict:
+    from tools.itinerary import ITINERARY_MAX_STOPS, ItineraryInput, ItineraryStop, aplan_itinerary
+
+    before = upstream.requests
+    start = time.perf_counter()
+    plan = await aplan_itinerary(_trip())
+    elapsed = time.perf_counter() - start
+    searches = upstream.requests - before
+    fastest = await aplan_itinerary(_trip('duration'))
+    stopover = await aplan_itinerary(_stopover())
+    before = upstream.requests
+    too_long = await aplan_itinerary(ItineraryInput(origin='JFK', stops=[
+        ItineraryStop(city='LHR', arrive_date='2026-12-20', leave_date='2026-12-20')] * (ITINERARY_MAX_STOPS + 1)))
+    too_long_searches = upstream.requests - before
+    from tools.cache import search_cache
+
+    upstream.set_response('google_hotels', {'properties': [{'name': 'Unpriced Inn'}]})
+    unpriced = await aplan_itinerary(_gaps())
+    search_cache.clear()
+    upstream.set_response('google_flights', {'best_flights': [], 'other_flights': []})
+    no_flights = await aplan_itinerary(_gaps())
+    return {'plan': plan, 'elapsed': elapsed, 'searches': searches, 'fastest': fastest, 'stopover': stopover,
+            'unpriced': unpriced, 'no_flights': no_flights, 'too_long': too_long,
+            'too_long_searches': too_long_searches}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--llm-turn', type=float, default=1.0,
+                        help='Seconds an LLM turn that issues one more tool call would add')
+    args = parser.parse_args()
+
+    with FakeSerpApi(latency=args.latency) as upstream:
+        os.environ['SERPAPI_BASE_URL'] = upstream.url
+        os.environ.setdefault('SERPAPI_API_KEY', 'fake-key')
+        os.environ.setdefault('SERPAPI_RATE_LIMIT', '0')
+        result = asyncio.run(run(upstream))
+
+    plan, searches = result['plan'], result['searches']
+    print(f"plan: {len(plan['legs'])} legs and {len(plan['stays'])} stays, {searches} searches "
+          f"in {result['elapsed']:.2f}s ({searches * args.latency:.2f}s one after another, "
+          f"~{searches * (args.latency + args.llm_turn):.1f}s as one tool call per LLM turn)")
+    for leg in plan['legs']:
+        flight = leg.get('flight') or {}
+        print(f"  {leg['from']}->{leg['to']} {leg['date']}: ${flight.get('price')} "
+              f"{flight.get('depart')} -> {flight.get('arrive')}")
+    for stay in plan['stays']:
+        print(f"  {stay['city']} {stay['check_in']}..{stay['check_out']}: {(stay.get('hotel') or {}).get('name')}")
+    print(f"plan: total ${plan.get('total_price')} (flights ${plan.get('flight_price')}, "
+          f"hotels ${plan.get('hotel_price')}), {plan.get('air_minutes')} min in the air")
+    fastest = result['fastest']
+    print(f"fastest: total ${fastest.get('total_price')}, {fastest.get('air_minutes')} min in the air")
+    stopover = result['stopover']
+    prices = [(leg.get('flight') or {}).get('price') for leg in stopover['legs']]
+    print(f"stopover: flights {prices}, {stopover.get('notes')}")
+    unpriced, no_flights = result['unpriced'], result['no_flights']
+    print(f"unpriced hotels: total {unpriced.get('total_price')}, {unpriced.get('notes')}")
+    print(f"no flights: total {no_flights.get('total_price')}, {no_flights.get('notes')}")
+
+    failures = []
+    if 'error' in plan or searches != len(plan['legs']) + len(plan['stays']):
+        failures.append('the plan failed or searched more than once per leg and stay')
+    if result['elapsed'] > 2 * args.latency + 0.5:
+        failures.append('legs and stays were not searched concurrently')
+    if not plan.get('total_price') or any('flight' not in leg for leg in plan['legs']):
+        failures.append('the plan is missing flights or totals')
+    if (fastest.get('air_minutes') or 0) > (plan.get('air_minutes') or 0):
+        failures.append('optimizing for duration spent more time in the air than optimizing for price')
+    if prices != [549, 480]:
+        failures.append('the stopover plan did not pick the cheapest connecting flights')
+    if 'error' not in result['too_long'] or result['too_long_searches']:
+        failures.append('a trip with too many stops was searched')
+    if 'total_price' in unpriced or not any('London' in note for note in unpriced.get('notes', [])):
+        failures.append('a stay without prices still got a total, or was not reported')
+    if 'total_price' in no_flights or not any('JFK to LHR' in note for note in no_flights.get('notes', [])) \
+            or any('connects' in note for note in no_flights.get('notes', [])):
+        failures.append('legs without flights were not reported as such')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
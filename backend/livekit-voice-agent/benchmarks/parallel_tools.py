@@ -0,0 +1,78 @@
+'''
+Measure TravelAgent.invoke_tools latency for a multi-tool turn.
+
+Builds an AIMessage that asks for a flight search, a hotel search and a call
+that hangs past the tool timeout, then checks that the turn finishes in about
+the time of the slowest call that completes (or the timeout), not the sum.
+
+    python -m benchmarks.parallel_tools --flight-latency 0.8 --hotel-latency 0.5
+'''
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+
+def sleeping_tool(name: str, latency: float) -> StructuredTool:
+    async def run(params: dict) -> dict:
+        await asyncio.sleep(latency)
+        return {'tool': name, 'latency': latency}
+
+    return StructuredTool.from_function(coroutine=run, name=name, description=f'Fake {name}')
+
+
+async def run(flight_latency: float, hotel_latency: float, timeout: float) -> dict:
+    # The LLM client is built but never called, so any key will do
+    os.environ.setdefault('GOOGLE_API_KEY', 'fake-key')
+    from agent import TravelAgent
+
+    tools = [
+        sleeping_tool('flights_finder', flight_latency),
+        sleeping_tool('hotels_finder', hotel_latency),
+        sleeping_tool('stuck_tool', timeout * 10),
+    ]
+    agent = TravelAgent(tools=tools, tool_timeout=timeout)
+    message = AIMessage(content='', tool_calls=[
+        {'name': 'flights_finder', 'args': {'params': {}}, 'id': 'call-1'},
+        {'name': 'hotels_finder', 'args': {'params': {}}, 'id': 'call-2'},
+        {'name': 'stuck_tool', 'args': {'params': {}}, 'id': 'call-3'},
+    ])
+
+    # invoke_tools is a graph node and needs the run's config; its thread_id also drives the prefetch hooks
+    config = {'configurable': {'thread_id': 'bench'}}
+    start = time.perf_counter()
+    result = await agent.invoke_tools({'messages': [message]}, config)
+    elapsed = time.perf_counter() - start
+    agent.end_session(config['configurable']['thread_id'])
+
+    order = [m.tool_call_id for m in result['messages']]
+    assert order == ['call-1', 'call-2', 'call-3'], order
+    assert 'timed out' in result['messages'][2].content, result['messages'][2].content
+    return {'elapsed': elapsed, 'sequential': flight_latency + hotel_latency + timeout,
+            'slowest': max(flight_latency, hotel_latency, timeout)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--flight-latency', type=float, default=0.8)
+    parser.add_argument('--hotel-latency', type=float, default=0.5)
+    parser.add_argument('--timeout', type=float, default=1.0)
+    args = parser.parse_args()
+
+    stats = asyncio.run(run(args.flight_latency, args.hotel_latency, args.timeout))
+    print(f"turn latency:         {stats['elapsed']:.3f}s")
+    print(f"slowest single call:  {stats['slowest']:.3f}s")
+    print(f"sequential estimate:  {stats['sequential']:.3f}s")
+    if stats['elapsed'] > stats['slowest'] * 1.25:
+        print('FAIL: tool calls are not running concurrently')
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
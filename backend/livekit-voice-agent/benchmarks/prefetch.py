@@ -0,0 +1,134 @@
+'''
+Measure speculative prefetching on a scripted multi-turn conversation.
+
+Each session asks for flights, pauses as a user listening to the answer
+would, then asks for hotels at the destination for the same dates. The
+sessions run with prefetching disabled and enabled against a local fake
+upstream, and the hotel turn latency, upstream request count, prefetch hit
+rate and wasted-call ratio are reported. Finally, prefetches planned while
+the upstream's concurrency limit is taken by other searches should be
+dropped instead of queueing behind them.
+
+    python -m benchmarks.prefetch --sessions 5 --latency 0.8 --think-time 1.5
+'''
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from benchmarks.fake_llm import ScriptedChatModel
+from benchmarks.fake_serpapi import FakeSerpApi
+
+
+def _call(name: str, params: dict) -> AIMessage:
+    return AIMessage(content='', tool_calls=[{'name': name, 'args': {'params': params}, 'id': 'call'}])
+
+
+def build_agent(session: int, prefetcher):
+    from agent import TravelAgent
+
+    # Distinct dates per session so sessions don't share cache entries
+    depart = date(2026, 12, 1) + timedelta(days=session)
+    back = depart + timedelta(days=7)
+    llm = ScriptedChatModel(
+        turns=[
+            [_call('flights_finder', {'departure_airport': 'JFK', 'arrival_airport': 'LHR',
+                                      'outbound_date': depart.isoformat(), 'return_date': back.isoformat()}),
+             AIMessage(content='The cheapest flight is a nonstop for 480 dollars.')],
+            [_call('hotels_finder', {'q': 'London', 'check_in_date': depart.isoformat(),
+                                     'check_out_date': back.isoformat()}),
+             AIMessage(content='The best rated hotel near the center is 210 dollars a night.')],
+            [AIMessage(content='Have a great trip!')],
+        ],
+        first_token_delay=0.3,
+        token_delay=0.01,
+    )
+    return TravelAgent(llm=llm, prefetcher=prefetcher)
+
+
+async def session(number: int, prefetcher, think_time: float) -> float:
+    agent = build_agent(number, prefetcher)
+    thread_id = f'prefetch-{number}'
+    config = {'configurable': {'thread_id': thread_id}}
+    await agent.graph.ainvoke({'messages': [HumanMessage(content='Flights from New York to London?')]}, config)
+    await asyncio.sleep(think_time)
+    start = time.perf_counter()
+    await agent.graph.ainvoke({'messages': [HumanMessage(content='And hotels in London for those dates?')]}, config)
+    hotel_turn = time.perf_counter() - start
+    await agent.graph.ainvoke({'messages': [HumanMessage(content='Thanks!')]}, config)
+    agent.end_session(thread_id)
+    return hotel_turn
+
+
+async def run(sessions: int, think_time: float, budget: int) -> tuple[float, dict]:
+    from prefetch import Prefetcher
+    from tools.cache import search_cache
+    from tools.search_client import aclose_search_client
+
+    search_cache.clear()
+    prefetcher = Prefetcher(budget=budget)
+    latencies = await asyncio.gather(*(session(i, prefetcher, think_time) for i in range(sessions)))
+    await aclose_search_client()
+    return sum(latencies) / len(latencies), prefetcher.stats()
+
+
+async def saturated(upstream: FakeSerpApi) -> tuple[dict, int]:
+    from prefetch import Prefetcher
+    from tools.search_client import aclose_search_client, get_search_client
+
+    prefetcher = Prefetcher()
+    limiter = get_search_client().governor.limiter
+    before = upstream.requests
+    # Hold every upstream slot, as a burst of user searches would
+    slots = int(limiter.limit)
+    for _ in range(slots):
+        await limiter.acquire()
+    prefetcher.on_tool_result('saturated', 'flights_finder', {'params': {
+        'departure_airport': 'JFK', 'arrival_airport': 'CDG', 'outbound_date': '2026-12-10',
+        'return_date': '2026-12-17'}}, {'flights': []})
+    await asyncio.sleep(0.5)
+    for _ in range(slots):
+        limiter.release(None)
+    prefetcher.end_session('saturated')
+    await aclose_search_client()
+    return prefetcher.stats(), upstream.requests - before
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.8)
+    parser.add_argument('--think-time', type=float, default=1.5)
+    parser.add_argument('--budget', type=int, default=4)
+    args = parser.parse_args()
+
+    with FakeSerpApi(latency=args.latency) as upstream:
+        os.environ['SERPAPI_BASE_URL'] = upstream.url
+        os.environ.setdefault('SERPAPI_API_KEY', 'fake-key')
+        baseline, _ = asyncio.run(run(args.sessions, args.think_time, budget=0))
+        baseline_requests = upstream.requests
+        prefetched, stats = asyncio.run(run(args.sessions, args.think_time, budget=args.budget))
+        prefetch_requests = upstream.requests - baseline_requests
+        busy, busy_requests = asyncio.run(saturated(upstream))
+
+    print(f'hotel turn without prefetch: {baseline:.3f}s ({baseline_requests} upstream requests)')
+    print(f'hotel turn with prefetch:    {prefetched:.3f}s ({prefetch_requests} upstream requests)')
+    print(f"prefetches issued {stats['issued']}, hit rate {stats['hit_rate']:.0%}, "
+          f"wasted-call ratio {stats['waste_ratio']:.0%}, cancelled {stats['cancelled']}")
+    print(f"saturated upstream: {busy['dropped']} prefetches dropped, {busy_requests} upstream requests")
+    if prefetched >= baseline:
+        print('FAIL: prefetching did not shorten the hotel turn')
+        return 1
+    if busy_requests or not busy['dropped']:
+        print('FAIL: prefetches went upstream while it had no spare capacity')
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
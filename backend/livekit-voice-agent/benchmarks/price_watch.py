@@ -0,0 +1,202 @@
+'''
+Exercise the price-watch scheduler against a local fake upstream.
+
+Many subscribers watch a handful of distinct searches. The upstream should
+see about one request per search per poll interval, however many watch it,
+and subscribers should be notified exactly once when a price changes and
+never while prices stay the same. A watch made during a call asks for a
+shorter interval than the cache lifetime; its polls should still reach the
+upstream instead of reading the cached result back. Two workers sharing a
+watch store should poll a search watched through both only once, and a
+watch dropped through the worker that does not poll should stop there too.
+
+    python -m benchmarks.price_watch --subscribers 200 --routes 5 --interval 0.5
+'''
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_serpapi import FIXTURES, FakeSerpApi
+
+_DESTINATIONS = ('LHR', 'CDG', 'FRA', 'AMS', 'MAD', 'FCO', 'DUB', 'ZRH')
+
+
+def _searches(routes: int):
+    from tools.flights_finder import FlightsInput
+    from tools.hotels_finder import HotelsInput
+
+    searches = [('google_flights', FlightsInput(departure_airport='JFK', arrival_airport=destination,
+                                                outbound_date='2026-12-20', return_date='2026-12-28'))
+                for destination in _DESTINATIONS[:routes - 1]]
+    searches.append(('google_hotels', HotelsInput(q='London', check_in_date='2026-12-20', check_out_date='2026-12-28')))
+    return searches
+
+
+async def run(upstream: FakeSerpApi, args) -> dict:
+    from price_watch import PriceWatcher
+
+    watcher = PriceWatcher(interval=args.interval, retry=args.interval, rate=0)
+    searches = _searches(args.routes)
+    received = {f'user-{n}': [] for n in range(args.subscribers)}
+    watched = {}
+    for n, subscriber in enumerate(received):
+        async def notify(change, inbox=received[subscriber]):
+            inbox.append(change)
+
+        watcher.subscribe(subscriber, notify)
+        engine, params = searches[n % len(searches)]
+        watcher.watch(subscriber, engine, params)
+        watched[subscriber] = engine
+
+    start = time.monotonic()
+    before = upstream.requests
+    # Baselines, then a few polls with unchanged prices
+    await asyncio.sleep(args.interval * args.polls)
+    quiet = sum(len(inbox) for inbox in received.values())
+
+    # Every flight search now returns its cheapest option $100 cheaper
+    flights = json.loads((FIXTURES / 'google_flights.json').read_text())
+    cheapest = min(flights['best_flights'] + flights['other_flights'], key=lambda f: f['price'])
+    old_price = cheapest['price']
+    cheapest['price'] -= 100
+    upstream.set_response('google_flights', flights)
+    await asyncio.sleep(args.interval * args.polls)
+    elapsed = time.monotonic() - start
+    requests = upstream.requests - before
+    stats = watcher.stats()
+    await watcher.aclose()
+
+    flight_inboxes = [inbox for subscriber, inbox in received.items() if watched[subscriber] == 'google_flights']
+    hotel_inboxes = [inbox for subscriber, inbox in received.items() if watched[subscriber] == 'google_hotels']
+    return {
+        'elapsed': elapsed,
+        'requests': requests,
+        'stats': stats,
+        'quiet_notifications': quiet,
+        'flight_subscribers': len(flight_inboxes),
+        'flight_notified_once': sum(len(inbox) == 1 for inbox in flight_inboxes),
+        'hotel_notifications': sum(len(inbox) for inbox in hotel_inboxes),
+        'drop_correct': all(inbox[0]['previous_lowest'] == old_price and inbox[0]['lowest'] == old_price - 100
+                            for inbox in flight_inboxes if inbox),
+        'sample': next((inbox[0]['message'] for inbox in flight_inboxes if inbox), None),
+    }
+
+
+async def live(upstream: FakeSerpApi, args) -> int:
+    from price_watch import PriceWatcher
+    from tools.cache import search_cache
+    from tools.flights_finder import FlightsInput
+
+    # Polls every hour by default, with results cached longer than the call lasts
+    search_cache.ttl = 3600
+    watcher = PriceWatcher(interval=3600, retry=args.interval, rate=0)
+
+    async def notify(change):
+        pass
+
+    watcher.subscribe('room:live', notify)
+    watcher.watch('room:live', 'google_flights', FlightsInput(departure_airport='JFK', arrival_airport='LHR',
+                                                                outbound_date='2026-12-21'), interval=args.interval)
+    before = upstream.requests
+    await asyncio.sleep(args.interval * args.polls)
+    await watcher.aclose()
+    return upstream.requests - before
+
+
+async def shared(upstream: FakeSerpApi, args) -> dict:
+    from price_watch import PriceWatcher, WatchStore
+    from tools.cache import search_cache
+    from tools.flights_finder import FlightsInput
+
+    async def notify(change):
+        pass
+
+    # Shorter than the poll interval again, so every poll reaches the upstream
+    search_cache.ttl = args.interval / 4
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'watches.sqlite3')
+        workers = [PriceWatcher(interval=args.interval, retry=args.interval, rate=0, store=WatchStore(path),
+                                deliver=lambda subscriber: notify, sync_interval=args.interval / 2)
+                   for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        params = FlightsInput(departure_airport='JFK', arrival_airport='LHR', outbound_date='2026-12-22')
+        watch_ids = [worker.watch(f'user-{n}', 'google_flights', params)['watch_id'] for n, worker in enumerate(workers)]
+        before = upstream.requests
+        await asyncio.sleep(args.interval * args.polls)
+        requests = upstream.requests - before
+        polling = [worker.stats() for worker in workers if worker.leader]
+        # Drop both watches through the worker that is not polling
+        standby = next((worker for worker in workers if not worker.leader), workers[0])
+        dropped = all(standby.unwatch(watch_id) for watch_id in watch_ids)
+        await asyncio.sleep(args.interval)
+        remaining = sum(worker.stats()['watches'] for worker in workers)
+        for worker in workers:
+            await worker.aclose()
+    return {'requests': requests, 'polling': polling, 'dropped': dropped, 'remaining': remaining}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscribers', type=int, default=200)
+    parser.add_argument('--routes', type=int, default=5)
+    parser.add_argument('--interval', type=float, default=0.5)
+    parser.add_argument('--polls', type=int, default=4)
+    args = parser.parse_args()
+
+    with FakeSerpApi(latency=0.02) as upstream:
+        os.environ['SERPAPI_BASE_URL'] = upstream.url
+        os.environ.setdefault('SERPAPI_API_KEY', 'fake-key')
+        os.environ.setdefault('SERPAPI_RATE_LIMIT', '0')
+        # Shorter than the poll interval, so every poll reaches the upstream
+        os.environ['SEARCH_CACHE_TTL'] = str(args.interval / 4)
+        result = asyncio.run(run(upstream, args))
+        live_requests = asyncio.run(live(upstream, args))
+        shared_result = asyncio.run(shared(upstream, args))
+
+    # Each route is polled about once per interval, plus its baseline poll
+    polls_per_route = result['elapsed'] / args.interval + 1
+    naive = round(args.subscribers * polls_per_route)
+    print(f"{args.subscribers} subscribers on {args.routes} routes for {result['elapsed']:.1f}s: "
+          f"{result['requests']} upstream requests ({naive} if every watch polled on its own)")
+    print(f"scheduler: {result['stats']}")
+    print(f"notifications while prices were unchanged: {result['quiet_notifications']}")
+    print(f"after a $100 drop: {result['flight_notified_once']}/{result['flight_subscribers']} flight subscribers "
+          f"notified once, {result['hotel_notifications']} hotel notifications")
+    print(f"sample: {result['sample']}")
+    print(f"live watch every {args.interval}s for {args.interval * args.polls:.1f}s: "
+          f"{live_requests} upstream requests with an hour-long cache")
+    polling = shared_result['polling']
+    print(f"two workers, one watch each on the same search: {len(polling)} polling, "
+          f"{polling[0]['routes'] if polling else 0} route, {shared_result['requests']} upstream requests; "
+          f"{shared_result['remaining']} watches left after dropping both through the other worker")
+
+    failures = []
+    if result['requests'] > args.routes * (polls_per_route + 1):
+        failures.append('upstream requests grew with subscribers, not routes')
+    if result['quiet_notifications'] or result['hotel_notifications']:
+        failures.append('subscribers were notified without a price change')
+    if result['flight_notified_once'] != result['flight_subscribers'] or not result['drop_correct']:
+        failures.append('price drop was not delivered exactly once to every flight subscriber')
+    if live_requests < args.polls:
+        failures.append('polls of a live watch were answered from the cache')
+    if len(polling) != 1 or polling[0]['routes'] != 1 or polling[0]['watches'] != 2 \
+            or shared_result['requests'] > args.polls + 2:
+        failures.append('workers sharing a watch store did not poll the search once between them')
+    if not shared_result['dropped'] or shared_result['remaining']:
+        failures.append('watches dropped through another worker were still polled')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+'''
+Measure filtering and sorting of stored results on synthetic itineraries.
+
+Generates a few thousand flights and hotels in SerpAPI's response shape,
+stores them like a search would, and times typical follow-ups ("cheapest
+nonstop", "arrive before 6pm", "business class", "4-star under $200") through the
+filter_flights and filter_hotels tools: the first query of a result set
+builds its columns, later ones reuse them. A plain Python loop over the
+records answers the same query as a baseline, and both must agree.
+
+    python -m benchmarks.refine --flights 5000 --hotels 2000
+'''
+import argparse
+import random
+import sys
+import time
+
+AIRLINES = ['Delta', 'United', 'American', 'British Airways', 'Virgin Atlantic', 'Lufthansa', 'Air France', 'KLM']
+CABINS = ['Economy', 'Economy', 'Economy', 'Premium economy', 'Business', 'First']
+
+
+def synthetic_flights(count: int, rng: random.Random) -> list:
+    flights = []
+    for _ in range(count):
+        stops = rng.choice([0, 0, 1, 1, 2])
+        depart = rng.randrange(24 * 60)
+        duration = 400 + stops * rng.randrange(60, 300)
+        arrive = (depart + duration) % (24 * 60)
+        cabin = rng.choice(CABINS)
+        legs = [{'airline': rng.choice(AIRLINES), 'flight_number': f'XX {rng.randrange(1000)}', 'travel_class': cabin}
+                for _ in range(stops + 1)]
+        legs[0]['departure_airport'] = {'id': 'JFK', 'time': f'2026-12-20 {depart // 60:02d}:{depart % 60:02d}'}
+        legs[-1]['arrival_airport'] = {'id': 'LHR', 'time': f'2026-12-21 {arrive // 60:02d}:{arrive % 60:02d}'}
+        flights.append({'flights': legs, 'total_duration': duration, 'price': rng.randrange(300, 2000)})
+    return flights
+
+
+def synthetic_hotels(count: int, rng: random.Random) -> list:
+    return [{
+        'name': f'Hotel {i}',
+        'rate_per_night': {'extracted_lowest': rng.randrange(60, 600)},
+        'total_rate': {'extracted_lowest': rng.randrange(400, 5000)},
+        'overall_rating': round(rng.uniform(2.5, 5.0), 1),
+        'reviews': rng.randrange(5000),
+        'extracted_hotel_class': rng.choice([2, 3, 3, 4, 4, 5]),
+    } for i in range(count)]
+
+
+def _minutes(time: str) -> int:
+    hours, minutes = time[-5:].split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def python_cheapest_nonstop_before(records: list, arrive_before: int, limit: int) -> list:
+    matches = [r for r in records
+               if len(r['flights']) == 1 and _minutes(r['flights'][-1]['arrival_airport']['time']) <= arrive_before]
+    return sorted(matches, key=lambda r: r['price'])[:limit]
+
+
+def timed(call, repeat: int) -> tuple[float, object]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = call()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--flights', type=int, default=5000)
+    parser.add_argument('--hotels', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    from tools.agent_tools import filter_flights, filter_hotels
+    from tools.results import result_store
+
+    # Every query stores its matches as a new result set; keep the synthetic ones from being evicted
+    result_store.max_entries = max(result_store.max_entries, 10 * args.repeat)
+    result_store.max_bytes = max(result_store.max_bytes, 10 * args.repeat * 1000 * (args.flights + args.hotels))
+    rng = random.Random(0)
+    flights, hotels = synthetic_flights(args.flights, rng), synthetic_hotels(args.hotels, rng)
+    flights_id, hotels_id = result_store.put('flights', flights), result_store.put('hotels', hotels)
+    queries = [
+        ('cheapest nonstop', filter_flights, {'result_id': flights_id, 'max_stops': 0}),
+        ('arrive before 6pm', filter_flights, {'result_id': flights_id, 'arrive_before': '18:00'}),
+        ('shortest Delta under $800', filter_flights,
+         {'result_id': flights_id, 'airline': 'delta', 'max_price': 800, 'sort_by': 'duration'}),
+        ('business class under $1500', filter_flights,
+         {'result_id': flights_id, 'travel_class': 'Business', 'max_price': 1500}),
+        ('4-star under $200', filter_hotels, {'result_id': hotels_id, 'min_class': 4, 'max_price_per_night': 200}),
+        ('best rated, 1000+ reviews', filter_hotels, {'result_id': hotels_id, 'min_reviews': 1000}),
+    ]
+
+    cold, _ = timed(lambda: filter_flights.invoke({'params': {'result_id': flights_id}}), 1)
+    print(f'{args.flights} flights, {args.hotels} hotels; first query incl. building columns: {cold * 1e3:.2f} ms')
+    worst = 0.0
+    for label, tool, params in queries:
+        elapsed, page = timed(lambda: tool.invoke({'params': params}), args.repeat)
+        worst = max(worst, elapsed)
+        print(f"{label:28s} {elapsed * 1e3:7.3f} ms  ({page.get('matches', 0)} of {page.get('searched')} match)")
+
+    params = {'result_id': flights_id, 'max_stops': 0, 'arrive_before': '18:00'}
+    vectorized, page = timed(lambda: filter_flights.invoke({'params': params}), args.repeat)
+    loop, expected = timed(lambda: python_cheapest_nonstop_before(flights, 18 * 60, 5), args.repeat)
+    print(f'cheapest nonstop arriving by 18:00: {vectorized * 1e3:.3f} ms vectorized, {loop * 1e3:.3f} ms Python loop')
+
+    if [f['price'] for f in page['flights']] != [r['price'] for r in expected]:
+        print('FAIL: vectorized and Python results differ')
+        return 1
+    if worst > 0.05:
+        print('FAIL: a follow-up took longer than 50 ms')
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+'''
+Compare paging through a stored result with searching again.
+
+Searches hotels once against a local fake upstream, then fetches the
+remaining options page by page with the more_results tool and through
+GET /results/{result_id}, and compares that with repeating the search
+(cache cleared, as it would be for a search with slightly different
+parameters). Paging should make no upstream requests and take about a
+millisecond per page, and a second worker should be able to page the same
+result_id and a filtered subset of it from the shared store.
+
+    python -m benchmarks.result_paging --latency 0.5
+'''
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_serpapi import FakeSerpApi
+
+
+async def run() -> dict:
+    import main
+    from tools.cache import search_cache
+    from tools.agent_tools import hotels_finder, more_results
+    from tools.hotels_finder import HotelsInput
+    from tools.refine import FilterHotelsInput, filter_hotels_result
+    from tools.results import ResultStore, compact_result, result_store
+    from tools.search_client import aclose_search_client
+
+    params = {'params': HotelsInput(q='London', check_in_date='2026-12-20',
+                                    check_out_date='2026-12-28').model_dump()}
+    search_cache.clear()
+    start = time.perf_counter()
+    first = json.loads(compact_result(await hotels_finder.ainvoke(params)))
+    search = time.perf_counter() - start
+
+    pages, tool_time, offset = 0, 0.0, first.get('next_offset')
+    while offset is not None:
+        start = time.perf_counter()
+        page = await more_results.ainvoke({'params': {'result_id': first['result_id'], 'offset': offset}})
+        tool_time += time.perf_counter() - start
+        pages += 1
+        offset = page.get('next_offset')
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        start = time.perf_counter()
+        response = await client.get(f"/results/{first['result_id']}", params={'offset': 5, 'limit': 5})
+        api_time = time.perf_counter() - start
+        assert response.status_code == 200, response.text
+
+    # Another worker has none of this process's result sets in memory
+    other = ResultStore(path=result_store.path)
+    filtered = filter_hotels_result(FilterHotelsInput(result_id=first['result_id'], sort_by='price'))
+    start = time.perf_counter()
+    shared = other.get(first['result_id'])
+    other_page = time.perf_counter() - start
+    shared_filtered = other.get(filtered['result_id'])
+    expected = result_store.get(filtered['result_id'])
+
+    search_cache.clear()
+    start = time.perf_counter()
+    await hotels_finder.ainvoke(params)
+    research = time.perf_counter() - start
+    await aclose_search_client()
+    return {'total': first['total'], 'search': search, 'pages': pages, 'page': tool_time / max(pages, 1),
+            'api_page': api_time, 'research': research, 'other_page': other_page,
+            'shared': shared is not None and len(shared[1]) == first['total'],
+            'shared_filtered': shared_filtered is not None and shared_filtered == expected}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--latency', type=float, default=0.5)
+    args = parser.parse_args()
+
+    with FakeSerpApi(latency=args.latency) as upstream, tempfile.TemporaryDirectory() as tmp:
+        # The search client and result store read their settings on first import
+        os.environ['SERPAPI_BASE_URL'] = upstream.url
+        os.environ.setdefault('SERPAPI_API_KEY', 'fake-key')
+        os.environ['RESULT_STORE_PATH'] = os.path.join(tmp, 'results.sqlite3')
+        before = upstream.requests
+        result = asyncio.run(run())
+        requests = upstream.requests - before
+
+    print(f"first search:       {result['search'] * 1e3:8.2f} ms ({result['total']} hotels kept)")
+    print(f"more_results page:  {result['page'] * 1e3:8.2f} ms ({result['pages']} pages)")
+    print(f"/results page:      {result['api_page'] * 1e3:8.2f} ms")
+    print(f"other worker:       {result['other_page'] * 1e3:8.2f} ms (from the shared store)")
+    print(f"search again:       {result['research'] * 1e3:8.2f} ms")
+    print(f'upstream requests:  {requests} (one search, one repeat)')
+    if requests != 2 or result['page'] > result['research'] / 10:
+        print('FAIL: paging is not served from memory')
+        return 1
+    if not result['shared'] or not result['shared_filtered']:
+        print('FAIL: another worker cannot page the stored result')
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
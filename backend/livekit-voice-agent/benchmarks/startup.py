@@ -0,0 +1,55 @@
+'''
+Compare the per-job setup cost of a cold worker process with a prewarmed one.
+
+A cold job loads the VAD model and builds a TravelAgent (LLM client,
+bind_tools, graph compilation) before it can greet the user. A warm job
+reuses what `prewarm` built once for the process. Only the work on the
+critical path before the greeting is timed; no LiveKit connection is made.
+
+    python -m benchmarks.startup --jobs 5
+'''
+import argparse
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--jobs', type=int, default=5)
+    args = parser.parse_args()
+
+    # The LLM client is built but never called, so any key will do
+    os.environ.setdefault('GOOGLE_API_KEY', 'fake-key')
+    from livekit.plugins import silero
+    import agent
+
+    cold = []
+    for i in range(args.jobs):
+        start = time.perf_counter()
+        silero.VAD.load()
+        agent.Assistant(thread_id=f'cold-{i}', travel_agent=agent.TravelAgent())
+        cold.append(time.perf_counter() - start)
+
+    proc = SimpleNamespace(userdata={})
+    start = time.perf_counter()
+    agent.prewarm(proc)
+    prewarm = time.perf_counter() - start
+
+    warm = []
+    for i in range(args.jobs):
+        start = time.perf_counter()
+        assert 'vad' in proc.userdata
+        agent.Assistant(thread_id=f'warm-{i}')
+        warm.append(time.perf_counter() - start)
+
+    print(f'prewarm (once per process): {prewarm * 1000:8.1f} ms')
+    print(f'cold job setup (median):    {statistics.median(cold) * 1000:8.1f} ms')
+    print(f'warm job setup (median):    {statistics.median(warm) * 1000:8.1f} ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
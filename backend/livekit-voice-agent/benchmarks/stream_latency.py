@@ -0,0 +1,84 @@
+'''
+Measure time-to-first-chunk and full response time of a travel turn.
+
+Runs one turn (LLM asks for a flight search, a fake tool answers, the LLM
+writes a reply) with a scripted fake LLM, once through graph.ainvoke as the
+non-streaming path did and once through stream_graph, and reports when the
+first status event, the first sentence and the full reply became available.
+
+    python -m benchmarks.stream_latency --first-token-delay 0.4 --token-delay 0.03
+'''
+import argparse
+import asyncio
+import sys
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import StructuredTool
+
+from benchmarks.fake_llm import ScriptedChatModel
+
+REPLY = ('I found a few good options for your trip to London. The cheapest is an Iberia nonstop '
+         'for 480 dollars, leaving JFK at 9:08 PM and landing at Heathrow at 4:10 AM. '
+         'If you prefer a daytime flight, Aer Lingus leaves at 8:34 AM for 939 dollars. '
+         'British Airways has a one-stop option through Dublin for 612 dollars. '
+         'Would you like me to look for hotels near your arrival airport as well?')
+
+
+def build_agent(first_token_delay: float, token_delay: float, tool_latency: float):
+    from agent import TravelAgent
+
+    async def search(params: dict) -> dict:
+        await asyncio.sleep(tool_latency)
+        return {'flights': []}
+
+    llm = ScriptedChatModel(
+        script=[
+            AIMessage(content='', tool_calls=[{'name': 'flights_finder', 'args': {'params': {}}, 'id': 'call'}]),
+            AIMessage(content=REPLY),
+        ],
+        first_token_delay=first_token_delay,
+        token_delay=token_delay,
+    )
+    tool = StructuredTool.from_function(coroutine=search, name='flights_finder', description='Fake flight search')
+    return TravelAgent(tools=[tool], llm=llm)
+
+
+async def run(args) -> dict:
+    from streaming import stream_graph
+
+    agent = build_agent(args.first_token_delay, args.token_delay, args.tool_latency)
+    inputs = {'messages': [HumanMessage(content='Flights from JFK to London on 2026-12-20?')]}
+
+    start = time.perf_counter()
+    await agent.graph.ainvoke(inputs, {'configurable': {'thread_id': 'blocking'}})
+    blocking = time.perf_counter() - start
+
+    first_status = first_text = None
+    start = time.perf_counter()
+    async for kind, _ in stream_graph(agent.graph, inputs, {'configurable': {'thread_id': 'streaming'}}):
+        elapsed = time.perf_counter() - start
+        if kind == 'status' and first_status is None:
+            first_status = elapsed
+        if kind == 'text' and first_text is None:
+            first_text = elapsed
+    streaming = time.perf_counter() - start
+    return {'blocking': blocking, 'first_status': first_status, 'first_text': first_text, 'streaming': streaming}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--first-token-delay', type=float, default=0.4)
+    parser.add_argument('--token-delay', type=float, default=0.03)
+    parser.add_argument('--tool-latency', type=float, default=0.8)
+    args = parser.parse_args()
+
+    stats = asyncio.run(run(args))
+    print(f"blocking:  first chunk = full response = {stats['blocking']:.3f}s")
+    print(f"streaming: first status {stats['first_status']:.3f}s, first sentence {stats['first_text']:.3f}s, "
+          f"full response {stats['streaming']:.3f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+'''
+End-to-end benchmark suite, runnable fully offline.
+
+Searches go to the fake SerpAPI server and the agent runs on the scripted
+fake chat model, so no quota or credits are used. Three scenarios are
+measured and written to a JSON report:
+
+  search    /flights/search and /hotels/search throughput and latency under
+            concurrency, through the FastAPI app in-process
+  graph     per-node latency of TravelAgent.graph over repeated turns
+  sessions  turn latency and throughput of many concurrent agent sessions
+
+Compare against an earlier report to fail CI on regressions:
+
+    python -m benchmarks.suite --output report.json --baseline baseline.json --tolerance 0.25
+'''
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from benchmarks.fake_llm import ScriptedChatModel
+from benchmarks.fake_serpapi import FakeSerpApi
+
+REPLY = ('The cheapest option is a nonstop for 480 dollars, leaving in the evening and landing early '
+         'the next morning. There is also a daytime flight for 612 dollars. Shall I look for hotels too?')
+# Absolute slack for latency comparisons, so sub-millisecond nodes don't flap
+NOISE_FLOOR = 0.005
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    '''Nearest-rank percentile, 0 for an empty sample.'''
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q / 100 * len(ordered)), len(ordered) - 1)]
+
+
+def latency_stats(values: Sequence[float]) -> Dict[str, float]:
+    return {
+        'count': len(values),
+        'mean_s': round(sum(values) / len(values), 4) if values else 0.0,
+        'p50_s': round(percentile(values, 50), 4),
+        'p95_s': round(percentile(values, 95), 4),
+        'max_s': round(max(values), 4) if values else 0.0,
+    }
+
+
+def flight_body(i: int) -> Dict[str, Any]:
+    # Distinct dates per request so every search reaches the upstream
+    outbound = date(2026, 12, 1) + timedelta(days=i % 300)
+    return {'departure_airport': 'JFK', 'arrival_airport': 'LHR', 'outbound_date': outbound.isoformat(),
+            'return_date': (outbound + timedelta(days=7)).isoformat(), 'adults': 1 + i // 300}
+
+
+def hotel_body(i: int) -> Dict[str, Any]:
+    check_in = date(2026, 12, 1) + timedelta(days=i % 300)
+    return {'q': 'London', 'check_in_date': check_in.isoformat(),
+            'check_out_date': (check_in + timedelta(days=3)).isoformat(), 'adults': 1 + i // 300}
+
+
+async def bench_search(path: str, body, requests: int, concurrency: int) -> Dict[str, Any]:
+    import httpx
+    from main import app
+    from tools.cache import search_cache
+
+    search_cache.clear()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(client, i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(path, json=body(i))
+            latencies.append(time.perf_counter() - start)
+        if response.status_code != 200 or 'error' in response.json().get('result', {}):
+            errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+    return {'requests': requests, 'concurrency': concurrency, 'errors': errors,
+            'throughput_rps': round(requests / elapsed, 2), **latency_stats(latencies)}
+
+
+def build_agent(args):
+    from agent import TravelAgent
+
+    # A flight search followed by a spoken reply, answered by the real tools
+    llm = ScriptedChatModel(
+        script=[
+            AIMessage(content='', tool_calls=[{'name': 'flights_finder', 'id': 'call', 'args': {'params': {
+                'departure_airport': 'JFK', 'arrival_airport': 'LHR',
+                'outbound_date': '2026-12-20', 'return_date': '2026-12-28'}}}]),
+            AIMessage(content=REPLY),
+        ],
+        first_token_delay=args.llm_delay,
+        token_delay=args.token_delay,
+    )
+    return TravelAgent(llm=llm)
+
+
+async def bench_graph(args) -> Dict[str, Any]:
+    from tools.cache import search_cache
+
+    agent = build_agent(args)
+    durations: Dict[str, List[float]] = defaultdict(list)
+    turns: List[float] = []
+    for i in range(args.turns):
+        # Cold cache on every turn so tool latency includes the upstream round trip
+        search_cache.clear()
+        started: Dict[str, float] = {}
+        inputs = {'messages': [HumanMessage(content='Flights from JFK to London on 2026-12-20?')]}
+        start = time.perf_counter()
+        async for event in agent.graph.astream(inputs, {'configurable': {'thread_id': f'graph-{i}'}},
+                                               stream_mode='tasks'):
+            now = time.perf_counter()
+            if 'triggers' in event:
+                started[event['id']] = now
+            elif event['id'] in started:
+                durations[event['name']].append(now - started.pop(event['id']))
+        turns.append(time.perf_counter() - start)
+        agent.end_session(f'graph-{i}')
+    return {'turns': args.turns, 'turn': latency_stats(turns),
+            'nodes': {name: latency_stats(values) for name, values in durations.items()}}
+
+
+async def bench_sessions(args) -> Dict[str, Any]:
+    from tools.cache import search_cache
+
+    search_cache.clear()
+    before = search_cache.stats()
+    agent = build_agent(args)
+    latencies: List[float] = []
+
+    async def session(s: int) -> None:
+        config = {'configurable': {'thread_id': f'session-{s}'}}
+        for t in range(args.session_turns):
+            start = time.perf_counter()
+            await agent.graph.ainvoke({'messages': [HumanMessage(content=f'Turn {t}: flights to London?')]}, config)
+            latencies.append(time.perf_counter() - start)
+        agent.end_session(f'session-{s}')
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(s) for s in range(args.sessions)))
+    elapsed = time.perf_counter() - start
+    total = args.sessions * args.session_turns
+    return {'sessions': args.sessions, 'turns_per_session': args.session_turns,
+            'throughput_turns_per_s': round(total / elapsed, 2), 'turn': latency_stats(latencies),
+            'cache': {k: search_cache.stats()[k] - before[k] for k in ('hits', 'misses', 'coalesced')}}
+
+
+async def run(args, upstream: FakeSerpApi) -> Dict[str, Any]:
+    from tools.search_client import aclose_search_client
+
+    results: Dict[str, Any] = {}
+    if 'search' in args.scenarios:
+        results['search'] = {
+            'flights': await bench_search('/flights/search', flight_body, args.requests, args.concurrency),
+            'hotels': await bench_search('/hotels/search', hotel_body, args.requests, args.concurrency),
+        }
+    if 'graph' in args.scenarios:
+        results['graph'] = await bench_graph(args)
+    if 'sessions' in args.scenarios:
+        results['sessions'] = await bench_sessions(args)
+    results['upstream'] = {'requests': upstream.requests, 'errors': upstream.errors}
+    await aclose_search_client()
+    return results
+
+
+def _flatten(value: Any, prefix: str = '') -> Dict[str, float]:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(_flatten(item, f'{prefix}.{key}' if prefix else key))
+        return flat
+    return {prefix: value} if isinstance(value, (int, float)) and not isinstance(value, bool) else {}
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    '''
+    List metrics that regressed beyond `tolerance` (a fraction) against the
+    baseline report: latencies (`*_s`) that grew and throughputs that shrank.
+    Latency changes under NOISE_FLOOR seconds are ignored.
+    '''
+    current, previous = _flatten(report['results']), _flatten(baseline.get('results', {}))
+    regressions = []
+    for key, old in previous.items():
+        new = current.get(key)
+        if new is None or not old:
+            continue
+        if key.endswith('_s') and new > old * (1 + tolerance) + NOISE_FLOOR:
+            regressions.append(f'{key}: {old} -> {new}')
+        elif 'throughput' in key and new < old * (1 - tolerance):
+            regressions.append(f'{key}: {old} -> {new}')
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', default=['search', 'graph', 'sessions'],
+                        choices=['search', 'graph', 'sessions'])
+    parser.add_argument('--latency', type=float, default=0.2, help='fake SerpAPI latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--requests', type=int, default=200, help='search requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--turns', type=int, default=10, help='turns for per-node graph latency')
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--session-turns', type=int, default=3)
+    parser.add_argument('--llm-delay', type=float, default=0.2, help='fake LLM time to first token')
+    parser.add_argument('--token-delay', type=float, default=0.01)
+    parser.add_argument('--output', default='benchmark-report.json')
+    parser.add_argument('--baseline', help='earlier report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    with FakeSerpApi(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=0) as upstream:
+        # The search client reads its upstream settings on first import
+        os.environ['SERPAPI_BASE_URL'] = upstream.url
+        os.environ.setdefault('SERPAPI_API_KEY', 'fake-key')
+        # The fake upstream has no quota to protect, so measure the app rather than the rate limit
+        os.environ.setdefault('SERPAPI_RATE_LIMIT', '0')
+        results = asyncio.run(run(args, upstream))
+
+    report = {
+        'generated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f'report written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print('FAIL: regressions against baseline')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+        print('OK: no regressions against baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
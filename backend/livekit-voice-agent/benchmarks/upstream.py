@@ -0,0 +1,223 @@
+'''
+Exercise the upstream governor against a local fake upstream.
+
+Three scenarios:
+
+- rate: several worker processes search as fast as they can through one
+  shared token bucket; the upstream should see about the configured rate
+  in total, not that rate per process.
+- adaptive: a steady stream of concurrent searches while the upstream slows
+  down past the target latency; the concurrency limit should shrink.
+- breaker: the upstream fails every request; the circuit should open, later
+  searches should fail in milliseconds, a cached route should still be
+  answered from its stale result, and the circuit should close again via
+  the half-open probe once the upstream recovers.
+- fallback: the shared bucket's database cannot be opened for a while;
+  those calls should be limited per process, and the shared bucket should
+  be used again as soon as it can be opened.
+
+    python -m benchmarks.upstream --processes 4 --rate 5 --duration 4
+'''
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_serpapi import FakeSerpApi
+
+
+def _flights(number: int, arrival: str = 'LHR'):
+    from tools.flights_finder import FlightsInput
+    outbound = f'2026-{1 + number // 28 % 12:02d}-{1 + number % 28:02d}'
+    return FlightsInput(departure_airport='JFK', arrival_airport=arrival, outbound_date=outbound)
+
+
+def _worker(seed: int, duration: float, queue) -> None:
+    from tools.flights_finder import _search_params
+    from tools.search_client import get_search_client
+    from tools.upstream import UpstreamUnavailable
+
+    client = get_search_client()
+    deadline = time.monotonic() + duration
+    searches = rejected = 0
+    number = seed * 10000
+    while time.monotonic() < deadline:
+        number += 1
+        try:
+            client.search(_search_params(_flights(number)))
+            searches += 1
+        except UpstreamUnavailable:
+            rejected += 1
+    client.close()
+    queue.put((searches, rejected))
+
+
+def shared_rate(upstream: FakeSerpApi, args) -> dict:
+    # Children inherit the environment, which the governor reads on import
+    os.environ['SERPAPI_RATE_LIMIT'] = str(args.rate)
+    os.environ['SERPAPI_RATE_BURST'] = '1'
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    before = upstream.requests
+    workers = [context.Process(target=_worker, args=(seed, args.duration, queue)) for seed in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    results = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    # Each worker searches for `duration` once it has started, so that is the measured window
+    return {
+        'upstream_requests': upstream.requests - before,
+        'rate': (upstream.requests - before) / args.duration,
+        'rejected': sum(rejected for _, rejected in results),
+    }
+
+
+async def adaptive(upstream: FakeSerpApi, args) -> dict:
+    from tools.flights_finder import _search_params
+    from tools.search_client import SearchClient, is_upstream_fault
+    from tools.upstream import AdaptiveLimiter, TokenBucket, UpstreamGovernor
+
+    limiter = AdaptiveLimiter(min_limit=2, max_limit=16, target_latency=args.target_latency)
+    client = SearchClient(governor=UpstreamGovernor(bucket=TokenBucket(rate=0), limiter=limiter,
+                                                    is_fault=is_upstream_fault))
+    counter = iter(range(10 ** 6))
+
+    async def load(seconds: float) -> float:
+        # 32 callers keep the limiter saturated; report the limit it settled on
+        samples = []
+        deadline = time.monotonic() + seconds
+
+        async def caller():
+            while time.monotonic() < deadline:
+                await client.asearch(_search_params(_flights(next(counter))))
+                samples.append(limiter.limit)
+
+        await asyncio.gather(*(caller() for _ in range(32)))
+        return samples[-1] if samples else limiter.limit
+
+    upstream.latency = args.target_latency / 4
+    fast = await load(args.duration / 2)
+    upstream.latency = args.target_latency * 2
+    slow = await load(args.duration)
+    upstream.latency = args.target_latency / 4
+    recovered = await load(args.duration)
+    await client.aclose()
+    return {'fast_limit': fast, 'slow_limit': slow, 'recovered_limit': recovered}
+
+
+async def breaker(upstream: FakeSerpApi, args) -> dict:
+    from tools.cache import SearchCache
+    from tools.search_client import SearchClient, is_upstream_fault
+    from tools.upstream import CLOSED, OPEN, CircuitBreaker, TokenBucket, UpstreamGovernor
+    import tools.flights_finder as flights_module
+    import tools.search_client as client_module
+
+    circuit = CircuitBreaker(failure_threshold=3, cooldown=args.cooldown)
+    client_module._search_client = SearchClient(governor=UpstreamGovernor(bucket=TokenBucket(rate=0),
+                                                                          breaker=circuit, is_fault=is_upstream_fault))
+    # A short TTL so the cached route has expired by the time the upstream fails
+    flights_module.search_cache = SearchCache(ttl=0.2, stale_ttl=600)
+    result = {}
+
+    upstream.error_rate = 0.0
+    cached = await flights_module.afind_flights(_flights(0, 'CDG'))
+    assert 'flights' in cached, cached
+    await asyncio.sleep(0.3)
+
+    upstream.error_rate = 1.0
+    for number in range(1, circuit.failure_threshold + 1):
+        await flights_module.afind_flights(_flights(number, 'CDG'))
+    result['opened'] = circuit.state == OPEN
+
+    before = upstream.requests
+    start = time.perf_counter()
+    failed = await flights_module.afind_flights(_flights(100, 'CDG'))
+    result['fail_fast'] = time.perf_counter() - start
+    result['fail_fast_error'] = failed.get('error')
+    stale = await flights_module.afind_flights(_flights(0, 'CDG'))
+    result['stale_notice'] = stale.get('notice')
+    result['stale_flights'] = len(stale.get('flights', []))
+    result['requests_while_open'] = upstream.requests - before
+
+    upstream.error_rate = 0.0
+    await asyncio.sleep(args.cooldown)
+    recovered = await flights_module.afind_flights(_flights(200, 'CDG'))
+    result['closed'] = circuit.state == CLOSED and 'flights' in recovered
+    await client_module.aclose_search_client()
+    return result
+
+
+def fallback(tmp: str) -> dict:
+    from tools.upstream import TokenBucket
+
+    # The directory of the database is missing at first, so every connection fails
+    directory = os.path.join(tmp, 'later')
+    bucket = TokenBucket(rate=1, burst=2, path=os.path.join(directory, 'ratelimit.sqlite3'), name='fallback')
+    waits = [bucket.try_acquire() for _ in range(3)]
+    degraded = bucket.degraded
+    os.makedirs(directory)
+    recovered = bucket.try_acquire() == 0 and not bucket.degraded and os.path.exists(bucket.path)
+    return {'waits': waits, 'degraded': degraded, 'recovered': recovered}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=5)
+    parser.add_argument('--duration', type=float, default=4)
+    parser.add_argument('--target-latency', type=float, default=0.2)
+    parser.add_argument('--cooldown', type=float, default=1.0)
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp, FakeSerpApi(latency=0.01) as upstream:
+        os.environ['SERPAPI_BASE_URL'] = upstream.url
+        os.environ.setdefault('SERPAPI_API_KEY', 'fake-key')
+        os.environ['SERPAPI_RATE_LIMIT_PATH'] = os.path.join(tmp, 'ratelimit.sqlite3')
+
+        rate = shared_rate(upstream, args)
+        print(f"rate: {args.processes} processes at a shared {args.rate:g}/s -> upstream saw {rate['rate']:.2f}/s "
+              f"({rate['upstream_requests']} requests, {rate['rejected']} rejected)")
+        if not args.rate * 0.75 <= rate['rate'] <= args.rate * 1.25:
+            failures.append('processes are not sharing the rate limit')
+
+        limits = asyncio.run(adaptive(upstream, args))
+        print(f"adaptive: concurrency limit {limits['fast_limit']:.1f} while fast, {limits['slow_limit']:.1f} "
+              f"after slowing past {args.target_latency}s, {limits['recovered_limit']:.1f} after recovering")
+        if limits['slow_limit'] >= limits['fast_limit']:
+            failures.append('concurrency limit did not shrink while the upstream was slow')
+
+        circuit = asyncio.run(breaker(upstream, args))
+        print(f"breaker: opened={circuit['opened']}, open-circuit search failed in {circuit['fail_fast'] * 1e3:.2f} ms "
+              f"({circuit['fail_fast_error']!r}), {circuit['requests_while_open']} upstream requests while open")
+        print(f"breaker: cached route served {circuit['stale_flights']} stale flights with notice "
+              f"{circuit['stale_notice']!r}; closed after recovery={circuit['closed']}")
+        if not circuit['opened'] or circuit['requests_while_open'] or circuit['fail_fast'] > 0.05:
+            failures.append('circuit did not open and fail fast')
+        if not circuit['stale_notice'] or not circuit['stale_flights']:
+            failures.append('no stale fallback while the circuit was open')
+        if not circuit['closed']:
+            failures.append('circuit did not close after the upstream recovered')
+
+        shared = fallback(tmp)
+        print(f"fallback: waits {[round(w, 2) for w in shared['waits']]} while the database was missing, "
+              f"shared bucket used again once it could be opened={shared['recovered']}")
+        if not shared['degraded'] or shared['waits'][:2] != [0, 0] or not shared['waits'][2] > 0:
+            failures.append('calls were not limited per process while the shared bucket failed')
+        if not shared['recovered']:
+            failures.append('the shared bucket was not used again after it recovered')
+
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
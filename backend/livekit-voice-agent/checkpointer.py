@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.memory import InMemorySaver
+
+
+# Checkpointer limits, overridable per deployment
+CHECKPOINT_MAX_THREADS = int(os.getenv('CHECKPOINT_MAX_THREADS', '256'))
+CHECKPOINT_MAX_BYTES = int(os.getenv('CHECKPOINT_MAX_BYTES', str(64 * 1024 * 1024)))
+CHECKPOINT_IDLE_TTL = float(os.getenv('CHECKPOINT_IDLE_TTL', '1800'))
+
+
+def _typed_size(typed: Any) -> int:
+    # serde.dumps_typed() returns a (type, bytes) pair
+    return len(typed[1]) if typed and typed[1] else 0
+
+
+class BoundedMemorySaver(InMemorySaver):
+    '''
+    In-memory checkpointer that keeps resident conversation state bounded.
+
+    Only the latest checkpoint of each thread is kept, since the agent never
+    replays history. Threads idle for longer than `idle_ttl` seconds are
+    dropped, and the least recently used threads are evicted once more than
+    `max_threads` threads or `max_bytes` of serialized state are resident.
+    '''
+
+    def __init__(self, max_threads: int = CHECKPOINT_MAX_THREADS, max_bytes: int = CHECKPOINT_MAX_BYTES,
+                 idle_ttl: float = CHECKPOINT_IDLE_TTL, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.evictions = 0
+        # thread_id -> (last access time, resident bytes), least recently used first
+        self._threads: OrderedDict[str, list] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def _touch(self, thread_id: str) -> None:
+        entry = self._threads.get(thread_id)
+        if entry is None:
+            self._threads[thread_id] = [time.monotonic(), 0]
+        else:
+            entry[0] = time.monotonic()
+            self._threads.move_to_end(thread_id)
+
+    def _resize(self, thread_id: str, size: int) -> None:
+        entry = self._threads[thread_id]
+        self._bytes += size - entry[1]
+        entry[1] = size
+
+    def _thread_size(self, thread_id: str) -> int:
+        size = 0
+        for saved in self.storage.get(thread_id, {}).values():
+            for typed_c, typed_meta, _ in saved.values():
+                size += _typed_size(typed_c) + _typed_size(typed_meta)
+        for key, typed in self.blobs.items():
+            if key[0] == thread_id:
+                size += _typed_size(typed)
+        for key, writes in self.writes.items():
+            if key[0] == thread_id:
+                size += sum(_typed_size(w[2]) for w in writes.values())
+        return size
+
+    def _prune(self, thread_id: str, checkpoint_ns: str, checkpoint: Checkpoint) -> None:
+        # Drop superseded checkpoints, their pending writes and stale channel blobs
+        saved = self.storage[thread_id][checkpoint_ns]
+        for checkpoint_id in [c for c in saved if c != checkpoint['id']]:
+            del saved[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        versions = checkpoint['channel_versions']
+        for key in [k for k in self.blobs if k[0] == thread_id and k[1] == checkpoint_ns]:
+            if versions.get(key[2]) != key[3]:
+                del self.blobs[key]
+
+    def _enforce_limits(self, current: Optional[str] = None) -> None:
+        if self.idle_ttl > 0:
+            deadline = time.monotonic() - self.idle_ttl
+            for thread_id in [t for t, (seen, _) in self._threads.items() if seen < deadline and t != current]:
+                self._evict(thread_id)
+        while len(self._threads) > self.max_threads or self._bytes > self.max_bytes:
+            victim = next((t for t in self._threads if t != current), None)
+            if victim is None:
+                break
+            self._evict(victim)
+
+    def _evict(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
+        self.evictions += 1
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config['configurable']['thread_id']
+        with self._lock:
+            if thread_id in self._threads:
+                self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config['configurable']['thread_id']
+        with self._lock:
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            self._prune(thread_id, config['configurable']['checkpoint_ns'], checkpoint)
+            self._touch(thread_id)
+            self._resize(thread_id, self._thread_size(thread_id))
+            self._enforce_limits(current=thread_id)
+            return saved
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = '') -> None:
+        thread_id = config['configurable']['thread_id']
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+            self._touch(thread_id)
+            self._resize(thread_id, self._thread_size(thread_id))
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            super().delete_thread(thread_id)
+            entry = self._threads.pop(thread_id, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def evict_idle(self) -> None:
+        '''Drop threads that have been idle for longer than `idle_ttl`.'''
+        with self._lock:
+            self._enforce_limits()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'threads': len(self._threads), 'bytes': self._bytes, 'evictions': self.evictions}
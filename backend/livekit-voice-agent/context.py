@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from streaming import message_text
+
+
+# Context window settings, overridable per deployment
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '6000'))
+CONTEXT_RECENT_TURNS = int(os.getenv('CONTEXT_RECENT_TURNS', '3'))
+CONTEXT_SUMMARY_CHARS = int(os.getenv('CONTEXT_SUMMARY_CHARS', '4000'))
+
+
+def estimate_tokens(messages: Sequence[BaseMessage]) -> int:
+    '''Cheap prompt size estimate of about four characters per token.'''
+    chars = 0
+    for message in messages:
+        chars += len(message_text(message.content))
+        for call in getattr(message, 'tool_calls', None) or []:
+            chars += len(call['name']) + len(json.dumps(call['args'], default=str))
+    return chars // 4
+
+
+def _clip(text: str, limit: int) -> str:
+    text = ' '.join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+def collapse_tool_result(message: ToolMessage) -> str:
+    '''One-line stand-in for a tool result that is no longer needed verbatim.'''
+    content = message_text(message.content)
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return _clip(content, 160)
+    if not isinstance(data, dict):
+        return _clip(content, 160)
+    for kind, price_key in (('flights', 'price'), ('hotels', 'price_per_night')):
+        options = data.get(kind)
+        if isinstance(options, list):
+            prices = [o[price_key] for o in options if isinstance(o, dict) and o.get(price_key) is not None]
+            cheapest = f', from ${min(prices)}' if prices else ''
+            total = data.get('total', data.get('matches', len(options)))
+            return (f"{total} {kind}{cheapest} (result_id={data.get('result_id')}, "
+                    f"use result_details to expand or more_results for more options)")
+    return _clip(content, 160)
+
+
+def _split_turns(messages: Sequence[Any]) -> List[Tuple[int, int]]:
+    # A turn starts at each human message and runs until the next one
+    starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    return [(start, end) for start, end in zip(starts, starts[1:] + [len(messages)])]
+
+
+def _summarize_turn(messages: Sequence[Any]) -> List[str]:
+    lines = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            lines.append('User: ' + _clip(message_text(message.content), 200))
+        elif isinstance(message, ToolMessage):
+            lines.append(f'{message.name}: ' + collapse_tool_result(message))
+        elif isinstance(message, AIMessage) and not message.tool_calls:
+            text = message_text(message.content)
+            if text:
+                lines.append('Assistant: ' + _clip(text, 300))
+    return lines
+
+
+class ContextStats:
+    '''Per-call prompt size counters for the tools LLM.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.last_prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.total_prompt_tokens = 0
+
+    def record(self, prompt_tokens: int) -> None:
+        with self._lock:
+            self.calls += 1
+            self.last_prompt_tokens = prompt_tokens
+            self.max_prompt_tokens = max(self.max_prompt_tokens, prompt_tokens)
+            self.total_prompt_tokens += prompt_tokens
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'last_prompt_tokens': self.last_prompt_tokens,
+                'max_prompt_tokens': self.max_prompt_tokens,
+                'avg_prompt_tokens': self.total_prompt_tokens // self.calls if self.calls else 0,
+            }
+
+
+class ContextWindow:
+    '''
+    Builds a bounded prompt from the accumulated conversation.
+
+    The last `recent_turns` turns are kept verbatim, except that tool results
+    of finished turns are collapsed to one-line summaries. Older turns are
+    folded, once, into a rolling extractive summary capped at `summary_chars`
+    that rides along in the system message. More turns are folded while the
+    estimate exceeds `token_budget`; the current turn is never folded.
+    '''
+
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET, recent_turns: int = CONTEXT_RECENT_TURNS,
+                 summary_chars: int = CONTEXT_SUMMARY_CHARS):
+        self.token_budget = token_budget
+        self.recent_turns = max(recent_turns, 1)
+        self.summary_chars = summary_chars
+
+    def _fold(self, summary: str, messages: Sequence[Any]) -> str:
+        lines = [summary] if summary else []
+        lines.extend(_summarize_turn(messages))
+        summary = '\n'.join(lines)
+        if len(summary) > self.summary_chars:
+            # Keep the most recent part of the summary, starting at a line boundary
+            summary = summary[-self.summary_chars:]
+            summary = summary[summary.find('\n') + 1:]
+        return summary
+
+    def _render(self, system_prompt: str, summary: str, messages: Sequence[Any], current_start: int) -> List[BaseMessage]:
+        system = system_prompt
+        if summary:
+            system += '\n\nSummary of the earlier conversation:\n' + summary
+        rendered: List[BaseMessage] = [SystemMessage(content=system)]
+        for i, message in enumerate(messages):
+            if not isinstance(message, BaseMessage):
+                continue
+            if isinstance(message, ToolMessage) and i < current_start:
+                message = ToolMessage(tool_call_id=message.tool_call_id, name=message.name,
+                                      content=collapse_tool_result(message))
+            rendered.append(message)
+        return rendered
+
+    def build(self, system_prompt: str, messages: Sequence[Any], summary: str = '',
+              summarized_upto: int = 0) -> Tuple[List[BaseMessage], str, int]:
+        '''
+        Return the prompt messages plus the updated summary and the index of the
+        first message not folded into it, to be stored back in the graph state.
+        '''
+        turns = _split_turns(messages)
+        current_start = turns[-1][0]
+        # Fold turns that fell out of the verbatim window into the summary
+        keep_from = max(turns[-self.recent_turns][0] if len(turns) >= self.recent_turns else 0, summarized_upto)
+        for start, end in turns:
+            if start >= summarized_upto and end <= keep_from:
+                summary = self._fold(summary, messages[start:end])
+        summarized_upto = keep_from
+
+        prompt = self._render(system_prompt, summary, messages[summarized_upto:], current_start - summarized_upto)
+        while estimate_tokens(prompt) > self.token_budget:
+            next_turn = next(((s, e) for s, e in turns if s >= summarized_upto and e <= current_start), None)
+            if next_turn is None:
+                break
+            summary = self._fold(summary, messages[next_turn[0]:next_turn[1]])
+            summarized_upto = next_turn[1]
+            prompt = self._render(system_prompt, summary, messages[summarized_upto:], current_start - summarized_upto)
+        return prompt, summary, summarized_upto
@@ -0,0 +1,243 @@
+import os
+import re
+from datetime import date, timedelta
+from typing import Any, Callable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from metrics import FAST_PATH_ROUTES
+from tools.airports import AIRPORT_CITIES, airport_for
+from tools.flights_finder import FlightsInput
+from tools.hotels_finder import HotelsInput
+
+
+# Route fully specified searches without asking the LLM (0 disables)
+FAST_PATH = os.getenv('FAST_PATH', '1') != '0'
+
+_NUMBERS = {'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7, 'eight': 8, 'nine': 9,
+            'a': 1, 'an': 1, 'single': 1, 'couple of': 2}
+_MONTHS = {name: number for number, names in enumerate([
+    ('jan', 'january'), ('feb', 'february'), ('mar', 'march'), ('apr', 'april'), ('may',), ('jun', 'june'),
+    ('jul', 'july'), ('aug', 'august'), ('sep', 'sept', 'september'), ('oct', 'october'), ('nov', 'november'),
+    ('dec', 'december')], start=1) for name in names}
+_MONTH = '|'.join(sorted(_MONTHS, key=len, reverse=True))
+
+_ISO_DATE = re.compile(r'\b(\d{4})-(\d{2})-(\d{2})\b')
+_MONTH_DAY = re.compile(rf'\b({_MONTH})\.? (\d{{1,2}})(?:st|nd|rd|th)?\b(?:,? (\d{{4}})\b)?')
+_DAY_MONTH = re.compile(rf'\b(\d{{1,2}})(?:st|nd|rd|th)? (?:of )?({_MONTH})\b(?:,? (\d{{4}})\b)?')
+_RELATIVE_DATE = re.compile(r'\b(today|tomorrow)\b')
+# "back on the 28th": a day of the month following an earlier date
+_BARE_DAY = re.compile(r'\bthe (\d{1,2})(?:st|nd|rd|th)\b(?! (?:of )?(?:' + _MONTH + r')\b)')
+
+_FLIGHT_INTENT = re.compile(r'\b(flights?|fly|flying|airfares?|fares?|plane tickets?)\b')
+_HOTEL_INTENT = re.compile(r'\b(hotels?|rooms?|accommodations?|places? to stay|stay)\b')
+_ADULTS = re.compile(r'\b(\d+) (?:adults?|people|persons|passengers|travell?ers|guests|of us)\b')
+_CHILDREN = re.compile(r'\b(\d+) (?:kids?|children|child)\b')
+_ROOMS = re.compile(r'\b(\d+) rooms?\b')
+_NUMBER_WORDS = re.compile(r'\b(' + '|'.join(sorted(_NUMBERS, key=len, reverse=True)) + r')\b(?= \w)')
+# Travel companions that are not counted ("with my husband", "for my wife and me")
+_COMPANIONS = re.compile(r"\b(?:with|for|and) (?:my|our)\b|\b(?:and me|me and)\b")
+# "one way", "a flight", "a place to stay": a 1 that counts nothing
+_ONE = re.compile(r'\b1 (?:way|flights?|hotels?|rooms?|places?|accommodations?|plane tickets?)\b')
+# Everything a routed request may say: each word must be part of one of these, of a place, or a filler word
+_SLOTS = (_ISO_DATE, _MONTH_DAY, _DAY_MONTH, _RELATIVE_DATE, _BARE_DAY, _ADULTS, _CHILDREN, _ROOMS, _ONE,
+          _FLIGHT_INTENT, _HOTEL_INTENT)
+_FILLER = frozenset('''
+    i i'd i'm we we'd we're me us need want would like looking look up find search show get book check can could
+    you please some the to from on in at and for of round trip return returning back leaving departing also just
+'''.split())
+
+
+def _normalize(text: str) -> str:
+    text = ' '.join(re.sub(r"[^\w\s:'-]", ' ', text.casefold()).split())
+    return _NUMBER_WORDS.sub(lambda m: str(_NUMBERS[m[1]]), text)
+
+
+def _resolve(today: date, month: int, day: int, year: Optional[str]) -> Optional[date]:
+    try:
+        if year:
+            return date(int(year), month, day)
+        # Without a year, the next time that day comes around
+        resolved = date(today.year, month, day)
+        return resolved if resolved >= today else date(today.year + 1, month, day)
+    except ValueError:
+        return None
+
+
+def _day_on_or_after(previous: date, day: int) -> Optional[date]:
+    # The next time that day of the month comes around, in the month of `previous` or the one after
+    month, year = previous.month, previous.year
+    for _ in range(2):
+        try:
+            candidate = date(year, month, day)
+            if candidate >= previous:
+                return candidate
+        except ValueError:
+            pass
+        month, year = (1, year + 1) if month == 12 else (month + 1, year)
+    return None
+
+
+def parse_dates(text: str, today: date) -> Optional[List[date]]:
+    '''Dates mentioned in normalized text, in order; None if one of them is not a real date.'''
+    found: List[Tuple[int, Any]] = []
+    for match in _ISO_DATE.finditer(text):
+        found.append((match.start(), _resolve(today, int(match[2]), int(match[3]), match[1])))
+    for match in _MONTH_DAY.finditer(text):
+        found.append((match.start(), _resolve(today, _MONTHS[match[1]], int(match[2]), match[3])))
+    for match in _DAY_MONTH.finditer(text):
+        found.append((match.start(), _resolve(today, _MONTHS[match[2]], int(match[1]), match[3])))
+    for match in _RELATIVE_DATE.finditer(text):
+        found.append((match.start(), today + timedelta(days=match[1] == 'tomorrow')))
+    for match in _BARE_DAY.finditer(text):
+        found.append((match.start(), int(match[1])))
+    dates: List[date] = []
+    for _, found_date in sorted(found, key=lambda f: f[0]):
+        if isinstance(found_date, int):
+            found_date = _day_on_or_after(dates[-1], found_date) if dates else None
+        if found_date is None:
+            return None
+        dates.append(found_date)
+    return dates
+
+
+def parse_party(text: str) -> Optional[Tuple[int, int, int]]:
+    '''
+    (adults, children, rooms) mentioned in normalized text, defaulting to one
+    adult in one room; None when a group is implied but not counted ("we",
+    "with my husband").
+    '''
+    if _COMPANIONS.search(text):
+        return None
+    adults = sum(int(n) for n in _ADULTS.findall(text))
+    children = sum(int(n) for n in _CHILDREN.findall(text))
+    rooms = sum(int(n) for n in _ROOMS.findall(text)) or 1
+    if not adults:
+        if re.search(r'\b(we|us|our|family|friends|group|kids|children)\b', text):
+            return None
+        adults = 1
+    return adults, children, rooms
+
+
+def _places_after(text: str, keyword: str) -> List[Tuple[str, int, int]]:
+    # (code, start, end) of every known airport or city named right after `keyword`, as the
+    # longest run of up to four words that names one
+    places = []
+    for match in re.finditer(rf'\b{keyword} ', text):
+        words = text[match.end():].split(' ')
+        for length in range(min(4, len(words)), 0, -1):
+            name = ' '.join(words[:length])
+            code = airport_for(name)
+            if code:
+                places.append((code, match.end(), match.end() + len(name)))
+                break
+    return places
+
+
+def _place_after(text: str, keyword: str) -> Optional[str]:
+    '''The place named after `keyword`; None unless exactly one is named that way.'''
+    places = _places_after(text, keyword)
+    return places[0][0] if len(places) == 1 else None
+
+
+def _unexplained(text: str, keywords: Tuple[str, ...]) -> List[str]:
+    '''
+    Words of normalized text that no slot pattern, place after one of
+    `keywords` or filler word accounts for, such as "cheapest", "9am",
+    "delta" or the "texas" of "paris texas".
+    '''
+    spans = [m.span() for pattern in _SLOTS for m in pattern.finditer(text)]
+    spans += [(start, end) for keyword in keywords for _, start, end in _places_after(text, keyword)]
+    return [m[0] for m in re.finditer(r'\S+', text)
+            if m[0] not in _FILLER and not any(start <= m.start() and m.end() <= end for start, end in spans)]
+
+
+def _flights(text: str, today: date) -> Optional[FlightsInput]:
+    origin, destination = _place_after(text, 'from'), _place_after(text, 'to')
+    dates = parse_dates(text, today)
+    if not origin or not destination or origin == destination or not dates or len(dates) > 2:
+        return None
+    if dates[0] < today or (len(dates) == 2 and dates[1] < dates[0]):
+        return None
+    if len(dates) == 1 and re.search(r'\b(round trip|return\w*|back)\b', text):
+        # A round trip without its return date
+        return None
+    party = parse_party(text)
+    if party is None:
+        return None
+    adults, children, _ = party
+    return FlightsInput(departure_airport=origin, arrival_airport=destination,
+                        outbound_date=dates[0].isoformat(),
+                        return_date=dates[1].isoformat() if len(dates) == 2 else None,
+                        adults=adults, children=children)
+
+
+def _hotels(text: str, today: date) -> Optional[HotelsInput]:
+    code = _place_after(text, 'in') or _place_after(text, 'at')
+    dates = parse_dates(text, today)
+    if not code or not dates or len(dates) != 2 or dates[0] < today or dates[1] <= dates[0]:
+        return None
+    party = parse_party(text)
+    if party is None:
+        return None
+    adults, children, rooms = party
+    return HotelsInput(q=AIRPORT_CITIES[code], check_in_date=dates[0].isoformat(),
+                       check_out_date=dates[1].isoformat(), adults=adults, children=children, rooms=rooms)
+
+
+def extract(text: str, today: Optional[date] = None) -> Optional[Tuple[str, BaseModel]]:
+    '''
+    Build the search a request fully specifies, as (tool name, input), or None.
+
+    Only unambiguous requests qualify: exactly one of a flight or hotel
+    intent, known places, real future dates in a consistent order, a counted
+    party, and nothing else. Every word has to be accounted for by one of
+    those or be a filler word ("i need", "please", "on", ...), so any wish
+    the search inputs cannot express ("cheapest", "at 9am", "with Delta",
+    "near the center", "December 20 to 28") leaves the request to the LLM.
+    '''
+    text = _normalize(text)
+    today = today or date.today()
+    wants_flights, wants_hotels = bool(_FLIGHT_INTENT.search(text)), bool(_HOTEL_INTENT.search(text))
+    if wants_flights and not wants_hotels:
+        tool, keywords, build = 'flights_finder', ('from', 'to'), _flights
+    elif wants_hotels and not wants_flights:
+        tool, keywords, build = 'hotels_finder', ('in', 'at'), _hotels
+    else:
+        return None
+    if _unexplained(text, keywords):
+        return None
+    params = build(text, today)
+    return (tool, params) if params else None
+
+
+class FastPathRouter:
+    '''
+    Turns fully specified search requests into tool calls without an LLM round trip.
+
+    Counts how many user turns it routed (hits) and how many it left to the
+    LLM (misses).
+    '''
+
+    def __init__(self, enabled: bool = FAST_PATH, today: Optional[Callable[[], date]] = None):
+        self.enabled = enabled
+        self.today = today or date.today
+        self.hits = 0
+        self.misses = 0
+
+    def route(self, text: str) -> Optional[Tuple[str, BaseModel]]:
+        if not self.enabled:
+            return None
+        call = extract(text, self.today())
+        if call is None:
+            self.misses += 1
+            FAST_PATH_ROUTES.labels('miss').inc()
+        else:
+            self.hits += 1
+            FAST_PATH_ROUTES.labels('hit').inc()
+        return call
+
+    def stats(self) -> dict:
+        routed = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': round(self.hits / routed, 3) if routed else 0.0}
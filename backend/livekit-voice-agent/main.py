@@ -1,24 +1,158 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import ipaddress
+import json
+import secrets
+import socket
+from contextlib import asynccontextmanager
+from urllib.parse import SplitResult, urlsplit
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.routing import Match
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-import uvicorn
+import httpx
 import os
 from dotenv import load_dotenv
 
 # Import our travel tools
-from tools.flights_finder import flights_finder, FlightsInput
-from tools.hotels_finder import hotels_finder, HotelsInput
+from tools.flights_finder import afind_flights, FlightsInput
+from tools.hotels_finder import afind_hotels, HotelsInput
+from tools.fare_matrix import afare_matrix, matrix_dates, FareMatrixInput
+from tools.itinerary import aplan_itinerary, ItineraryInput
+from tools.search_client import aclose_search_client, get_search_client
+from tools.cache import search_cache
+from tools.results import first_page, result_page
+from price_watch import (
+    PRICE_WATCH_API_KEY, PRICE_WATCH_LIVE_INTERVAL, PRICE_WATCH_LIVE_TTL, WatchPriceInput, get_price_watcher,
+    start_price_watch,
+)
+from metrics import render as render_metrics, span
 
 # Load environment variables
 load_dotenv(".env.local")
 
+
+# Shared clients for price-watch deliveries to webhooks and LiveKit rooms, created on first use
+_webhook_client: Optional[httpx.AsyncClient] = None
+_livekit_api = None
+
+
+def require_watch_key(request: Request) -> None:
+    if not PRICE_WATCH_API_KEY:
+        raise HTTPException(status_code=503, detail="Price watches are disabled on this server")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), PRICE_WATCH_API_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Missing or invalid API key",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+async def resolve_webhook(url: str) -> tuple[SplitResult, ipaddress.IPv4Address | ipaddress.IPv6Address]:
+    '''
+    Resolve a webhook URL to the address to deliver to, raising ValueError
+    unless it is https and every address of its host is public, so watches
+    cannot be pointed at services inside our network.
+    '''
+    parsed = urlsplit(url)
+    if parsed.scheme != "https" or not parsed.hostname or parsed.username or parsed.password:
+        raise ValueError("webhook_url must be an https URL without credentials")
+    try:
+        port = parsed.port or 443
+        infos = await asyncio.get_running_loop().getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)
+    except (ValueError, socket.gaierror):
+        raise ValueError(f"Cannot resolve webhook host {parsed.hostname}")
+    addresses = []
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        checked = getattr(address, "ipv4_mapped", None) or address
+        if not checked.is_global or checked.is_multicast:
+            raise ValueError(f"webhook_url must point to a public address, {parsed.hostname} resolves to {address}")
+        addresses.append(address)
+    if not addresses:
+        raise ValueError(f"Cannot resolve webhook host {parsed.hostname}")
+    return parsed, addresses[0]
+
+
+def webhook(url: str):
+    # Deliver price changes by POSTing them as JSON to `url`
+    async def notify(change: Dict[str, Any]) -> None:
+        global _webhook_client
+        if _webhook_client is None:
+            _webhook_client = httpx.AsyncClient(timeout=10)
+        # Resolve and check again on every delivery, then connect to the checked address
+        # (certificate still verified for the host), so DNS changes cannot redirect it inward
+        parsed, address = await resolve_webhook(url)
+        host = f"[{address}]" if address.version == 6 else str(address)
+        target = parsed._replace(netloc=f"{host}:{parsed.port or 443}").geturl()
+        response = await _webhook_client.post(target, json=change, headers={"Host": parsed.netloc},
+                                              extensions={"sni_hostname": parsed.hostname})
+        response.raise_for_status()
+    return notify
+
+
+def room_delivery(room: str, subscriber: str):
+    # Deliver price changes to everyone in a LiveKit room on the price_watch data topic
+    async def notify(change: Dict[str, Any]) -> None:
+        global _livekit_api
+        # Imported on first delivery, so the API starts without the LiveKit SDK loaded
+        from livekit import api
+        if _livekit_api is None:
+            _livekit_api = api.LiveKitAPI()
+        try:
+            await _livekit_api.room.send_data(api.SendDataRequest(
+                room=room, data=json.dumps(change).encode(), kind=api.DataPacket.Kind.RELIABLE, topic="price_watch"))
+        except api.TwirpError as e:
+            if e.code == api.TwirpErrorCode.NOT_FOUND:
+                # Nobody is left to hear about the room's watches
+                get_price_watcher().unsubscribe(subscriber)
+            raise
+    return notify
+
+
+def delivery(subscriber: str):
+    # Subscribers are named after where their changes go, so whichever worker polls can deliver them
+    if subscriber.startswith("room:"):
+        return room_delivery(subscriber[len("room:"):], subscriber)
+    return webhook(subscriber)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if PRICE_WATCH_API_KEY:
+        # Every worker runs the scheduler; the one holding the shared store's lease polls
+        watcher = get_price_watcher()
+        watcher.deliver = delivery
+        watcher.start()
+    yield
+    # Stop price-watch polling and release pooled upstream connections on shutdown
+    await get_price_watcher().aclose()
+    if _webhook_client is not None:
+        await _webhook_client.aclose()
+    if _livekit_api is not None:
+        await _livekit_api.aclose()
+    await aclose_search_client()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Travel Agent API",
     description="API for finding flights and hotels using AI-powered travel assistant",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Time every request under its route template, so path parameters don't add metric series
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    name = "unmatched"
+    for route in app.router.routes:
+        if route.matches(request.scope)[0] == Match.FULL:
+            name = f"{request.method} {route.path}"
+            break
+    with span("http", name) as request_span:
+        response = await call_next(request)
+        request_span.failed = response.status_code >= 500
+    return response
+
 # Pydantic models for API requests
 class TravelQuery(BaseModel):
     query: str
@@ -43,6 +177,26 @@ class HotelSearchRequest(BaseModel):
     rooms: int = 1
     hotel_class: Optional[str] = None
 
+class FareMatrixRequest(BaseModel):
+    departure_airport: str
+    arrival_airport: str
+    outbound_from: str
+    outbound_to: str
+    return_from: str
+    return_to: str
+    adults: int = 1
+    children: int = 0
+    infants_in_seat: int = 0
+    infants_on_lap: int = 0
+    stream: bool = False
+
+class PriceWatchRequest(BaseModel):
+    webhook_url: Optional[str] = None
+    room: Optional[str] = None
+    flights: Optional[FlightSearchRequest] = None
+    hotels: Optional[HotelSearchRequest] = None
+    below: Optional[float] = None
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -53,9 +207,25 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+# Prometheus metrics endpoint
+@app.get("/metrics")
+async def metrics():
+    data, content_type = render_metrics()
+    return Response(content=data, media_type=content_type)
+
+# Search cache statistics endpoint
+@app.get("/cache/stats")
+async def cache_stats():
+    return search_cache.stats()
+
+# Upstream rate limiter, concurrency limit and circuit breaker statistics endpoint
+@app.get("/upstream/stats")
+async def upstream_stats():
+    return get_search_client().governor.stats()
+
 # Flight search endpoint
 @app.post("/flights/search")
-async def search_flights(request: FlightSearchRequest):
+async def search_flights(request: FlightSearchRequest, full: bool = False):
     try:
         # Create FlightsInput from request
         params = FlightsInput(
@@ -69,15 +239,16 @@ async def search_flights(request: FlightSearchRequest):
             infants_on_lap=request.infants_on_lap
         )
         
-        # Invoke the flights finder tool
-        result = flights_finder.invoke(params.model_dump())
-        return {"result": result}
+        # Search without blocking the event loop
+        result = await afind_flights(params)
+        # The first page with its result_id; GET /results/{result_id} serves the rest, from any worker
+        return await asyncio.to_thread(first_page, result, not full)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error searching flights: {str(e)}")
 
 # Hotel search endpoint
 @app.post("/hotels/search")
-async def search_hotels(request: HotelSearchRequest):
+async def search_hotels(request: HotelSearchRequest, full: bool = False):
     try:
         # Create HotelsInput from request
         params = HotelsInput(
@@ -91,18 +262,120 @@ async def search_hotels(request: HotelSearchRequest):
             hotel_class=request.hotel_class
         )
         
-        # Invoke the hotels finder tool
-        result = hotels_finder.invoke(params.model_dump())
-        return {"result": result}
+        # Search without blocking the event loop
+        result = await afind_hotels(params)
+        return await asyncio.to_thread(first_page, result, not full)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error searching hotels: {str(e)}")
 
-# Run the server
+# Page through a stored flights or hotels result without searching again
+@app.get("/results/{result_id}")
+async def get_results(result_id: str, offset: int = 0, limit: int = 5, full: bool = False):
+    page = await asyncio.to_thread(result_page, result_id, offset, limit, not full)
+    if page is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired result_id {result_id}")
+    return page
+
+# Watch a flight or hotel search; price changes are POSTed to the webhook URL or sent to the
+# LiveKit room, whose watches are polled more often since they only last as long as the call
+@app.post("/watches", dependencies=[Depends(require_watch_key)])
+async def create_watch(request: PriceWatchRequest):
+    if (request.webhook_url is None) == (request.room is None):
+        raise HTTPException(status_code=422, detail="Give exactly one of webhook_url or room")
+    try:
+        params = WatchPriceInput(
+            flights=FlightsInput(**request.flights.model_dump()) if request.flights else None,
+            hotels=HotelsInput(**request.hotels.model_dump()) if request.hotels else None,
+            below=request.below
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    # Watches are grouped by webhook URL or room, one subscriber each, delivered through `delivery`
+    if request.room is not None:
+        result = start_price_watch(params, f"room:{request.room}", PRICE_WATCH_LIVE_INTERVAL, PRICE_WATCH_LIVE_TTL)
+    else:
+        try:
+            await resolve_webhook(request.webhook_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        result = start_price_watch(params, request.webhook_url)
+    if "error" in result:
+        raise HTTPException(status_code=422, detail=result["error"])
+    return result
+
+# Stop a price watch
+@app.delete("/watches/{watch_id}", dependencies=[Depends(require_watch_key)])
+async def delete_watch(watch_id: str):
+    if not get_price_watcher().unwatch(watch_id):
+        raise HTTPException(status_code=404, detail=f"Unknown watch_id {watch_id}")
+    return {"deleted": watch_id}
+
+# Stop all price watches of a LiveKit room, e.g. when its call ends
+@app.delete("/rooms/{room}/watches", dependencies=[Depends(require_watch_key)])
+async def delete_room_watches(room: str):
+    return {"deleted": get_price_watcher().unsubscribe(f"room:{room}")}
+
+# Price-watch scheduler statistics endpoint
+@app.get("/watches/stats", dependencies=[Depends(require_watch_key)])
+async def watch_stats():
+    return get_price_watcher().stats()
+
+# Multi-city itinerary endpoint: all legs and stays searched concurrently and combined
+@app.post("/itinerary/plan")
+async def itinerary_plan(request: ItineraryInput):
+    result = await aplan_itinerary(request)
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    return result
+
+# Flexible-date fare matrix endpoint
+@app.post("/flights/matrix")
+async def flights_matrix(request: FareMatrixRequest):
+    params = FareMatrixInput(**request.model_dump(exclude={"stream"}))
+    # Reject bad date windows before any search, also for streamed requests
+    try:
+        matrix_dates(params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not request.stream:
+        try:
+            result = await afare_matrix(params)
+            return {"result": result}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error building fare matrix: {str(e)}")
+
+    # Stream each outbound row as newline-delimited JSON as soon as it is complete
+    async def rows():
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def on_row(row):
+            await queue.put({"row": row})
+
+        async def run():
+            try:
+                await queue.put({"result": await afare_matrix(params, on_row=on_row)})
+            except Exception as e:
+                await queue.put({"error": f"Error building fare matrix: {str(e)}"})
+            finally:
+                await queue.put(None)
+
+        task = asyncio.create_task(run())
+        try:
+            while (item := await queue.get()) is not None:
+                yield json.dumps(item) + "\n"
+        finally:
+            task.cancel()
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+# Run the server; RELOAD=1 restarts it on code changes during development
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=int(os.getenv("PORT", 8000)),
-        reload=True,
+        reload=os.getenv("RELOAD", "0") == "1",
         log_level="info"
     )
\ No newline at end of file
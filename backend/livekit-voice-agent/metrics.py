@@ -0,0 +1,160 @@
+import contextvars
+import functools
+import inspect
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+
+# Port of the agent worker's Prometheus exporter; unset disables it
+METRICS_PORT = os.getenv('METRICS_PORT')
+# Where job processes write their metrics for the worker's exporter to aggregate
+METRICS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'travel-agent-metrics'))
+
+# From cache hits (milliseconds) to slow LLM and upstream calls (tens of seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+SPAN_SECONDS = Histogram('travel_agent_span_seconds', 'Duration of graph nodes, tool calls, turns and HTTP requests',
+                         ['kind', 'name'], buckets=LATENCY_BUCKETS)
+SPAN_IN_FLIGHT = Gauge('travel_agent_in_flight', 'Spans currently running',
+                       ['kind', 'name'], multiprocess_mode='livesum')
+SPAN_ERRORS = Counter('travel_agent_errors', 'Spans that raised or reported an error', ['kind', 'name'])
+CACHE_LOOKUPS = Counter('travel_agent_cache_lookups', 'Search cache lookups made within a span',
+                        ['kind', 'name', 'result'])
+PREFETCHES = Counter('travel_agent_prefetches', 'Speculative searches by outcome (issued, hit, wasted, cancelled, dropped)',
+                     ['outcome'])
+FAST_PATH_ROUTES = Counter('travel_agent_fast_path_routes', 'User turns routed without the LLM (hit) or not (miss)',
+                           ['result'])
+PRICE_WATCH_POLLS = Counter('travel_agent_price_watch_polls', 'Price-watch polls by outcome (changed, unchanged, failed)',
+                            ['outcome'])
+PRICE_WATCH_NOTIFICATIONS = Counter('travel_agent_price_watch_notifications', 'Price changes pushed to subscribers',
+                                    ['outcome'])
+PRICE_WATCH_ROUTES = Gauge('travel_agent_price_watch_routes', 'Distinct searches being polled for price changes',
+                           multiprocess_mode='livesum')
+UPSTREAM_BREAKER_STATE = Gauge('travel_agent_upstream_circuit_state', 'Upstream circuit: 0 closed, 1 half-open, 2 open',
+                               multiprocess_mode='liveall')
+UPSTREAM_CONCURRENCY_LIMIT = Gauge('travel_agent_upstream_concurrency_limit', 'Adaptive upstream concurrency limit',
+                                   multiprocess_mode='liveall')
+UPSTREAM_REJECTIONS = Counter('travel_agent_upstream_rejections', 'Searches failed fast without calling the upstream',
+                              ['reason'])
+UPSTREAM_THROTTLE_SECONDS = Counter('travel_agent_upstream_throttle_seconds', 'Time searches waited for the rate limiter')
+UPSTREAM_RATE_LIMIT_FALLBACKS = Counter('travel_agent_upstream_rate_limit_fallbacks',
+                                        'Rate limiter calls served per process because the shared bucket failed',
+                                        ['bucket'])
+TURN_QUEUE_DEPTH = Gauge('travel_agent_turn_queue_depth', 'Chat turns waiting for a free slot',
+                         multiprocess_mode='livesum')
+TURN_QUEUE_SECONDS = Histogram('travel_agent_turn_queue_seconds', 'Time chat turns waited for a free slot',
+                               buckets=LATENCY_BUCKETS)
+TURNS_SUPERSEDED = Counter('travel_agent_turns_superseded', 'Chat turns cancelled by a newer user turn')
+VOICE_STAGE_SECONDS = Histogram('travel_agent_voice_stage_seconds', 'Latency of LiveKit pipeline stages',
+                                ['stage'], buckets=LATENCY_BUCKETS)
+
+
+class Span:
+    '''A running timed operation; cache lookups and errors are attributed to it.'''
+
+    __slots__ = ('kind', 'name', 'failed', 'cache')
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.failed = False
+        self.cache: Optional[Dict[str, int]] = None
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar('current_span', default=None)
+
+
+@contextmanager
+def span(kind: str, name: str) -> Iterator[Span]:
+    '''
+    Time a block as `kind`/`name`: observe its duration, track it as in flight
+    and count it as an error if it raises or sets `failed`. Cache lookups made
+    inside it, including in tasks it spawns, are counted against it.
+    '''
+    current = Span(kind, name)
+    token = _current_span.set(current)
+    in_flight = SPAN_IN_FLIGHT.labels(kind, name)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception:
+        current.failed = True
+        raise
+    finally:
+        SPAN_SECONDS.labels(kind, name).observe(time.perf_counter() - start)
+        in_flight.dec()
+        _current_span.reset(token)
+        if current.failed:
+            SPAN_ERRORS.labels(kind, name).inc()
+        for result, count in (current.cache or {}).items():
+            CACHE_LOOKUPS.labels(kind, name, result).inc(count)
+
+
+def timed(kind: str, name: str):
+    '''Decorator form of `span` for sync and async functions.'''
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(kind, name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(kind, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_cache(result: str) -> None:
+    '''Attribute a cache lookup ("hit", "stale", "miss", "coalesced" or "fallback") to the innermost running span.'''
+    current = _current_span.get()
+    if current is not None:
+        if current.cache is None:
+            current.cache = {}
+        current.cache[result] = current.cache.get(result, 0) + 1
+
+
+# LiveKit metric events mapped to (stage label, attribute)
+_VOICE_STAGES = {
+    'stt_metrics': (('stt', 'duration'),),
+    'eou_metrics': (('end_of_utterance', 'end_of_utterance_delay'), ('transcription', 'transcription_delay')),
+    'llm_metrics': (('llm_ttft', 'ttft'),),
+    'tts_metrics': (('tts_ttfb', 'ttfb'),),
+}
+
+
+def record_voice_metrics(event_metrics: Any) -> None:
+    '''Observe the stage latencies of a LiveKit `metrics_collected` event.'''
+    # Streaming STT reports no per-request duration; its latency shows up as transcription delay
+    if getattr(event_metrics, 'streamed', False) and event_metrics.type == 'stt_metrics':
+        return
+    for stage, attribute in _VOICE_STAGES.get(getattr(event_metrics, 'type', None), ()):
+        value = getattr(event_metrics, attribute, None)
+        if value is not None and value >= 0:
+            VOICE_STAGE_SECONDS.labels(stage).observe(value)
+
+
+def render() -> tuple[bytes, str]:
+    '''Current metrics in the Prometheus text format, aggregated across processes in multiprocess mode.'''
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,211 @@
+import asyncio
+import os
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from metrics import PREFETCHES, span
+from tools.airports import city_for
+from tools.cache import cache_key
+from tools.flights_finder import FlightsInput, afind_flights
+from tools.hotels_finder import HotelsInput, afind_hotels
+from tools.search_client import get_search_client
+from tools.upstream import TokenBucket
+
+
+# Speculative searches allowed per session (0 disables prefetching) and running at once per process
+PREFETCH_BUDGET = int(os.getenv('PREFETCH_BUDGET', '4'))
+PREFETCH_CONCURRENCY = int(os.getenv('PREFETCH_CONCURRENCY', '2'))
+# Host-wide prefetch rate (per second, 0 for no limit of its own) and burst, kept well below SERPAPI_RATE_LIMIT
+PREFETCH_RATE_LIMIT = float(os.getenv('PREFETCH_RATE_LIMIT', '2'))
+PREFETCH_RATE_BURST = float(os.getenv('PREFETCH_RATE_BURST', '4'))
+
+_ENGINES = {
+    'flights_finder': ('google_flights', FlightsInput),
+    'hotels_finder': ('google_hotels', HotelsInput),
+}
+_SEARCHES = {
+    'google_flights': afind_flights,
+    'google_hotels': afind_hotels,
+}
+
+
+@dataclass
+class TripSlots:
+    '''What is known so far about the trip being planned in a session.'''
+    origin: Optional[str] = None
+    destination: Optional[str] = None
+    depart_date: Optional[str] = None
+    return_date: Optional[str] = None
+    adults: int = 1
+    children: int = 0
+
+    def update(self, **values: Any) -> None:
+        for name, value in values.items():
+            if value is not None:
+                setattr(self, name, value)
+
+
+def plan_searches(slots: TripSlots) -> List[Tuple[str, BaseModel]]:
+    '''Searches the user is likely to ask for next, given the known slots.'''
+    searches: List[Tuple[str, BaseModel]] = []
+    city = city_for(slots.destination)
+    if city and slots.depart_date and slots.return_date:
+        searches.append(('google_hotels', HotelsInput(
+            q=city, check_in_date=slots.depart_date, check_out_date=slots.return_date,
+            adults=slots.adults, children=slots.children)))
+    if slots.origin and slots.destination and slots.depart_date and slots.return_date:
+        searches.append(('google_flights', FlightsInput(
+            departure_airport=slots.origin, arrival_airport=slots.destination,
+            outbound_date=slots.depart_date, return_date=slots.return_date,
+            adults=slots.adults, children=slots.children)))
+        # The way back as a one-way search, for "and the flight home?"
+        searches.append(('google_flights', FlightsInput(
+            departure_airport=slots.destination, arrival_airport=slots.origin,
+            outbound_date=slots.return_date, adults=slots.adults, children=slots.children)))
+    return searches
+
+
+def _call_params(name: str, args: Dict[str, Any]) -> Optional[Tuple[str, BaseModel]]:
+    if name not in _ENGINES:
+        return None
+    engine, model = _ENGINES[name]
+    try:
+        return engine, model(**args.get('params', args))
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class _Session:
+    slots: TripSlots = field(default_factory=TripSlots)
+    requested: Set[str] = field(default_factory=set)
+    prefetched: Dict[str, asyncio.Task] = field(default_factory=dict)
+    used: Set[str] = field(default_factory=set)
+
+
+class Prefetcher:
+    '''
+    Speculatively runs searches the user is likely to ask for next.
+
+    Tool calls fill in per-session trip slots (route, dates, party size).
+    Once a flight search or fare matrix resolves them, hotel and return-leg
+    searches are started in the background so their results are already in
+    the search cache when the LLM asks. At most `budget` searches are
+    prefetched per session and `concurrency` run at once per process.
+    Pending ones are cancelled when the session ends. A prefetch counts as a
+    hit when the session later requests the same search and as wasted
+    otherwise.
+
+    Prefetches only use upstream capacity the user's own searches leave
+    unused: once its turn among the prefetches comes, each needs a token
+    from its own lower-rate `bucket` and spare capacity in the upstream
+    governor, and is dropped rather than queued behind the upstream when
+    either is missing.
+    '''
+
+    def __init__(self, budget: int = PREFETCH_BUDGET, concurrency: int = PREFETCH_CONCURRENCY,
+                 bucket: Optional[TokenBucket] = None):
+        self.budget = budget
+        self.concurrency = concurrency
+        self.bucket = bucket or TokenBucket(PREFETCH_RATE_LIMIT, PREFETCH_RATE_BURST, name='prefetch')
+        self._sessions: Dict[str, _Session] = {}
+        self._semaphores = weakref.WeakKeyDictionary()
+        self.issued = 0
+        self.hits = 0
+        self.wasted = 0
+        self.cancelled = 0
+        self.dropped = 0
+
+    def on_tool_call(self, thread_id: str, name: str, args: Dict[str, Any]) -> None:
+        '''Record a search requested by the LLM, counting it as a hit if it was prefetched.'''
+        call = _call_params(name, args)
+        if call is None:
+            return
+        key = cache_key(*call)
+        session = self._sessions.setdefault(thread_id, _Session())
+        session.requested.add(key)
+        if key in session.prefetched and key not in session.used:
+            session.used.add(key)
+            self.hits += 1
+            PREFETCHES.labels('hit').inc()
+
+    def on_tool_result(self, thread_id: str, name: str, args: Dict[str, Any], result: Any) -> None:
+        '''Learn trip slots from a successful tool call and start the searches they enable.'''
+        if self.budget <= 0 or not isinstance(result, dict) or 'error' in result:
+            return
+        params = args.get('params', args)
+        session = self._sessions.setdefault(thread_id, _Session())
+        if name in ('flights_finder', 'fare_matrix'):
+            session.slots.update(origin=params.get('departure_airport'), destination=params.get('arrival_airport'),
+                                 depart_date=params.get('outbound_date'), return_date=params.get('return_date'),
+                                 adults=params.get('adults'), children=params.get('children'))
+        if name == 'fare_matrix' and result.get('cheapest'):
+            # The user will most likely go for the cheapest dates
+            session.slots.update(depart_date=result['cheapest']['outbound_date'],
+                                 return_date=result['cheapest']['return_date'])
+        self._schedule(session)
+
+    def _schedule(self, session: _Session) -> None:
+        for engine, params in plan_searches(session.slots):
+            if len(session.prefetched) >= self.budget:
+                break
+            key = cache_key(engine, params)
+            if key in session.requested or key in session.prefetched:
+                continue
+            session.prefetched[key] = asyncio.create_task(self._prefetch(session, key, engine, params))
+
+    async def _admit(self) -> bool:
+        if not get_search_client().governor.has_spare_capacity():
+            return False
+        # The shared bucket is a SQLite table; keep its lock waits off the event loop
+        wait = await asyncio.to_thread(self.bucket.try_acquire) if self.bucket.path else self.bucket.try_acquire()
+        return wait == 0
+
+    async def _prefetch(self, session: _Session, key: str, engine: str, params: BaseModel) -> None:
+        # Semaphores are bound to the loop they first wait on
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+        # Waiting here only holds back other prefetches; the upstream is checked once it is our turn
+        async with semaphore:
+            if not await self._admit():
+                # The search may still be prefetched on a later tool result, once there is room
+                session.prefetched.pop(key, None)
+                self.dropped += 1
+                PREFETCHES.labels('dropped').inc()
+                return
+            self.issued += 1
+            PREFETCHES.labels('issued').inc()
+            with span('prefetch', engine):
+                await _SEARCHES[engine](params)
+
+    def end_session(self, thread_id: str) -> None:
+        '''Cancel the session's pending prefetches and settle its hit/waste counts.'''
+        session = self._sessions.pop(thread_id, None)
+        if session is None:
+            return
+        for key, task in session.prefetched.items():
+            if key in session.used:
+                continue
+            if not task.done():
+                task.cancel()
+                self.cancelled += 1
+                PREFETCHES.labels('cancelled').inc()
+            else:
+                self.wasted += 1
+                PREFETCHES.labels('wasted').inc()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'issued': self.issued,
+            'hits': self.hits,
+            'wasted': self.wasted,
+            'cancelled': self.cancelled,
+            'dropped': self.dropped,
+            'hit_rate': round(self.hits / self.issued, 3) if self.issued else 0.0,
+            'waste_ratio': round(self.wasted / self.issued, 3) if self.issued else 0.0,
+        }
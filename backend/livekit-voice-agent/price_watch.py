@@ -0,0 +1,718 @@
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from urllib.parse import quote
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+from pydantic import BaseModel, Field
+
+from metrics import PRICE_WATCH_NOTIFICATIONS, PRICE_WATCH_POLLS, PRICE_WATCH_ROUTES, span
+from tools.cache import cache_key, search_cache
+from tools.flights_finder import FlightsInput, afetch_flights, afind_flights
+from tools.hotels_finder import HotelsInput, afetch_hotels, afind_hotels
+from tools.upstream import TokenBucket
+
+
+# Seconds between polls of a watched search, and before the first retry of a failed poll
+PRICE_WATCH_INTERVAL = float(os.getenv('PRICE_WATCH_INTERVAL', '1800'))
+PRICE_WATCH_RETRY = float(os.getenv('PRICE_WATCH_RETRY', '60'))
+# Polls per second across all local processes (0 disables the limit) and polls running at once per process
+PRICE_WATCH_RATE = float(os.getenv('PRICE_WATCH_RATE', '0.2'))
+PRICE_WATCH_CONCURRENCY = int(os.getenv('PRICE_WATCH_CONCURRENCY', '2'))
+# Smallest price move, in USD, that counts as a change
+PRICE_WATCH_MIN_CHANGE = float(os.getenv('PRICE_WATCH_MIN_CHANGE', '1'))
+# Watches one subscriber may hold, and distinct searches polled per process, so a few
+# subscribers cannot take the whole poll budget
+PRICE_WATCH_MAX_PER_SUBSCRIBER = int(os.getenv('PRICE_WATCH_MAX_PER_SUBSCRIBER', '20'))
+PRICE_WATCH_MAX_ROUTES = int(os.getenv('PRICE_WATCH_MAX_ROUTES', '300'))
+# Seconds between polls of watches made during a call, and how long such watches last at most
+PRICE_WATCH_LIVE_INTERVAL = float(os.getenv('PRICE_WATCH_LIVE_INTERVAL', '120'))
+PRICE_WATCH_LIVE_TTL = float(os.getenv('PRICE_WATCH_LIVE_TTL', '14400'))
+# The REST service that runs the shared watcher for voice sessions, and the key for its watch endpoints
+PRICE_WATCH_API_URL = os.getenv('PRICE_WATCH_API_URL', '')
+PRICE_WATCH_API_KEY = os.getenv('PRICE_WATCH_API_KEY', '')
+# SQLite file holding the watches of every API worker on the host, and how often the worker that
+# polls them picks up changes made through the others; empty keeps watches in each process only
+PRICE_WATCH_PATH = os.getenv('PRICE_WATCH_PATH', os.path.join(tempfile.gettempdir(), 'travel-agent-watches.sqlite3'))
+PRICE_WATCH_SYNC = float(os.getenv('PRICE_WATCH_SYNC', '5'))
+
+_SEARCHES = {
+    'google_flights': afind_flights,
+    'google_hotels': afind_hotels,
+}
+
+_FETCHES = {
+    'google_flights': afetch_flights,
+    'google_hotels': afetch_hotels,
+}
+
+_INPUTS = {
+    'google_flights': FlightsInput,
+    'google_hotels': HotelsInput,
+}
+
+# Why a watch was refused, by the limit it would pass
+_LIMITS = {
+    'subscriber': 'At most {max_per_subscriber} price watches are allowed, stop one first.',
+    'routes': 'Too many searches are being watched right now, please try again later.',
+}
+
+Notify = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def _flight_option(record: Dict[str, Any]) -> Tuple[str, Any]:
+    legs = record.get('flights') or []
+    numbers = ' + '.join(leg.get('flight_number') or leg.get('airline') or '?' for leg in legs)
+    departs = (legs[0].get('departure_airport') or {}).get('time') if legs else None
+    return f'{numbers} at {departs}' if departs else numbers, record.get('price')
+
+
+def _hotel_option(record: Dict[str, Any]) -> Tuple[str, Any]:
+    return record.get('name') or record.get('property_token') or '?', (record.get('rate_per_night') or {}).get('extracted_lowest')
+
+
+_OPTIONS = {
+    'google_flights': ('flights', _flight_option),
+    'google_hotels': ('hotels', _hotel_option),
+}
+
+
+def snapshot(engine: str, result: Dict[str, Any]) -> Dict[str, float]:
+    '''Price of every option in a search result by option label; options without a price are left out.'''
+    kind, option = _OPTIONS[engine]
+    prices: Dict[str, float] = {}
+    for record in result.get(kind, []):
+        label, price = option(record)
+        if isinstance(price, (int, float)):
+            prices[label] = min(price, prices.get(label, price))
+    return prices
+
+
+def diff(previous: Dict[str, float], current: Dict[str, float],
+         min_change: float = PRICE_WATCH_MIN_CHANGE) -> Optional[Dict[str, Any]]:
+    '''What got cheaper, pricier, appeared or disappeared between two snapshots; None if nothing did.'''
+    cheaper: List[Dict[str, Any]] = []
+    pricier: List[Dict[str, Any]] = []
+    for label in previous.keys() & current.keys():
+        change = {'option': label, 'from': previous[label], 'to': current[label]}
+        if current[label] <= previous[label] - min_change:
+            cheaper.append(change)
+        elif current[label] >= previous[label] + min_change:
+            pricier.append(change)
+    added = sorted(current.keys() - previous.keys())
+    removed = sorted(previous.keys() - current.keys())
+    if not (cheaper or pricier or added or removed):
+        return None
+    # Biggest moves first
+    cheaper.sort(key=lambda c: c['to'] - c['from'])
+    pricier.sort(key=lambda c: c['from'] - c['to'])
+    return {
+        'lowest': min(current.values(), default=None),
+        'previous_lowest': min(previous.values(), default=None),
+        'cheaper': cheaper,
+        'pricier': pricier,
+        'added': added,
+        'removed': removed,
+    }
+
+
+def describe(engine: str, params: BaseModel) -> str:
+    if engine == 'google_flights':
+        trip = f'{params.departure_airport} to {params.arrival_airport} on {params.outbound_date}'
+        return f'{trip}, returning {params.return_date}' if params.return_date else trip
+    return f'{params.q}, {params.check_in_date} to {params.check_out_date}'
+
+
+@dataclass
+class Watch:
+    watch_id: str
+    subscriber: str
+    key: str
+    below: Optional[float] = None
+    # The lowest price the subscriber last heard about, or saw when the watch started
+    last_lowest: Optional[float] = None
+    # Seconds between polls, when sooner than the watcher's interval, and when (epoch seconds) the watch ends
+    interval: Optional[float] = None
+    expires_at: Optional[float] = None
+
+
+@dataclass
+class _Route:
+    engine: str
+    params: BaseModel
+    label: str
+    watches: Dict[str, Watch] = field(default_factory=dict)
+    snapshot: Optional[Dict[str, float]] = None
+    due: float = 0.0
+    failures: int = 0
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS price_watches (
+    watch_id TEXT PRIMARY KEY,
+    subscriber TEXT NOT NULL,
+    key TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    params TEXT NOT NULL,
+    below REAL,
+    last_lowest REAL,
+    interval REAL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS price_watches_subscriber ON price_watches (subscriber);
+CREATE INDEX IF NOT EXISTS price_watches_key ON price_watches (key);
+CREATE TABLE IF NOT EXISTS price_watch_routes (
+    key TEXT PRIMARY KEY,
+    lowest REAL
+);
+CREATE TABLE IF NOT EXISTS price_watch_scheduler (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    owner TEXT NOT NULL,
+    until REAL NOT NULL
+);
+'''
+
+
+class WatchStore:
+    '''
+    Price watches shared through SQLite by every process on the host.
+
+    Any process may add or drop watches. Only the one holding the scheduler
+    lease polls them, and it writes back the lowest price each route and
+    watch last saw, so another process can take over from where it left off
+    once the lease runs out.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread and process; sqlite connections must not cross either
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def add(self, watch: Watch, engine: str, params: BaseModel, max_per_subscriber: int,
+            max_routes: int) -> Optional[str]:
+        '''
+        Store `watch`, starting it from its route's last lowest price, unless
+        that passes a limit; return the limit ('subscriber' or 'routes') if so.
+        '''
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            owned = conn.execute('SELECT COUNT(*) FROM price_watches WHERE subscriber = ?',
+                                 (watch.subscriber,)).fetchone()[0]
+            if owned >= max_per_subscriber:
+                return 'subscriber'
+            if conn.execute('SELECT 1 FROM price_watches WHERE key = ?', (watch.key,)).fetchone() is None \
+                    and conn.execute('SELECT COUNT(DISTINCT key) FROM price_watches').fetchone()[0] >= max_routes:
+                return 'routes'
+            row = conn.execute('SELECT lowest FROM price_watch_routes WHERE key = ?', (watch.key,)).fetchone()
+            watch.last_lowest = row[0] if row else None
+            conn.execute('INSERT INTO price_watches (watch_id, subscriber, key, engine, params, below, last_lowest, '
+                         'interval, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         (watch.watch_id, watch.subscriber, watch.key, engine, params.model_dump_json(),
+                          watch.below, watch.last_lowest, watch.interval, watch.expires_at))
+            return None
+        finally:
+            conn.execute('COMMIT')
+
+    def remove(self, watch_id: str) -> bool:
+        conn = self._connect()
+        removed = conn.execute('DELETE FROM price_watches WHERE watch_id = ?', (watch_id,)).rowcount
+        conn.execute('DELETE FROM price_watch_routes WHERE key NOT IN (SELECT key FROM price_watches)')
+        return removed == 1
+
+    def remove_subscriber(self, subscriber: str) -> int:
+        conn = self._connect()
+        removed = conn.execute('DELETE FROM price_watches WHERE subscriber = ?', (subscriber,)).rowcount
+        conn.execute('DELETE FROM price_watch_routes WHERE key NOT IN (SELECT key FROM price_watches)')
+        return removed
+
+    def count(self, subscriber: str) -> int:
+        return self._connect().execute('SELECT COUNT(*) FROM price_watches WHERE subscriber = ?',
+                                       (subscriber,)).fetchone()[0]
+
+    def load(self) -> List[Tuple[Watch, str, BaseModel]]:
+        '''Every watch with the engine and parameters of its search.'''
+        rows = self._connect().execute('SELECT watch_id, subscriber, key, engine, params, below, last_lowest, '
+                                       'interval, expires_at FROM price_watches').fetchall()
+        return [(Watch(watch_id, subscriber, key, below, last_lowest, interval, expires_at), engine,
+                 _INPUTS[engine](**json.loads(params)))
+                for watch_id, subscriber, key, engine, params, below, last_lowest, interval, expires_at in rows]
+
+    def record(self, key: str, lowest: float, watches: List[Tuple[str, float]]) -> None:
+        '''Save a route's lowest price and the lowest price each of `watches` last reported.'''
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('INSERT OR REPLACE INTO price_watch_routes (key, lowest) VALUES (?, ?)', (key, lowest))
+            conn.executemany('UPDATE price_watches SET last_lowest = ? WHERE watch_id = ?',
+                             [(last_lowest, watch_id) for watch_id, last_lowest in watches])
+        finally:
+            conn.execute('COMMIT')
+
+    def claim(self, owner: str, lease: float) -> bool:
+        '''Take or renew the scheduler lease for `lease` seconds; only one owner holds it at a time.'''
+        now = time.time()
+        conn = self._connect()
+        conn.execute('INSERT OR IGNORE INTO price_watch_scheduler (id, owner, until) VALUES (0, ?, 0)', (owner,))
+        return conn.execute('UPDATE price_watch_scheduler SET owner = ?, until = ? '
+                            'WHERE id = 0 AND (owner = ? OR until <= ?)', (owner, now + lease, owner, now)).rowcount == 1
+
+    def release(self, owner: str) -> None:
+        self._connect().execute('UPDATE price_watch_scheduler SET until = 0 WHERE id = 0 AND owner = ?', (owner,))
+
+
+class PriceWatcher:
+    '''
+    Polls watched searches on a shared schedule and pushes price changes to subscribers.
+
+    Watches on the same search (route or stay, dates and party, i.e. the same
+    cache key) share one route, so polling cost grows with distinct routes,
+    not with subscribers. Routes sit in a heap ordered by next due time; one
+    scheduler task polls the due ones, at most `concurrency` at a time and
+    no faster than `rate` polls per second across all local processes, which
+    leaves the rest of the SerpAPI quota to interactive searches.
+
+    Polls go through the search cache, spaced at least one cache lifetime
+    apart so each one fetches, and refreshes the cache for everyone searching
+    the same route. Every result is diffed against the route's previous
+    snapshot and subscribers only hear about it when the lowest price moved
+    by at least `min_change` (and reached their `below` price, if they set
+    one). Failed polls, including stale fallbacks, are retried after `retry`
+    seconds, doubling up to the interval.
+
+    A watch may ask for a shorter interval, e.g. one made during a call that
+    should report back before the call ends. Its route is then polled that
+    often, bypassing the cache and refreshing it with each result. Watches
+    with a `ttl` are dropped once it has passed.
+
+    A subscriber may hold at most `max_per_subscriber` watches and at most
+    `max_routes` distinct searches are polled; watches past either limit are
+    refused. A subscriber is dropped along with its last watch.
+
+    With a `store`, watches are kept there instead, so several worker
+    processes can add and drop them, and only the process holding the
+    store's scheduler lease polls, loading any changes every `sync_interval`
+    seconds. Changes are then delivered through `deliver`, which builds the
+    notify function of a subscriber from its name.
+    '''
+
+    def __init__(self, interval: float = PRICE_WATCH_INTERVAL, retry: float = PRICE_WATCH_RETRY,
+                 rate: float = PRICE_WATCH_RATE, concurrency: int = PRICE_WATCH_CONCURRENCY,
+                 min_change: float = PRICE_WATCH_MIN_CHANGE, bucket: Optional[TokenBucket] = None,
+                 max_per_subscriber: int = PRICE_WATCH_MAX_PER_SUBSCRIBER,
+                 max_routes: int = PRICE_WATCH_MAX_ROUTES, store: Optional[WatchStore] = None,
+                 deliver: Optional[Callable[[str], Notify]] = None, sync_interval: float = PRICE_WATCH_SYNC):
+        self.interval = interval
+        self.retry = retry
+        self.concurrency = concurrency
+        self.min_change = min_change
+        self.max_per_subscriber = max_per_subscriber
+        self.max_routes = max_routes
+        self.bucket = bucket or TokenBucket(rate=rate, burst=1, name='price_watch')
+        self.store = store
+        self.deliver = deliver
+        self.sync_interval = sync_interval
+        # Without a store this process always polls its own watches
+        self.leader = store is None
+        self._owner = uuid.uuid4().hex
+        self._next_sync = 0.0
+        self._routes: Dict[str, _Route] = {}
+        self._watches: Dict[str, Watch] = {}
+        self._by_subscriber: Dict[str, Set[str]] = {}
+        self._subscribers: Dict[str, Notify] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._scheduler: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.polls = 0
+        self.changes = 0
+        self.failures = 0
+        self.notifications = 0
+
+    def subscribe(self, subscriber: str, notify: Notify) -> None:
+        '''Deliver the changes of `subscriber`'s watches through `notify`.'''
+        self._subscribers[subscriber] = notify
+
+    def unsubscribe(self, subscriber: str) -> int:
+        '''Stop delivering to `subscriber` and drop all of its watches; return how many it had.'''
+        self._subscribers.pop(subscriber, None)
+        watch_ids = list(self._by_subscriber.get(subscriber, ()))
+        for watch_id in watch_ids:
+            self._drop(watch_id)
+        if self.store is not None:
+            return self.store.remove_subscriber(subscriber)
+        return len(watch_ids)
+
+    def watch_count(self, subscriber: str) -> int:
+        if self.store is not None:
+            return self.store.count(subscriber)
+        return len(self._by_subscriber.get(subscriber, ()))
+
+    def watch(self, subscriber: str, engine: str, params: BaseModel, below: Optional[float] = None,
+              interval: Optional[float] = None, ttl: Optional[float] = None) -> Dict[str, Any]:
+        '''
+        Start watching a search for `subscriber`, polled at least every `interval`
+        seconds if given, for `ttl` seconds if given; must be called on the event
+        loop that runs the polls.
+        '''
+        key = cache_key(engine, params)
+        expires_at = time.time() + ttl if ttl is not None else None
+        watch = Watch(uuid.uuid4().hex[:12], subscriber, key, below, None, interval, expires_at)
+        if self.store is not None:
+            try:
+                limit = self.store.add(watch, engine, params, self.max_per_subscriber, self.max_routes)
+            except sqlite3.Error as e:
+                print(f'Price watch store unavailable: {e}')
+                return {"error": "Price watches are not available right now."}
+        else:
+            route = self._routes.get(key)
+            watch.last_lowest = min(route.snapshot.values(), default=None) if route and route.snapshot else None
+            limit = ('subscriber' if self.watch_count(subscriber) >= self.max_per_subscriber
+                     else 'routes' if route is None and len(self._routes) >= self.max_routes else None)
+        if limit is not None:
+            return {"error": _LIMITS[limit].format(max_per_subscriber=self.max_per_subscriber)}
+        self.start()
+        if self.leader:
+            self._add(watch, engine, params)
+        every = self._interval(key, interval)
+        return {'watch_id': watch.watch_id, 'route': describe(engine, params), 'lowest': watch.last_lowest,
+                'below': below, 'check_every_min': max(round(every / 60), 1)}
+
+    def _add(self, watch: Watch, engine: str, params: BaseModel) -> None:
+        key = watch.key
+        route = self._routes.get(key)
+        if route is None:
+            route = self._routes[key] = _Route(engine, params, describe(engine, params))
+            PRICE_WATCH_ROUTES.inc()
+            # The first poll only takes a baseline, usually from the cache the user's own search just filled
+            self._schedule(key, route, 0)
+        route.watches[watch.watch_id] = watch
+        self._watches[watch.watch_id] = watch
+        self._by_subscriber.setdefault(watch.subscriber, set()).add(watch.watch_id)
+        every = self._interval(key)
+        if route.due > time.monotonic() + every:
+            # Sooner than the route was due, e.g. a first live watch on it
+            self._schedule(key, route, every)
+
+    def unwatch(self, watch_id: str) -> bool:
+        '''Drop a watch, and its route once nobody watches it; False if it is unknown.'''
+        dropped = self._drop(watch_id) is not None
+        if self.store is not None:
+            return self.store.remove(watch_id)
+        return dropped
+
+    def _drop(self, watch_id: str) -> Optional[Watch]:
+        # Forget a watch in this process only
+        watch = self._watches.pop(watch_id, None)
+        if watch is None:
+            return None
+        owned = self._by_subscriber.get(watch.subscriber)
+        if owned is not None:
+            owned.discard(watch_id)
+            if not owned:
+                del self._by_subscriber[watch.subscriber]
+                self._subscribers.pop(watch.subscriber, None)
+        route = self._routes.get(watch.key)
+        if route is not None:
+            route.watches.pop(watch_id, None)
+            if not route.watches:
+                # Its heap entry is skipped when it comes up
+                del self._routes[watch.key]
+                PRICE_WATCH_ROUTES.dec()
+        return watch
+
+    @staticmethod
+    def _lifetime(key: str) -> float:
+        return search_cache.ttl_for(key) + (search_cache.stale_ttl if search_cache.disk is not None else 0)
+
+    def _interval(self, key: str, interval: Optional[float] = None) -> float:
+        # Polls as often as the route's, or a new watch's `interval`, asks for
+        route = self._routes.get(key)
+        intervals = [w.interval for w in route.watches.values() if w.interval] if route else []
+        live = min(intervals + [interval] if interval else intervals, default=None)
+        if live is not None and live < self.interval:
+            return live
+        # A poll sooner than the cached result expires would only read it back
+        return max(self.interval, self._lifetime(key))
+
+    def _expire(self, route: _Route) -> None:
+        now = time.time()
+        for watch in [w for w in route.watches.values() if w.expires_at is not None and w.expires_at <= now]:
+            self.unwatch(watch.watch_id)
+
+    def start(self) -> None:
+        '''Run the scheduler on the current event loop, unless it already runs there.'''
+        loop = asyncio.get_running_loop()
+        if self._scheduler is not None and not self._scheduler.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._scheduler = loop.create_task(self._run())
+
+    def _schedule(self, key: str, route: _Route, delay: float) -> None:
+        if self._routes.get(key) is not route:
+            return
+        route.due = time.monotonic() + delay
+        heapq.heappush(self._heap, (route.due, next(self._sequence), key))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _sync(self) -> None:
+        # Only the process holding the lease polls; the others stand by to take over from it
+        try:
+            leader = await asyncio.to_thread(self.store.claim, self._owner, 3 * self.sync_interval)
+            rows = await asyncio.to_thread(self.store.load) if leader else []
+        except sqlite3.Error as e:
+            print(f'Price watch store unavailable: {e}')
+            return
+        self.leader = leader
+        current = {watch.watch_id for watch, _, _ in rows}
+        for watch_id in [w for w in self._watches if w not in current]:
+            # Dropped through another process, or polled by another one from now on
+            self._drop(watch_id)
+        for watch, engine, params in rows:
+            if watch.watch_id not in self._watches:
+                self._add(watch, engine, params)
+
+    async def _sleep(self, delay: Optional[float]) -> None:
+        # Until `delay` passes (forever if None), or a new route is scheduled
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            sync = None
+            if self.store is not None:
+                if time.monotonic() >= self._next_sync:
+                    await self._sync()
+                    self._next_sync = time.monotonic() + self.sync_interval
+                sync = self._next_sync - time.monotonic()
+            if not self._heap:
+                await self._sleep(sync)
+                continue
+            due, _, key = self._heap[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                # Sleep until the next route is due, a new one is scheduled sooner, or the next sync
+                await self._sleep(min(delay, sync) if sync is not None else delay)
+                continue
+            heapq.heappop(self._heap)
+            route = self._routes.get(key)
+            if route is None or route.due != due:
+                # Dropped or rescheduled since this entry was pushed
+                continue
+            self._expire(route)
+            if key not in self._routes:
+                continue
+            await self._semaphore.acquire()
+            await self.bucket.acquire(max_wait=math.inf)
+            self._spawn(self._poll(key, route))
+
+    async def _poll(self, key: str, route: _Route) -> None:
+        # Polls sooner than the cache expires must fetch to see anything new
+        fresh = self._interval(key) < self._lifetime(key)
+        try:
+            with span('price_watch', route.engine):
+                try:
+                    result = await (_FETCHES if fresh else _SEARCHES)[route.engine](route.params)
+                    if fresh and isinstance(result, dict) and 'error' not in result:
+                        # Everyone searching this route gets the newer result too
+                        await asyncio.to_thread(search_cache.set, key, result)
+                except Exception as e:
+                    result = {'error': str(e)}
+        finally:
+            self._semaphore.release()
+        self.polls += 1
+        if not isinstance(result, dict) or 'error' in result or 'notice' in result:
+            # Errors and stale fallbacks say nothing new about prices
+            route.failures += 1
+            self.failures += 1
+            PRICE_WATCH_POLLS.labels('failed').inc()
+            self._schedule(key, route, min(self.retry * 2 ** (route.failures - 1), self._interval(key)))
+            return
+        route.failures = 0
+        current = snapshot(route.engine, result)
+        change = diff(route.snapshot, current, self.min_change) if route.snapshot is not None else None
+        route.snapshot = current
+        PRICE_WATCH_POLLS.labels('changed' if change else 'unchanged').inc()
+        self._schedule(key, route, self._interval(key))
+        if change:
+            self.changes += 1
+        reported = self._notify(route, current, change)
+        lowest = min(current.values(), default=None)
+        if self.store is not None and lowest is not None and self._routes.get(key) is route:
+            # So a process taking over, and new watches, start from what was last seen
+            try:
+                await asyncio.to_thread(self.store.record, key, lowest, reported)
+            except sqlite3.Error as e:
+                print(f'Price watch store unavailable: {e}')
+
+    def _notify(self, route: _Route, current: Dict[str, float],
+                change: Optional[Dict[str, Any]]) -> List[Tuple[str, float]]:
+        # Returns the watches whose last lowest price moved, with the new one
+        reported: List[Tuple[str, float]] = []
+        lowest = min(current.values(), default=None)
+        if lowest is None:
+            return reported
+        for watch in route.watches.values():
+            previous = watch.last_lowest
+            if previous is None:
+                watch.last_lowest = lowest
+                reported.append((watch.watch_id, lowest))
+                continue
+            if change is None or abs(lowest - previous) < self.min_change:
+                continue
+            if watch.below is not None and lowest > watch.below:
+                continue
+            watch.last_lowest = lowest
+            reported.append((watch.watch_id, lowest))
+            direction = 'dropped' if lowest < previous else 'rose'
+            self._spawn(self._send(watch.subscriber, {
+                'watch_id': watch.watch_id,
+                'route': route.label,
+                'lowest': lowest,
+                'previous_lowest': previous,
+                'cheaper': change['cheaper'][:3],
+                'message': f'The lowest price for {route.label} {direction} from ${previous:,.0f} to ${lowest:,.0f}.',
+            }))
+        return reported
+
+    async def _send(self, subscriber: str, event: Dict[str, Any]) -> None:
+        notify = self._subscribers.get(subscriber)
+        if notify is None and self.deliver is not None:
+            notify = self.deliver(subscriber)
+        if notify is None:
+            return
+        try:
+            await notify(event)
+            self.notifications += 1
+            PRICE_WATCH_NOTIFICATIONS.labels('sent').inc()
+        except Exception as e:
+            print(f'Price watch notification to {subscriber} failed: {e}')
+            PRICE_WATCH_NOTIFICATIONS.labels('failed').inc()
+
+    async def aclose(self) -> None:
+        '''Stop polling and cancel pending polls and notifications.'''
+        tasks = [t for t in [self._scheduler, *self._tasks] if t is not None and not t.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._scheduler = None
+        if self.store is not None and self.leader:
+            # Let another process take over right away
+            try:
+                self.store.release(self._owner)
+            except sqlite3.Error:
+                pass
+            self.leader = False
+
+    def stats(self) -> Dict[str, Any]:
+        next_due = min((r.due for r in self._routes.values()), default=None)
+        return {
+            'polling': self.leader,
+            'routes': len(self._routes),
+            'watches': len(self._watches),
+            'subscribers': len(self._by_subscriber),
+            'polls': self.polls,
+            'changes': self.changes,
+            'failures': self.failures,
+            'notifications': self.notifications,
+            'next_poll_in': round(max(next_due - time.monotonic(), 0.0), 1) if next_due is not None else None,
+        }
+
+
+_price_watcher: Optional[PriceWatcher] = None
+
+
+def get_price_watcher() -> PriceWatcher:
+    '''Return the process-wide price watcher, creating it on first use.'''
+    global _price_watcher
+    if _price_watcher is None:
+        _price_watcher = PriceWatcher(store=WatchStore(PRICE_WATCH_PATH) if PRICE_WATCH_PATH else None)
+    return _price_watcher
+
+
+class WatchPriceInput(BaseModel):
+    flights: Optional[FlightsInput] = Field(default=None, description='The flight search to watch, as given to flights_finder')
+    hotels: Optional[HotelsInput] = Field(default=None, description='The hotel search to watch, as given to hotels_finder')
+    below: Optional[float] = Field(default=None, description='Only notify once the lowest price is at or below this, in USD')
+
+
+def start_price_watch(params: WatchPriceInput, subscriber: str, interval: Optional[float] = None,
+                      ttl: Optional[float] = None) -> Dict[str, Any]:
+    '''Start a watch on the flight or hotel search in `params` for `subscriber`.'''
+    if (params.flights is None) == (params.hotels is None):
+        return {"error": "Give exactly one of flights or hotels to watch."}
+    if params.flights is not None:
+        return get_price_watcher().watch(subscriber, 'google_flights', params.flights, params.below, interval, ttl)
+    return get_price_watcher().watch(subscriber, 'google_hotels', params.hotels, params.below, interval, ttl)
+
+
+# Client for the REST service's watch endpoints, created on first use
+_api_client: Optional[httpx.AsyncClient] = None
+
+
+def _watch_api() -> httpx.AsyncClient:
+    global _api_client
+    if _api_client is None:
+        _api_client = httpx.AsyncClient(base_url=PRICE_WATCH_API_URL, timeout=10,
+                                        headers={'Authorization': f'Bearer {PRICE_WATCH_API_KEY}'})
+    return _api_client
+
+
+async def awatch_for_room(params: WatchPriceInput, room: str) -> Dict[str, Any]:
+    '''
+    Start a watch in the REST service's watcher, which all voice workers share,
+    with changes sent to the LiveKit `room` while it lasts.
+    '''
+    if not PRICE_WATCH_API_URL:
+        return {"error": "Price watches are not available right now."}
+    try:
+        response = await _watch_api().post('/watches', json={'room': room, **params.model_dump(exclude_none=True)})
+        result = response.json()
+    except (httpx.HTTPError, ValueError) as e:
+        return {"error": f"Could not set up the price watch: {e}"}
+    if response.status_code >= 400:
+        return {"error": result.get('detail') or f"Could not set up the price watch ({response.status_code})"}
+    return result
+
+
+async def aend_room_watches(room: str) -> None:
+    '''Drop the watches of a LiveKit room, e.g. when its session ends.'''
+    if not PRICE_WATCH_API_URL:
+        return
+    try:
+        await _watch_api().delete(f'/rooms/{quote(room, safe="")}/watches')
+    except httpx.HTTPError as e:
+        print(f'Dropping the price watches of room {room} failed: {e}')
@@ -0,0 +1,77 @@
+import re
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+
+# A sentence ends at terminal punctuation followed by whitespace, or at a line break
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…:;])\s+|\n+')
+
+
+def message_text(content: Any) -> str:
+    '''Extract the text of a message or message chunk content (str or list of parts).'''
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content or []:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, dict) and part.get('type') == 'text':
+            parts.append(part.get('text', ''))
+    return ''.join(parts)
+
+
+class SentenceChunker:
+    '''
+    Groups streamed LLM tokens into sentence-sized chunks.
+
+    TTS engines sound unnatural when fed single tokens and add latency when
+    fed whole paragraphs, so text is released one sentence at a time. Very
+    short sentences are held back until at least `min_chars` are buffered.
+    '''
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self._buffer = ''
+
+    def push(self, text: str) -> List[str]:
+        self._buffer += text
+        chunks = []
+        while True:
+            match = None
+            for candidate in _SENTENCE_BOUNDARY.finditer(self._buffer):
+                if candidate.start() >= self.min_chars:
+                    match = candidate
+                    break
+            if match is None:
+                return chunks
+            chunks.append(self._buffer[:match.start()].strip())
+            self._buffer = self._buffer[match.end():]
+
+    def flush(self) -> Optional[str]:
+        rest, self._buffer = self._buffer.strip(), ''
+        return rest or None
+
+
+async def stream_graph(graph, inputs: Any, config: Any) -> AsyncIterator[Tuple[str, str]]:
+    '''
+    Run the travel graph and yield ("status", text) events while tools run and
+    ("text", sentence) chunks of the reply as the LLM produces them.
+    '''
+    chunker = SentenceChunker()
+    async for mode, chunk in graph.astream(inputs, config, stream_mode=['messages', 'custom']):
+        if mode == 'custom':
+            if isinstance(chunk, dict) and 'status' in chunk:
+                yield 'status', chunk['status']
+            continue
+        message, metadata = chunk
+        if metadata.get('langgraph_node') != 'call_tools_llm':
+            continue
+        for sentence in chunker.push(message_text(message.content)):
+            yield 'text', sentence
+        # Flush before tools run so nothing said ahead of a tool call is held back
+        if getattr(message, 'tool_call_chunks', None):
+            rest = chunker.flush()
+            if rest:
+                yield 'text', rest
+    rest = chunker.flush()
+    if rest:
+        yield 'text', rest
@@ -0,0 +1,49 @@
+from typing import Any, Dict
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
+
+from price_watch import WatchPriceInput, awatch_for_room
+
+from tools.fare_matrix import afind_fare_matrix
+from tools.flights_finder import afind_flights, find_flights
+from tools.hotels_finder import afind_hotels, find_hotels
+from tools.itinerary import aplan_itinerary
+from tools.refine import filter_flights_result, filter_hotels_result
+from tools.results import get_more_results, get_result_details
+
+
+# LangChain wrappers of the search functions for the agent graph. They live apart
+# from the search modules so that services which only search, like the REST API,
+# never import LangChain.
+flights_finder = StructuredTool.from_function(func=find_flights, coroutine=afind_flights, name='flights_finder')
+hotels_finder = StructuredTool.from_function(func=find_hotels, coroutine=afind_hotels, name='hotels_finder')
+fare_matrix = StructuredTool.from_function(coroutine=afind_fare_matrix, name='fare_matrix')
+result_details = StructuredTool.from_function(func=get_result_details, name='result_details')
+more_results = StructuredTool.from_function(func=get_more_results, name='more_results')
+filter_flights = StructuredTool.from_function(func=filter_flights_result, name='filter_flights')
+filter_hotels = StructuredTool.from_function(func=filter_hotels_result, name='filter_hotels')
+plan_itinerary = StructuredTool.from_function(coroutine=aplan_itinerary, name='plan_itinerary')
+
+
+async def _watch_price(params: WatchPriceInput, config: RunnableConfig) -> Dict[str, Any]:
+    '''
+    Watch the prices of a flight or hotel search and tell the user when the
+    lowest price changes during this call, e.g. "let me know if this fare
+    drops". Prices are checked every few minutes until the call ends.
+
+    Args:
+        params (WatchPriceInput): The search to watch and an optional target price
+
+    Returns:
+        dict: The watch ID, the route, the lowest price known so far and how
+        often it is checked.
+    '''
+    # Changes are delivered to the room the watch was set up in
+    room = config.get('configurable', {}).get('room')
+    if not room:
+        return {"error": "Price watches are only available during a call."}
+    return await awatch_for_room(params, room)
+
+
+watch_price = StructuredTool.from_function(coroutine=_watch_price, name='watch_price')
@@ -0,0 +1,62 @@
+from typing import Optional
+
+
+# City served by common airports, used to turn a flight's arrival airport into a hotel search location
+AIRPORT_CITIES = {
+    'ATL': 'Atlanta', 'BOS': 'Boston', 'ORD': 'Chicago', 'MDW': 'Chicago', 'DFW': 'Dallas', 'DEN': 'Denver',
+    'DTW': 'Detroit', 'HNL': 'Honolulu', 'IAH': 'Houston', 'LAS': 'Las Vegas', 'LAX': 'Los Angeles',
+    'MIA': 'Miami', 'MSP': 'Minneapolis', 'JFK': 'New York', 'LGA': 'New York', 'EWR': 'New York',
+    'MCO': 'Orlando', 'PHL': 'Philadelphia', 'PHX': 'Phoenix', 'PDX': 'Portland', 'SAN': 'San Diego',
+    'SFO': 'San Francisco', 'SEA': 'Seattle', 'IAD': 'Washington', 'DCA': 'Washington',
+    'YYZ': 'Toronto', 'YVR': 'Vancouver', 'YUL': 'Montreal', 'MEX': 'Mexico City', 'CUN': 'Cancun',
+    'GRU': 'Sao Paulo', 'GIG': 'Rio de Janeiro', 'EZE': 'Buenos Aires', 'BOG': 'Bogota', 'LIM': 'Lima',
+    'SCL': 'Santiago',
+    'LHR': 'London', 'LGW': 'London', 'STN': 'London', 'LCY': 'London', 'MAN': 'Manchester',
+    'EDI': 'Edinburgh', 'DUB': 'Dublin', 'CDG': 'Paris', 'ORY': 'Paris', 'NCE': 'Nice',
+    'AMS': 'Amsterdam', 'BRU': 'Brussels', 'FRA': 'Frankfurt', 'MUC': 'Munich', 'BER': 'Berlin',
+    'HAM': 'Hamburg', 'ZRH': 'Zurich', 'GVA': 'Geneva', 'VIE': 'Vienna', 'PRG': 'Prague',
+    'BUD': 'Budapest', 'WAW': 'Warsaw', 'CPH': 'Copenhagen', 'OSL': 'Oslo', 'ARN': 'Stockholm',
+    'HEL': 'Helsinki', 'MAD': 'Madrid', 'BCN': 'Barcelona', 'LIS': 'Lisbon', 'OPO': 'Porto',
+    'FCO': 'Rome', 'MXP': 'Milan', 'LIN': 'Milan', 'VCE': 'Venice', 'ATH': 'Athens', 'IST': 'Istanbul',
+    'SAW': 'Istanbul',
+    'DXB': 'Dubai', 'AUH': 'Abu Dhabi', 'DOH': 'Doha', 'JED': 'Jeddah', 'RUH': 'Riyadh', 'TLV': 'Tel Aviv',
+    'CAI': 'Cairo', 'CMN': 'Casablanca', 'JNB': 'Johannesburg', 'CPT': 'Cape Town', 'NBO': 'Nairobi',
+    'ADD': 'Addis Ababa', 'LOS': 'Lagos',
+    'KHI': 'Karachi', 'LHE': 'Lahore', 'ISB': 'Islamabad', 'DEL': 'Delhi', 'BOM': 'Mumbai',
+    'BLR': 'Bangalore', 'MAA': 'Chennai', 'CMB': 'Colombo', 'DAC': 'Dhaka', 'KTM': 'Kathmandu',
+    'BKK': 'Bangkok', 'DMK': 'Bangkok', 'HKT': 'Phuket', 'SIN': 'Singapore', 'KUL': 'Kuala Lumpur',
+    'CGK': 'Jakarta', 'DPS': 'Bali', 'MNL': 'Manila', 'SGN': 'Ho Chi Minh City', 'HAN': 'Hanoi',
+    'HKG': 'Hong Kong', 'TPE': 'Taipei', 'PEK': 'Beijing', 'PKX': 'Beijing', 'PVG': 'Shanghai',
+    'SHA': 'Shanghai', 'CAN': 'Guangzhou', 'ICN': 'Seoul', 'GMP': 'Seoul', 'NRT': 'Tokyo', 'HND': 'Tokyo',
+    'KIX': 'Osaka', 'SYD': 'Sydney', 'MEL': 'Melbourne', 'BNE': 'Brisbane', 'PER': 'Perth',
+    'AKL': 'Auckland',
+}
+
+
+def city_for(airport: Optional[str]) -> Optional[str]:
+    '''Return the city served by an IATA airport code, or None if it is not known.'''
+    return AIRPORT_CITIES.get((airport or '').strip().upper())
+
+
+# Other names users say for a city, mapped to its name in AIRPORT_CITIES
+CITY_ALIASES = {
+    'nyc': 'New York', 'new york city': 'New York', 'manhattan': 'New York', 'la': 'Los Angeles',
+    'sf': 'San Francisco', 'vegas': 'Las Vegas', 'dc': 'Washington', 'washington dc': 'Washington',
+    'chicago o\'hare': 'Chicago', 'rio': 'Rio de Janeiro', 'saigon': 'Ho Chi Minh City', 'bombay': 'Mumbai',
+    'bengaluru': 'Bangalore', 'madras': 'Chennai', 'peking': 'Beijing', 'mexico': 'Mexico City',
+}
+
+# City (and alias) name -> main airport, the first one listed for the city above
+IATA_BY_CITY = {}
+for _code, _city in AIRPORT_CITIES.items():
+    IATA_BY_CITY.setdefault(_city.casefold(), _code)
+for _alias, _city in CITY_ALIASES.items():
+    IATA_BY_CITY[_alias] = IATA_BY_CITY[_city.casefold()]
+
+
+def airport_for(place: Optional[str]) -> Optional[str]:
+    '''Return the IATA code for an airport code or city name, or None if it is not known.'''
+    name = ' '.join((place or '').split())
+    if name.upper() in AIRPORT_CITIES:
+        return name.upper()
+    return IATA_BY_CITY.get(name.casefold())
@@ -0,0 +1,303 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pydantic import BaseModel
+
+from metrics import record_cache
+from tools.disk_cache import FRESH, SEARCH_DISK_CACHE_PATH, STALE, DiskCache
+
+
+# Cache settings, overridable per deployment
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', '900'))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '512'))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv('SEARCH_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+# Per-engine TTL overrides, e.g. "google_flights=600,google_hotels=3600"
+SEARCH_CACHE_TTLS = {
+    engine.strip(): float(ttl)
+    for engine, _, ttl in (item.partition('=') for item in os.getenv('SEARCH_CACHE_TTLS', '').split(',') if '=' in item)
+}
+# How long past its TTL a disk entry may still be served while it is refreshed; 0 disables
+SEARCH_CACHE_STALE_TTL = float(os.getenv('SEARCH_CACHE_STALE_TTL', '600'))
+
+STALE_NOTICE = 'Live search is unavailable right now; these results are from an earlier search and may be out of date.'
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return ' '.join(value.split()).casefold()
+    return value
+
+
+def cache_key(engine: str, params: BaseModel) -> str:
+    '''
+    Build a cache key from the search engine and its normalized input fields.
+
+    Strings are trimmed, whitespace-collapsed and case-folded so that
+    "jfk" and " JFK" or "Paris " and "paris" share one entry.
+    '''
+    fields = {k: _normalize(v) for k, v in params.model_dump().items()}
+    return engine + ':' + json.dumps(fields, sort_keys=True, separators=(',', ':'))
+
+
+class SearchCache:
+    '''
+    In-process TTL/LRU cache for search results with single-flight coalescing.
+
+    Entries expire after `ttl` seconds, or the engine's entry in `ttls`, and
+    the least recently used ones are evicted once `max_entries` or
+    `max_bytes` is exceeded. Concurrent lookups of the same missing key share
+    one upstream fetch instead of each issuing their own. Results carrying an
+    "error" key are never stored.
+
+    With a `disk` tier, misses fall through to the cache shared by all local
+    processes. A stale disk entry is returned immediately while a background
+    fetch refreshes it (stale-while-revalidate).
+
+    Expired entries are kept for `stale_ttl` seconds so that a failed fetch,
+    e.g. while the upstream circuit breaker is open, can still be answered
+    from the last known result, marked with a "notice" that it may be out of
+    date.
+    '''
+
+    def __init__(self, ttl: float = SEARCH_CACHE_TTL, max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+                 max_bytes: int = SEARCH_CACHE_MAX_BYTES, ttls: Optional[Dict[str, float]] = None,
+                 disk: Optional[DiskCache] = None, stale_ttl: float = SEARCH_CACHE_STALE_TTL):
+        self.ttl = ttl
+        self.ttls = SEARCH_CACHE_TTLS if ttls is None else ttls
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk = disk
+        self.stale_ttl = stale_ttl
+        self._entries: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, tuple[threading.Event, list]] = {}
+        self._ainflight: Dict[tuple[asyncio.AbstractEventLoop, str], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.fallbacks = 0
+
+    def ttl_for(self, key: str) -> float:
+        return self.ttls.get(key.split(':', 1)[0], self.ttl)
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        '''Return (True, value) on a fresh hit, otherwise (False, None).'''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, size, value = entry
+            if expires_at <= time.monotonic():
+                # Expired entries linger for the stale window as a fallback for upstream outages
+                if expires_at + self.stale_ttl <= time.monotonic():
+                    self._remove(key)
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def get_stale(self, key: str) -> Optional[Any]:
+        '''Return the last known value for `key`, however old, if one is still held.'''
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            return entry[2]
+        if self.disk is not None:
+            state, value, _ = self.disk.get(key)
+            if state is not None:
+                return value
+        return None
+
+    def _fallback(self, key: str, error: Dict[str, Any]) -> Dict[str, Any]:
+        # A failed search is answered from an older result when one is still around
+        value = self.get_stale(key)
+        if not isinstance(value, dict):
+            return error
+        self.fallbacks += 1
+        record_cache('fallback')
+        return {**value, 'notice': STALE_NOTICE}
+
+    def set(self, key: str, value: Any) -> None:
+        '''Store a fresh result in memory and, if enabled, on disk.'''
+        if isinstance(value, dict) and 'error' in value:
+            return
+        self._set_memory(key, value, self.ttl_for(key))
+        if self.disk is not None:
+            self.disk.set(key, value, self.ttl_for(key), self.stale_ttl)
+
+    def _set_memory(self, key: str, value: Any, ttl: float) -> None:
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes or ttl <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        if self.disk is not None:
+            self.disk.clear()
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _get_disk(self, key: str) -> tuple[Optional[str], Any]:
+        if self.disk is None:
+            return None, None
+        state, value, expires_at = self.disk.get(key)
+        if state == FRESH:
+            # Promote into memory for the rest of the entry's lifetime
+            self._set_memory(key, value, expires_at - time.time())
+            self.hits += 1
+            self.disk_hits += 1
+            record_cache('hit')
+        elif state == STALE:
+            self.stale_hits += 1
+            record_cache('stale')
+        return state, value
+
+    def _refresh(self, key: str, fetch: Callable[[], Any]) -> None:
+        self.refreshes += 1
+        try:
+            self.set(key, fetch())
+        except Exception as e:
+            print(f'Background refresh of {key} failed: {e}')
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Any]) -> Any:
+        '''Return the cached value for `key`, calling `fetch` once on a miss.'''
+        hit, value = self.get(key)
+        if hit:
+            self.hits += 1
+            record_cache('hit')
+            return value
+        state, value = self._get_disk(key)
+        if state == FRESH:
+            return value
+        if state == STALE:
+            if self.disk.claim_refresh(key):
+                threading.Thread(target=self._refresh, args=(key, fetch), daemon=True).start()
+            return value
+
+        with self._lock:
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                waiter = (threading.Event(), [])
+                self._inflight[key] = waiter
+                leader = True
+            else:
+                leader = False
+
+        event, holder = waiter
+        if not leader:
+            self.coalesced += 1
+            record_cache('coalesced')
+            event.wait()
+            if holder:
+                return holder[0]
+            # The leading fetch raised, so try on our own
+            return fetch()
+
+        self.misses += 1
+        record_cache('miss')
+        try:
+            value = fetch()
+            if isinstance(value, dict) and 'error' in value:
+                value = self._fallback(key, value)
+            else:
+                self.set(key, value)
+            holder.append(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    async def aget_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        '''Async version of `get_or_fetch`; waiters share one fetch task.'''
+        hit, value = self.get(key)
+        if hit:
+            self.hits += 1
+            record_cache('hit')
+            return value
+        # SQLite reads may wait on another process's lock; keep them off the event loop too
+        state, value = await asyncio.to_thread(self._get_disk, key) if self.disk is not None else (None, None)
+        if state == FRESH:
+            return value
+
+        inflight_key = (asyncio.get_running_loop(), key)
+        task = self._ainflight.get(inflight_key)
+        if state == STALE:
+            # Serve the stale value now; one background task per host refreshes it
+            if task is None and await asyncio.to_thread(self.disk.claim_refresh, key):
+                self.refreshes += 1
+                self._start_afetch(inflight_key, fetch)
+            return value
+        if task is not None:
+            self.coalesced += 1
+            record_cache('coalesced')
+        else:
+            self.misses += 1
+            record_cache('miss')
+            task = self._start_afetch(inflight_key, fetch)
+        # Shield the shared fetch so one cancelled caller does not cancel it for the others
+        return await asyncio.shield(task)
+
+    def _start_afetch(self, inflight_key: tuple[asyncio.AbstractEventLoop, str],
+                      fetch: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        task = asyncio.ensure_future(self._afetch(inflight_key[1], fetch))
+        self._ainflight[inflight_key] = task
+        task.add_done_callback(lambda _: self._ainflight.pop(inflight_key, None))
+        return task
+
+    async def _afetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = await fetch()
+        if isinstance(value, dict) and 'error' in value:
+            if self.disk is not None:
+                # The older result may have to be read from SQLite; keep that off the event loop too
+                return await asyncio.to_thread(self._fallback, key, value)
+            return self._fallback(key, value)
+        self._set_memory(key, value, self.ttl_for(key))
+        if self.disk is not None:
+            # SQLite writes may wait on another process's lock; keep them off the event loop
+            loop = asyncio.get_running_loop()
+            loop.run_in_executor(None, self.disk.set, key, value, self.ttl_for(key), self.stale_ttl)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        disk = self.disk.stats() if self.disk is not None else None
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'disk_hits': self.disk_hits,
+                'stale_hits': self.stale_hits,
+                'refreshes': self.refreshes,
+                'fallbacks': self.fallbacks,
+                'disk': disk,
+            }
+
+
+# Process-wide cache shared by the flight and hotel tools, backed by the
+# host-wide disk cache when SEARCH_DISK_CACHE_PATH is set
+search_cache = SearchCache(disk=DiskCache(SEARCH_DISK_CACHE_PATH) if SEARCH_DISK_CACHE_PATH else None)
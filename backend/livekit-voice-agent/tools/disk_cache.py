@@ -0,0 +1,139 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+# Shared on-disk cache file; empty disables the disk tier
+SEARCH_DISK_CACHE_PATH = os.getenv('SEARCH_DISK_CACHE_PATH', '')
+SEARCH_DISK_CACHE_MAX_BYTES = int(os.getenv('SEARCH_DISK_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+# How long a refreshing process owns a stale entry before another one may retry
+SEARCH_DISK_CACHE_REFRESH_LEASE = float(os.getenv('SEARCH_DISK_CACHE_REFRESH_LEASE', '30'))
+
+FRESH = 'fresh'
+STALE = 'stale'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS search_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    refresh_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS search_cache_stale_until ON search_cache (stale_until);
+'''
+
+
+class DiskCache:
+    '''
+    SQLite-backed search cache shared by every process on the host.
+
+    The database runs in WAL mode so readers never block on the single
+    writer, and entries survive restarts and deploys. Each entry is fresh
+    until its TTL runs out and may then be served stale for `stale_ttl` more
+    seconds while one process, holding a short refresh lease, fetches a new
+    value. Once the file holds more than `max_bytes` of values, the entries
+    closest to expiry are evicted. All errors are swallowed: the cache is
+    an optimization and must never fail a search.
+    '''
+
+    def __init__(self, path: str, max_bytes: int = SEARCH_DISK_CACHE_MAX_BYTES,
+                 refresh_lease: float = SEARCH_DISK_CACHE_REFRESH_LEASE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.refresh_lease = refresh_lease
+        self._local = threading.local()
+        self._writes = 0
+        self.errors = 0
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread and process; sqlite connections must not cross either
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: str) -> tuple[Optional[str], Any, float]:
+        '''Return (FRESH or STALE, value, expires_at), or (None, None, 0) if absent or too old.'''
+        try:
+            row = self._connect().execute(
+                'SELECT value, expires_at, stale_until FROM search_cache WHERE key = ?', (key,)).fetchone()
+        except sqlite3.Error:
+            self.errors += 1
+            return None, None, 0.0
+        if row is None:
+            return None, None, 0.0
+        value, expires_at, stale_until = row
+        now = time.time()
+        if now < expires_at:
+            return FRESH, json.loads(value), expires_at
+        if now < stale_until:
+            return STALE, json.loads(value), expires_at
+        return None, None, 0.0
+
+    def claim_refresh(self, key: str) -> bool:
+        '''Take the refresh lease of a stale entry; only one process at a time gets it.'''
+        now = time.time()
+        try:
+            cursor = self._connect().execute(
+                'UPDATE search_cache SET refresh_until = ? WHERE key = ? AND refresh_until <= ?',
+                (now + self.refresh_lease, key, now))
+        except sqlite3.Error:
+            self.errors += 1
+            return False
+        return cursor.rowcount == 1
+
+    def set(self, key: str, value: Any, ttl: float, stale_ttl: float = 0.0) -> None:
+        data = json.dumps(value, separators=(',', ':'), default=str)
+        if len(data) > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            self._connect().execute(
+                'INSERT OR REPLACE INTO search_cache (key, value, size, expires_at, stale_until, refresh_until) '
+                'VALUES (?, ?, ?, ?, ?, 0)',
+                (key, data, len(data), now + ttl, now + ttl + stale_ttl))
+            self._writes += 1
+            # Size accounting needs a table scan, so only check every few writes
+            if self._writes % 32 == 0:
+                self.evict()
+        except sqlite3.Error:
+            self.errors += 1
+
+    def evict(self) -> int:
+        '''Drop dead entries, then the ones closest to expiry until under `max_bytes`.'''
+        conn = self._connect()
+        evicted = conn.execute('DELETE FROM search_cache WHERE stale_until <= ?', (time.time(),)).rowcount
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM search_cache').fetchone()[0]
+        while total > self.max_bytes:
+            rows = conn.execute('SELECT key, size FROM search_cache ORDER BY stale_until LIMIT 64').fetchall()
+            if not rows:
+                break
+            conn.execute(f"DELETE FROM search_cache WHERE key IN ({','.join('?' * len(rows))})",
+                         [key for key, _ in rows])
+            total -= sum(size for _, size in rows)
+            evicted += len(rows)
+        return evicted
+
+    def clear(self) -> None:
+        try:
+            self._connect().execute('DELETE FROM search_cache')
+        except sqlite3.Error:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            entries, size = self._connect().execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM search_cache').fetchone()
+        except sqlite3.Error:
+            entries, size = None, None
+        return {'path': self.path, 'entries': entries, 'bytes': size, 'errors': self.errors}
@@ -0,0 +1,155 @@
+import asyncio
+import os
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from tools.flights_finder import FlightsInput, afind_flights
+
+
+# Upper bounds on a single matrix request, overridable per deployment
+FARE_MATRIX_MAX_CELLS = int(os.getenv('FARE_MATRIX_MAX_CELLS', '49'))
+FARE_MATRIX_CONCURRENCY = int(os.getenv('FARE_MATRIX_CONCURRENCY', '4'))
+# Seconds after which a matrix stops searching and returns the cells found so far; by default a little
+# under the agent's TOOL_TIMEOUT, so the LLM gets a partial matrix instead of a timed-out tool call
+FARE_MATRIX_DEADLINE = float(os.getenv('FARE_MATRIX_DEADLINE', str(max(float(os.getenv('TOOL_TIMEOUT', '30')) - 5, 1))))
+
+
+class FareMatrixInput(BaseModel):
+    departure_airport: str = Field(description='Departure airport code (IATA)')
+    arrival_airport: str = Field(description='Arrival airport code (IATA)')
+    outbound_from: str = Field(description='First possible outbound date. The format is YYYY-MM-DD. e.g. 2024-06-20')
+    outbound_to: str = Field(description='Last possible outbound date. The format is YYYY-MM-DD. e.g. 2024-06-24')
+    return_from: str = Field(description='First possible return date. The format is YYYY-MM-DD. e.g. 2024-06-27')
+    return_to: str = Field(description='Last possible return date. The format is YYYY-MM-DD. e.g. 2024-06-30')
+    adults: int = Field(default=1, description='Number of adults. Default to 1.')
+    children: int = Field(default=0, description='Number of children. Default to 0.')
+    infants_in_seat: int = Field(default=0, description='Number of infants in seat. Default to 0.')
+    infants_on_lap: int = Field(default=0, description='Number of infants on lap. Default to 0.')
+
+
+def _date_range(start: str, end: str) -> List[str]:
+    first, last = date.fromisoformat(start), date.fromisoformat(end)
+    days = (last - first).days + 1
+    # Checked before building anything: a window longer than the cap cannot fit in a valid matrix
+    if days > FARE_MATRIX_MAX_CELLS:
+        raise OverflowError(f"{start} to {end} covers {days} days; narrow it to at most {FARE_MATRIX_MAX_CELLS}.")
+    return [(first + timedelta(days=i)).isoformat() for i in range(days)]
+
+
+def matrix_dates(params: FareMatrixInput) -> Tuple[List[str], List[str], List[Tuple[str, str]]]:
+    '''
+    Outbound dates, return dates and the (outbound, return) pairs to search,
+    raising ValueError when the windows are invalid, empty or too large.
+    '''
+    try:
+        outbound_dates = _date_range(params.outbound_from, params.outbound_to)
+        return_dates = _date_range(params.return_from, params.return_to)
+    except OverflowError as e:
+        raise ValueError(str(e))
+    except ValueError as e:
+        raise ValueError(f"Invalid date: {e}")
+    # Both windows are within the cap, so at most its square of pairs is ever enumerated
+    pairs = [(o, r) for o in outbound_dates for r in return_dates if r >= o]
+    if not pairs:
+        raise ValueError("No return date falls on or after an outbound date.")
+    if len(pairs) > FARE_MATRIX_MAX_CELLS:
+        raise ValueError(f"Date windows cover {len(pairs)} date pairs; narrow them to at most {FARE_MATRIX_MAX_CELLS}.")
+    return outbound_dates, return_dates, pairs
+
+
+def _cheapest(result: Dict[str, Any]) -> Optional[int]:
+    prices = [f['price'] for f in result.get('flights', []) if isinstance(f, dict) and f.get('price') is not None]
+    return min(prices) if prices else None
+
+
+async def afare_matrix(params: FareMatrixInput,
+                       on_row: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+                       deadline: float = FARE_MATRIX_DEADLINE) -> Dict[str, Any]:
+    '''
+    Build a price grid of outbound x return dates for one route.
+
+    Every valid date pair is searched through `afind_flights`, so cached
+    cells are reused and duplicate searches are coalesced. At most
+    FARE_MATRIX_CONCURRENCY searches run at once. `on_row` is awaited with
+    each outbound row as soon as all of its cells are known. Searches still
+    running after `deadline` seconds are abandoned and the matrix is
+    returned with those cells empty, marked "partial".
+    '''
+    try:
+        outbound_dates, return_dates, pairs = matrix_dates(params)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    semaphore = asyncio.Semaphore(FARE_MATRIX_CONCURRENCY)
+    prices: Dict[str, Dict[str, Optional[int]]] = {o: {} for o in outbound_dates}
+    pending = {o: sum(1 for p in pairs if p[0] == o) for o in outbound_dates}
+    errors: List[str] = []
+
+    async def search(outbound_date: str, return_date: str) -> tuple[str, str, Dict[str, Any]]:
+        async with semaphore:
+            result = await afind_flights(FlightsInput(
+                departure_airport=params.departure_airport,
+                arrival_airport=params.arrival_airport,
+                outbound_date=outbound_date,
+                return_date=return_date,
+                adults=params.adults,
+                children=params.children,
+                infants_in_seat=params.infants_in_seat,
+                infants_on_lap=params.infants_on_lap,
+            ))
+        return outbound_date, return_date, result
+
+    tasks = [asyncio.ensure_future(search(o, r)) for o, r in pairs]
+    searched = 0
+    try:
+        for done in asyncio.as_completed(tasks, timeout=deadline):
+            try:
+                outbound_date, return_date, result = await done
+            except asyncio.TimeoutError:
+                break
+            searched += 1
+            if 'error' in result:
+                errors.append(f"{outbound_date}/{return_date}: {result['error']}")
+            prices[outbound_date][return_date] = _cheapest(result)
+            pending[outbound_date] -= 1
+            if pending[outbound_date] == 0 and on_row is not None:
+                await on_row({'outbound_date': outbound_date,
+                              'prices': [prices[outbound_date].get(r) for r in return_dates]})
+    finally:
+        # Shared cache fetches are shielded, so abandoned cells still land in the cache for next time
+        for task in tasks:
+            task.cancel()
+
+    grid = [[prices[o].get(r) for r in return_dates] for o in outbound_dates]
+    cells = [(price, o, r) for o in outbound_dates for r, price in prices[o].items() if price is not None]
+    cheapest = min(cells) if cells else None
+    matrix = {
+        'route': f'{params.departure_airport}-{params.arrival_airport}',
+        'outbound_dates': outbound_dates,
+        'return_dates': return_dates,
+        'prices': grid,
+        'cheapest': {'price': cheapest[0], 'outbound_date': cheapest[1], 'return_date': cheapest[2]} if cheapest else None,
+    }
+    if errors:
+        matrix['errors'] = errors[:5]
+    if searched < len(pairs):
+        matrix['partial'] = (f'Only {searched} of {len(pairs)} date pairs were searched in time; '
+                             f'empty cells were not searched.')
+    return matrix
+
+
+async def afind_fare_matrix(params: FareMatrixInput) -> Dict[str, Any]:
+    '''
+    Find the cheapest round-trip dates for a route across flexible date windows.
+    Use it when the user is flexible about when to fly, e.g. "what's the cheapest
+    day that week?". Keep the windows small: every date pair is a separate search.
+
+    Args:
+        params (FareMatrixInput): Route, outbound and return date windows and passengers
+
+    Returns:
+        dict: Price grid (rows are outbound dates, columns return dates) and the cheapest cell.
+    '''
+    return await afare_matrix(params)
@@ -1,19 +1,9 @@
-import os
 from typing import Optional, Dict, Any
 
-# Initialize serpapi as None to avoid unbound variable errors
-serpapi = None
-SERPAPI_AVAILABLE = False
-
-# Try to import serpapi
-try:
-    import serpapi
-    SERPAPI_AVAILABLE = True
-except ImportError:
-    pass
-
 from pydantic import BaseModel, Field
-from langchain_core.tools import tool
+
+from tools.cache import cache_key, search_cache
+from tools.search_client import get_search_client, search_unavailable
 
 
 class FlightsInput(BaseModel):
@@ -27,26 +17,8 @@ class FlightsInput(BaseModel):
     infants_on_lap: int = Field(default=0, description='Parameter defines the number of infants on lap. Default to 0.')
 
 
-@tool
-def flights_finder(params: FlightsInput) -> Dict[str, Any]:
-    '''
-    Find flights using the Google Flights engine.
-
-    Args:
-        params (FlightsInput): Flight search parameters
-
-    Returns:
-        dict: Flight search results.
-    '''
-    
-    if not SERPAPI_AVAILABLE:
-        return {"error": "SerpAPI is not available. Please install serpapi package."}
-    
-    if not os.environ.get('SERPAPI_API_KEY'):
-        return {"error": "SERPAPI_API_KEY environment variable is not set."}
-    
-    search_params = {
-        'api_key': os.environ.get('SERPAPI_API_KEY'),
+def _search_params(params: FlightsInput) -> Dict[str, Any]:
+    return {
         'engine': 'google_flights',
         'hl': 'en',
         'gl': 'us',
@@ -54,6 +26,8 @@ def flights_finder(params: FlightsInput) -> Dict[str, Any]:
         'arrival_id': params.arrival_airport,
         'outbound_date': params.outbound_date,
         'return_date': params.return_date,
+        # Round trip when a return date is given, one way otherwise
+        'type': '1' if params.return_date else '2',
         'currency': 'USD',
         'adults': params.adults,
         'infants_in_seat': params.infants_in_seat,
@@ -62,12 +36,46 @@ def flights_finder(params: FlightsInput) -> Dict[str, Any]:
         'children': params.children
     }
 
+
+def find_flights(params: FlightsInput) -> Dict[str, Any]:
+    '''
+    Find flights using the Google Flights engine.
+
+    Args:
+        params (FlightsInput): Flight search parameters
+
+    Returns:
+        dict: Flight search results.
+    '''
+
+    error = search_unavailable()
+    if error:
+        return error
+
+    def fetch():
+        try:
+            data = get_search_client().search(_search_params(params))
+            return {"flights": data.get('best_flights', []) + data.get('other_flights', [])}
+        except Exception as e:
+            return {"error": str(e)}
+
+    return search_cache.get_or_fetch(cache_key('google_flights', params), fetch)
+
+
+async def afetch_flights(params: FlightsInput) -> Dict[str, Any]:
+    '''Search upstream without the cache, e.g. to refresh a result before it expires.'''
     try:
-        if SERPAPI_AVAILABLE and serpapi is not None:
-            search = serpapi.search(search_params)
-            results = search.data.get('best_flights', [])
-            return {"flights": results}
-        else:
-            return {"error": "SerpAPI is not available."}
+        data = await get_search_client().asearch(_search_params(params))
+        return {"flights": data.get('best_flights', []) + data.get('other_flights', [])}
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+
+async def afind_flights(params: FlightsInput) -> Dict[str, Any]:
+    '''Async version of `find_flights` backed by the shared connection pool and cache.'''
+
+    error = search_unavailable()
+    if error:
+        return error
+
+    return await search_cache.aget_or_fetch(cache_key('google_flights', params), lambda: afetch_flights(params))
@@ -1,19 +1,9 @@
-import os
 from typing import Optional, Dict, Any
 
-# Initialize serpapi as None to avoid unbound variable errors
-serpapi = None
-SERPAPI_AVAILABLE = False
-
-# Try to import serpapi
-try:
-    import serpapi
-    SERPAPI_AVAILABLE = True
-except ImportError:
-    pass
-
 from pydantic import BaseModel, Field
-from langchain_core.tools import tool
+
+from tools.cache import cache_key, search_cache
+from tools.search_client import get_search_client, search_unavailable
 
 
 class HotelsInput(BaseModel):
@@ -28,26 +18,8 @@ class HotelsInput(BaseModel):
         default=None, description='Parameter defines to include only certain hotel class in the results. for example- 2,3,4')
 
 
-@tool
-def hotels_finder(params: HotelsInput) -> Dict[str, Any]:
-    '''
-    Find hotels using the Google Hotels engine.
-
-    Args:
-        params (HotelsInput): Hotel search parameters
-
-    Returns:
-        dict: Hotel search results.
-    '''
-    
-    if not SERPAPI_AVAILABLE:
-        return {"error": "SerpAPI is not available. Please install serpapi package."}
-    
-    if not os.environ.get('SERPAPI_API_KEY'):
-        return {"error": "SERPAPI_API_KEY environment variable is not set."}
-
-    search_params = {
-        'api_key': os.environ.get('SERPAPI_API_KEY'),
+def _search_params(params: HotelsInput) -> Dict[str, Any]:
+    return {
         'engine': 'google_hotels',
         'hl': 'en',
         'gl': 'us',
@@ -62,12 +34,46 @@ def hotels_finder(params: HotelsInput) -> Dict[str, Any]:
         'hotel_class': params.hotel_class
     }
 
+
+def find_hotels(params: HotelsInput) -> Dict[str, Any]:
+    '''
+    Find hotels using the Google Hotels engine.
+
+    Args:
+        params (HotelsInput): Hotel search parameters
+
+    Returns:
+        dict: Hotel search results.
+    '''
+
+    error = search_unavailable()
+    if error:
+        return error
+
+    def fetch():
+        try:
+            data = get_search_client().search(_search_params(params))
+            return {"hotels": data.get('properties', [])}
+        except Exception as e:
+            return {"error": str(e)}
+
+    return search_cache.get_or_fetch(cache_key('google_hotels', params), fetch)
+
+
+async def afetch_hotels(params: HotelsInput) -> Dict[str, Any]:
+    '''Search upstream without the cache, e.g. to refresh a result before it expires.'''
     try:
-        if SERPAPI_AVAILABLE and serpapi is not None:
-            search = serpapi.search(search_params)
-            results = search.data
-            return {"hotels": results.get('properties', [])[:5]}
-        else:
-            return {"error": "SerpAPI is not available."}
+        data = await get_search_client().asearch(_search_params(params))
+        return {"hotels": data.get('properties', [])}
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+
+async def afind_hotels(params: HotelsInput) -> Dict[str, Any]:
+    '''Async version of `find_hotels` backed by the shared connection pool and cache.'''
+
+    error = search_unavailable()
+    if error:
+        return error
+
+    return await search_cache.aget_or_fetch(cache_key('google_hotels', params), lambda: afetch_hotels(params))
@@ -0,0 +1,252 @@
+import asyncio
+import os
+import re
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from tools.airports import airport_for, city_for
+from tools.flights_finder import FlightsInput, afind_flights
+from tools.hotels_finder import HotelsInput, afind_hotels
+from tools.results import store_result, summarize_flight, summarize_hotel
+
+
+# Shortest time between landing in a city and flying on from it the same day
+ITINERARY_MIN_CONNECTION = timedelta(minutes=int(os.getenv('ITINERARY_MIN_CONNECTION_MIN', '90')))
+# Best options per leg that are tried against each other when combining legs
+ITINERARY_CANDIDATES = int(os.getenv('ITINERARY_CANDIDATES', '10'))
+# Upper bounds on a single itinerary: stops it may visit and leg or stay searches running at once
+ITINERARY_MAX_STOPS = int(os.getenv('ITINERARY_MAX_STOPS', '8'))
+ITINERARY_CONCURRENCY = int(os.getenv('ITINERARY_CONCURRENCY', '4'))
+
+
+class ItineraryStop(BaseModel):
+    city: str = Field(description='City name or airport code (IATA) of the stop')
+    arrive_date: str = Field(description='Date of the flight into this city. The format is YYYY-MM-DD.')
+    leave_date: str = Field(description='Date of the flight out of this city. The format is YYYY-MM-DD. '
+                                        'The same as arrive_date for a stopover without a hotel.')
+
+
+class ItineraryInput(BaseModel):
+    origin: str = Field(description='City name or airport code (IATA) the trip starts from')
+    stops: List[ItineraryStop] = Field(description='The cities to visit, in order')
+    return_home: bool = Field(default=True, description='Fly back to the origin on the last leave_date. Default to true.')
+    adults: int = Field(default=1, description='Parameter defines the number of adults. Default to 1.')
+    children: int = Field(default=0, description='Parameter defines the number of children. Default to 0.')
+    rooms: int = Field(default=1, description='Parameter defines the number of rooms. Default to 1.')
+    optimize: str = Field(default='price', description='price for the cheapest plan, duration for the least time '
+                                                       'in the air. Default to price.')
+
+
+def _airport(place: str) -> Optional[str]:
+    # Known cities and airports, or any other airport code as given
+    code = airport_for(place)
+    if code is None and re.fullmatch(r'[A-Za-z]{3}', place.strip()):
+        code = place.strip().upper()
+    return code
+
+
+def plan_searches(params: ItineraryInput) -> Tuple[List[FlightsInput], List[HotelsInput]]:
+    '''
+    One-way flight legs and hotel stays of an itinerary, raising ValueError
+    when a place is unknown or the dates are out of order.
+    '''
+    if not params.stops:
+        raise ValueError('Give at least one stop.')
+    if len(params.stops) > ITINERARY_MAX_STOPS:
+        raise ValueError(f'An itinerary may have at most {ITINERARY_MAX_STOPS} stops; split the trip up.')
+    origin = _airport(params.origin)
+    if origin is None:
+        raise ValueError(f'Unknown place {params.origin!r}, give its airport code.')
+    legs: List[FlightsInput] = []
+    stays: List[HotelsInput] = []
+    previous, previous_leave = origin, None
+    for stop in params.stops:
+        code = _airport(stop.city)
+        if code is None:
+            raise ValueError(f'Unknown place {stop.city!r}, give its airport code.')
+        try:
+            arrive, leave = date.fromisoformat(stop.arrive_date), date.fromisoformat(stop.leave_date)
+        except ValueError:
+            raise ValueError(f'Invalid dates for {stop.city}, use YYYY-MM-DD.')
+        if leave < arrive or (previous_leave is not None and arrive < previous_leave):
+            raise ValueError(f'The dates for {stop.city} are out of order.')
+        legs.append(FlightsInput(departure_airport=previous, arrival_airport=code, outbound_date=stop.arrive_date,
+                                 adults=params.adults, children=params.children))
+        if leave > arrive:
+            stays.append(HotelsInput(q=city_for(code) or stop.city, check_in_date=stop.arrive_date,
+                                     check_out_date=stop.leave_date, adults=params.adults,
+                                     children=params.children, rooms=params.rooms))
+        previous, previous_leave = code, leave
+    if params.return_home:
+        legs.append(FlightsInput(departure_airport=previous, arrival_airport=origin,
+                                 outbound_date=params.stops[-1].leave_date,
+                                 adults=params.adults, children=params.children))
+    return legs, stays
+
+
+def _times(flight: Dict[str, Any]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    legs = flight.get('flights') or [{}]
+    try:
+        depart = datetime.strptime((legs[0].get('departure_airport') or {}).get('time') or '', '%Y-%m-%d %H:%M')
+        arrive = datetime.strptime((legs[-1].get('arrival_airport') or {}).get('time') or '', '%Y-%m-%d %H:%M')
+    except ValueError:
+        return None, None
+    return depart, arrive
+
+
+_OBJECTIVES = {
+    # (primary, tie-break) cost of one flight
+    'price': lambda f: (f.get('price'), f.get('total_duration') or 0),
+    'duration': lambda f: (f.get('total_duration'), f.get('price') or 0),
+}
+
+
+def choose_flights(options: List[List[Dict[str, Any]]], optimize: str = 'price',
+                   candidates: int = ITINERARY_CANDIDATES) -> Optional[List[Dict[str, Any]]]:
+    '''
+    Pick one flight per leg, minimizing the summed cost, such that every
+    flight leaves at least ITINERARY_MIN_CONNECTION after the previous one
+    lands; None if no combination works.
+
+    Only consecutive legs constrain each other, so the best chain is found
+    leg by leg over each leg's `candidates` best options.
+    '''
+    cost = _OBJECTIVES[optimize]
+    # Per leg: (option, depart, arrive, cost); options without times or cost cannot be placed
+    legs = []
+    for leg in options:
+        ranked = []
+        for flight in leg:
+            depart, arrive = _times(flight)
+            primary, secondary = cost(flight)
+            if depart is not None and isinstance(primary, (int, float)):
+                ranked.append((flight, depart, arrive, (primary, secondary)))
+        ranked.sort(key=lambda r: r[3])
+        legs.append(ranked[:candidates])
+    if not legs or not all(legs):
+        return None
+    # best[i][j]: (total cost, index in leg i - 1) of the cheapest chain ending with option j of leg i
+    best: List[List[Optional[Tuple[Tuple[float, float], int]]]] = [[(r[3], -1) for r in legs[0]]]
+    for i in range(1, len(legs)):
+        row: List[Optional[Tuple[Tuple[float, float], int]]] = []
+        for _, depart, _, (primary, secondary) in legs[i]:
+            chains = []
+            for k, (entry, (_, _, arrive, _)) in enumerate(zip(best[i - 1], legs[i - 1])):
+                if entry is not None and arrive + ITINERARY_MIN_CONNECTION <= depart:
+                    chains.append(((entry[0][0] + primary, entry[0][1] + secondary), k))
+            row.append(min(chains) if chains else None)
+        best.append(row)
+    ends = [(entry[0], j) for j, entry in enumerate(best[-1]) if entry is not None]
+    if not ends:
+        return None
+    _, j = min(ends)
+    chosen = []
+    for i in range(len(legs) - 1, -1, -1):
+        chosen.append(legs[i][j][0])
+        j = best[i][j][1]
+    return chosen[::-1]
+
+
+def _hotel_total(hotel: Dict[str, Any], nights: int) -> Optional[float]:
+    total = (hotel.get('total_rate') or {}).get('extracted_lowest')
+    if isinstance(total, (int, float)):
+        return total
+    nightly = (hotel.get('rate_per_night') or {}).get('extracted_lowest')
+    return nightly * nights if isinstance(nightly, (int, float)) else None
+
+
+async def aplan_itinerary(params: ItineraryInput) -> Dict[str, Any]:
+    '''
+    Plan a multi-city trip in one go: one-way flights between the stops (and
+    back home) and a hotel for every stop with nights, searched concurrently
+    and combined into the cheapest or fastest plan whose connections work.
+    Up to ITINERARY_MAX_STOPS stops per trip.
+
+    Args:
+        params (ItineraryInput): Origin, ordered stops with dates, party size and what to optimize
+
+    Returns:
+        dict: The chosen flight per leg and hotel per stay with totals, and a
+        result_id per leg and stay to see other options.
+    '''
+    if params.optimize not in _OBJECTIVES:
+        return {"error": f"optimize must be one of {', '.join(_OBJECTIVES)}"}
+    try:
+        legs, stays = plan_searches(params)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    # Every leg and stay has fixed dates, so all searches are independent; at most
+    # ITINERARY_CONCURRENCY of them run at once so one trip cannot crowd out other users
+    semaphore = asyncio.Semaphore(ITINERARY_CONCURRENCY)
+
+    async def search(find, params):
+        async with semaphore:
+            return await find(params)
+
+    results = await asyncio.gather(*(search(afind_flights, leg) for leg in legs),
+                                   *(search(afind_hotels, stay) for stay in stays))
+    flight_results, hotel_results = results[:len(legs)], results[len(legs):]
+    notes = [r['notice'] for r in results if r.get('notice')][:1]
+
+    failed = [(leg, r) for leg, r in zip(legs, flight_results) if 'error' in r or not r.get('flights')]
+    for leg, result in failed:
+        notes.append(f"No flights from {leg.departure_airport} to {leg.arrival_airport} on {leg.outbound_date}"
+                     + (f": {result['error']}" if 'error' in result else '.'))
+    flights = None
+    if not failed:
+        flights = choose_flights([r['flights'] for r in flight_results], params.optimize)
+        if flights is None:
+            notes.append('No combination of flights connects every leg; see each leg\'s options.')
+    plan_legs = []
+    for i, (leg, result) in enumerate(zip(legs, flight_results)):
+        entry = {'from': leg.departure_airport, 'to': leg.arrival_airport, 'date': leg.outbound_date}
+        if 'error' in result:
+            entry['error'] = result['error']
+        else:
+            entry['result_id'] = await asyncio.to_thread(store_result, result)
+            entry['options'] = len(result.get('flights') or [])
+            if flights is not None:
+                entry['flight'] = summarize_flight(flights[i]).model_dump(exclude_none=True)
+        plan_legs.append(entry)
+
+    plan_stays = []
+    hotel_price = 0
+    for stay, result in zip(stays, hotel_results):
+        nights = (date.fromisoformat(stay.check_out_date) - date.fromisoformat(stay.check_in_date)).days
+        entry = {'city': stay.q, 'check_in': stay.check_in_date, 'check_out': stay.check_out_date, 'nights': nights}
+        if 'error' in result:
+            entry['error'] = result['error']
+            notes.append(f"No hotels in {stay.q} from {stay.check_in_date}: {result['error']}")
+        else:
+            entry['result_id'] = await asyncio.to_thread(store_result, result)
+            entry['options'] = len(result.get('hotels') or [])
+            priced = [(total, i) for i, h in enumerate(result.get('hotels') or [])
+                      if (total := _hotel_total(h, nights)) is not None]
+            if priced:
+                total, index = min(priced)
+                entry['hotel'] = summarize_hotel(result['hotels'][index]).model_dump(exclude_none=True)
+                hotel_price += total
+            else:
+                notes.append(f"No priced hotels in {stay.q} from {stay.check_in_date}; see its options.")
+        plan_stays.append(entry)
+
+    plan = {'optimize': params.optimize, 'legs': plan_legs, 'stays': plan_stays}
+    # Prices are only summed when every leg and stay has one, so a total is never silently short
+    flight_price = None
+    if flights is not None:
+        plan['air_minutes'] = sum(f.get('total_duration') or 0 for f in flights)
+        if all(isinstance(f.get('price'), (int, float)) for f in flights):
+            flight_price = plan['flight_price'] = sum(f['price'] for f in flights)
+        else:
+            notes.append('Some chosen flights have no price; flight_price and total_price are left out.')
+    hotels_priced = all('hotel' in entry for entry in plan_stays)
+    if hotels_priced:
+        plan['hotel_price'] = hotel_price
+    if flight_price is not None and hotels_priced:
+        plan['total_price'] = flight_price + hotel_price
+    if notes:
+        plan['notes'] = notes
+    return plan
@@ -0,0 +1,224 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from tools.results import RESULT_PAGE_SIZE, result_page, result_store
+
+
+# Column tables kept for recently refined result sets
+_MAX_TABLES = 64
+
+_TIME = re.compile(r'(\d{1,2}):(\d{2})\s*$')
+
+
+def _minutes(value: Optional[str]) -> float:
+    # "2026-12-20 18:30" or "18:30" -> minutes after midnight
+    match = _TIME.search(value or '')
+    return int(match[1]) * 60 + int(match[2]) if match else np.nan
+
+
+def _number(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) else np.nan
+
+
+def flight_columns(records: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    '''Columnar view of SerpAPI flight records; missing values are NaN.'''
+    legs = [r.get('flights') or [{}] for r in records]
+    return {
+        'price': np.array([_number(r.get('price')) for r in records]),
+        'duration': np.array([_number(r.get('total_duration')) for r in records]),
+        'stops': np.array([max(len(l) - 1, 0) for l in legs], dtype=np.int16),
+        'depart': np.array([_minutes((l[0].get('departure_airport') or {}).get('time')) for l in legs]),
+        'arrive': np.array([_minutes((l[-1].get('arrival_airport') or {}).get('time')) for l in legs]),
+        'airline': np.array(['/'.join(leg.get('airline') or '' for leg in l).casefold() for l in legs], dtype=object),
+        # The distinct cabins of the legs, e.g. "economy" or "economy/business" for a mixed itinerary
+        'travel_class': np.array(['/'.join(dict.fromkeys((leg.get('travel_class') or '').casefold() for leg in l))
+                                  for l in legs], dtype=object),
+    }
+
+
+def hotel_columns(records: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    '''Columnar view of SerpAPI hotel records; missing values are NaN.'''
+    return {
+        'price': np.array([_number((r.get('rate_per_night') or {}).get('extracted_lowest')) for r in records]),
+        'total_price': np.array([_number((r.get('total_rate') or {}).get('extracted_lowest')) for r in records]),
+        'rating': np.array([_number(r.get('overall_rating')) for r in records]),
+        'reviews': np.array([_number(r.get('reviews')) for r in records]),
+        'hotel_class': np.array([_number(r.get('extracted_hotel_class')) for r in records]),
+    }
+
+
+_COLUMNS = {
+    'flights': flight_columns,
+    'hotels': hotel_columns,
+}
+
+_tables: OrderedDict[str, Dict[str, np.ndarray]] = OrderedDict()
+_tables_lock = threading.Lock()
+
+
+def _table(result_id: str, kind: str, records: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    # Result sets never change once stored, so their columns are built once
+    with _tables_lock:
+        table = _tables.get(result_id)
+        if table is not None:
+            _tables.move_to_end(result_id)
+            return table
+    table = _COLUMNS[kind](records)
+    with _tables_lock:
+        _tables[result_id] = table
+        while len(_tables) > _MAX_TABLES:
+            _tables.popitem(last=False)
+    return table
+
+
+def _at_most(column: np.ndarray, limit: Optional[float]) -> np.ndarray:
+    # NaN compares false, so options missing the value never match a bound
+    return column <= limit if limit is not None else np.ones(len(column), dtype=bool)
+
+
+def _at_least(column: np.ndarray, limit: Optional[float]) -> np.ndarray:
+    return column >= limit if limit is not None else np.ones(len(column), dtype=bool)
+
+
+def _refine(result_id: str, kind: str, build_mask, sort_key: np.ndarray, limit: int) -> Dict[str, Any]:
+    entry = result_store.get(result_id)
+    if entry is None:
+        return {"error": f"Unknown or expired result_id {result_id}, search again."}
+    stored_kind, records = entry
+    if stored_kind != kind:
+        return {"error": f"result_id {result_id} holds {stored_kind}, not {kind}."}
+    table = _table(result_id, kind, records)
+    mask = build_mask(table)
+    matches = np.flatnonzero(mask)
+    # Stable sort with NaN last, so ties keep SerpAPI's own ranking
+    order = matches[np.argsort(sort_key(table)[matches], kind='stable')]
+    if not len(order):
+        return {"error": f"None of the {len(records)} {kind} match those filters."}
+    # The matches become a result set of their own, so they can be paged and expanded too
+    derived_id = result_store.derive(result_id, order.tolist())
+    if derived_id is None:
+        return {"error": f"Unknown or expired result_id {result_id}, search again."}
+    page = result_page(derived_id, limit=limit)
+    page['matches'] = page.pop('total')
+    page['searched'] = len(records)
+    return page
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    minutes = _minutes(value)
+    if np.isnan(minutes):
+        raise ValueError(f'Invalid time {value!r}, use HH:MM')
+    return minutes
+
+
+class FilterFlightsInput(BaseModel):
+    result_id: str = Field(description='The result_id of an earlier flights search')
+    max_price: Optional[float] = Field(default=None, description='Highest price in USD')
+    max_stops: Optional[int] = Field(default=None, description='Most stops allowed, 0 for nonstop only')
+    max_duration_min: Optional[int] = Field(default=None, description='Longest total travel time in minutes')
+    depart_after: Optional[str] = Field(default=None, description='Earliest departure time of day, HH:MM (24h)')
+    depart_before: Optional[str] = Field(default=None, description='Latest departure time of day, HH:MM (24h)')
+    arrive_after: Optional[str] = Field(default=None, description='Earliest arrival time of day, HH:MM (24h)')
+    arrive_before: Optional[str] = Field(default=None, description='Latest arrival time of day, HH:MM (24h)')
+    airline: Optional[str] = Field(default=None, description='Only flights operated by this airline, e.g. Delta')
+    travel_class: Optional[str] = Field(default=None, description='Only flights with every leg in this cabin: '
+                                                                  'Economy, Premium economy, Business or First')
+    sort_by: str = Field(default='price', description='One of price, duration, depart, arrive. Default to price.')
+    limit: int = Field(default=RESULT_PAGE_SIZE, description=f'Number of options to return. Default to {RESULT_PAGE_SIZE}.')
+
+
+_FLIGHT_SORTS = {
+    'price': lambda t: t['price'],
+    'duration': lambda t: t['duration'],
+    'depart': lambda t: t['depart'],
+    'arrive': lambda t: t['arrive'],
+}
+
+
+def filter_flights_result(params: FilterFlightsInput) -> Dict[str, Any]:
+    '''
+    Filter and sort the flights of an earlier search without searching again,
+    e.g. "cheapest nonstop", "arrive before 6pm", "shortest under $500" or
+    "business class on Delta".
+
+    Args:
+        params (FilterFlightsInput): The result ID, filters, sort order and number of options
+
+    Returns:
+        dict: The best matching flights as a new result_id, with the match count.
+    '''
+    if params.sort_by not in _FLIGHT_SORTS:
+        return {"error": f"sort_by must be one of {', '.join(_FLIGHT_SORTS)}"}
+    try:
+        depart_after, depart_before = _parse_time(params.depart_after), _parse_time(params.depart_before)
+        arrive_after, arrive_before = _parse_time(params.arrive_after), _parse_time(params.arrive_before)
+    except ValueError as e:
+        return {"error": str(e)}
+    airline = params.airline.casefold() if params.airline else None
+    travel_class = ' '.join(params.travel_class.split()).casefold() if params.travel_class else None
+
+    def mask(t: Dict[str, np.ndarray]) -> np.ndarray:
+        matched = (_at_most(t['price'], params.max_price)
+                   & _at_most(t['stops'], params.max_stops)
+                   & _at_most(t['duration'], params.max_duration_min)
+                   & _at_least(t['depart'], depart_after) & _at_most(t['depart'], depart_before)
+                   & _at_least(t['arrive'], arrive_after) & _at_most(t['arrive'], arrive_before))
+        if airline:
+            matched &= np.fromiter((airline in a for a in t['airline']), dtype=bool, count=len(matched))
+        if travel_class:
+            matched &= t['travel_class'] == travel_class
+        return matched
+
+    return _refine(params.result_id, 'flights', mask, _FLIGHT_SORTS[params.sort_by], params.limit)
+
+
+class FilterHotelsInput(BaseModel):
+    result_id: str = Field(description='The result_id of an earlier hotels search')
+    max_price_per_night: Optional[float] = Field(default=None, description='Highest nightly price in USD')
+    max_total_price: Optional[float] = Field(default=None, description='Highest price for the whole stay in USD')
+    min_rating: Optional[float] = Field(default=None, description='Lowest guest rating, out of 5')
+    min_class: Optional[int] = Field(default=None, description='Lowest hotel class (stars)')
+    max_class: Optional[int] = Field(default=None, description='Highest hotel class (stars)')
+    min_reviews: Optional[int] = Field(default=None, description='Fewest guest reviews')
+    sort_by: str = Field(default='rating', description='One of rating, price, reviews, class. Default to rating.')
+    limit: int = Field(default=RESULT_PAGE_SIZE, description=f'Number of options to return. Default to {RESULT_PAGE_SIZE}.')
+
+
+# Prices sort cheapest first, everything else best first
+_HOTEL_SORTS = {
+    'rating': lambda t: -t['rating'],
+    'price': lambda t: t['price'],
+    'reviews': lambda t: -t['reviews'],
+    'class': lambda t: -t['hotel_class'],
+}
+
+
+def filter_hotels_result(params: FilterHotelsInput) -> Dict[str, Any]:
+    '''
+    Filter and sort the hotels of an earlier search without searching again,
+    e.g. "4-star under $200" or "best rated with at least 1000 reviews".
+
+    Args:
+        params (FilterHotelsInput): The result ID, filters, sort order and number of options
+
+    Returns:
+        dict: The best matching hotels as a new result_id, with the match count.
+    '''
+    if params.sort_by not in _HOTEL_SORTS:
+        return {"error": f"sort_by must be one of {', '.join(_HOTEL_SORTS)}"}
+
+    def mask(t: Dict[str, np.ndarray]) -> np.ndarray:
+        return (_at_most(t['price'], params.max_price_per_night)
+                & _at_most(t['total_price'], params.max_total_price)
+                & _at_least(t['rating'], params.min_rating)
+                & _at_least(t['hotel_class'], params.min_class) & _at_most(t['hotel_class'], params.max_class)
+                & _at_least(t['reviews'], params.min_reviews))
+
+    return _refine(params.result_id, 'hotels', mask, _HOTEL_SORTS[params.sort_by], params.limit)
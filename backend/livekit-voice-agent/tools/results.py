@@ -0,0 +1,367 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+# Number and total serialized size of full result sets kept for on-demand expansion and paging,
+# and for how long (seconds)
+RESULT_STORE_MAX_ENTRIES = int(os.getenv('RESULT_STORE_MAX_ENTRIES', '1024'))
+RESULT_STORE_MAX_BYTES = int(os.getenv('RESULT_STORE_MAX_BYTES', str(64 * 1024 * 1024)))
+RESULT_STORE_TTL = float(os.getenv('RESULT_STORE_TTL', '1800'))
+# SQLite file shared by every agent and API worker on the host, so any of them can page a result_id
+# another one stored; empty keeps result sets in each process only
+RESULT_STORE_PATH = os.getenv('RESULT_STORE_PATH', os.path.join(tempfile.gettempdir(), 'travel-agent-results.sqlite3'))
+# Options shown to the LLM per page of a flights or hotels result
+RESULT_PAGE_SIZE = int(os.getenv('RESULT_PAGE_SIZE', '5'))
+
+
+class FlightSummary(BaseModel):
+    price: Optional[int] = None
+    airline: Optional[str] = None
+    flight_numbers: Optional[str] = None
+    depart: Optional[str] = None
+    arrive: Optional[str] = None
+    duration_min: Optional[int] = None
+    stops: int = 0
+    layovers: Optional[str] = None
+    travel_class: Optional[str] = None
+
+
+class HotelSummary(BaseModel):
+    name: Optional[str] = None
+    price_per_night: Optional[int] = None
+    total_price: Optional[int] = None
+    rating: Optional[float] = None
+    reviews: Optional[int] = None
+    hotel_class: Optional[int] = None
+    amenities: Optional[List[str]] = None
+
+
+def summarize_flight(flight: Dict[str, Any]) -> FlightSummary:
+    legs = flight.get('flights') or [{}]
+    first, last = legs[0], legs[-1]
+    departure = first.get('departure_airport') or {}
+    arrival = last.get('arrival_airport') or {}
+    airlines = list(dict.fromkeys(leg['airline'] for leg in legs if leg.get('airline')))
+    numbers = [leg['flight_number'] for leg in legs if leg.get('flight_number')]
+    layovers = [lay.get('id') or lay.get('name') for lay in flight.get('layovers') or []]
+    return FlightSummary(
+        price=flight.get('price'),
+        airline='/'.join(airlines) or None,
+        flight_numbers=', '.join(numbers) or None,
+        depart=' '.join(filter(None, [departure.get('id'), departure.get('time')])) or None,
+        arrive=' '.join(filter(None, [arrival.get('id'), arrival.get('time')])) or None,
+        duration_min=flight.get('total_duration'),
+        stops=max(len(legs) - 1, 0),
+        layovers=', '.join(filter(None, layovers)) or None,
+        travel_class=first.get('travel_class'),
+    )
+
+
+def summarize_hotel(hotel: Dict[str, Any]) -> HotelSummary:
+    return HotelSummary(
+        name=hotel.get('name'),
+        price_per_night=(hotel.get('rate_per_night') or {}).get('extracted_lowest'),
+        total_price=(hotel.get('total_rate') or {}).get('extracted_lowest'),
+        rating=hotel.get('overall_rating'),
+        reviews=hotel.get('reviews'),
+        hotel_class=hotel.get('extracted_hotel_class'),
+        amenities=(hotel.get('amenities') or [])[:5] or None,
+    )
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS result_sets (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    records TEXT NOT NULL,
+    parent TEXT,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS result_sets_expires_at ON result_sets (expires_at);
+'''
+
+
+class ResultStore:
+    '''
+    Keeps full tool results out of the conversation, addressable by a short ID.
+
+    The LLM only sees compact summaries of the first page; the records
+    behind them stay here so further pages can be served and a single option
+    expanded on demand without another search. Result sets expire `ttl`
+    seconds after they were stored, and the oldest are dropped once
+    `max_entries` or `max_bytes` is exceeded.
+
+    With a `path`, every result set is also written to a SQLite table there,
+    so a result_id stored by one worker can be paged by any other; each
+    process keeps the sets it has used in memory as well to skip decoding
+    them again. If the database cannot be used, the call falls back to the
+    process's own sets. Subsets made with `derive` are shared as positions in
+    their parent set rather than copies of its records.
+    '''
+
+    def __init__(self, max_entries: int = RESULT_STORE_MAX_ENTRIES, ttl: float = RESULT_STORE_TTL,
+                 max_bytes: int = RESULT_STORE_MAX_BYTES, path: Optional[str] = RESULT_STORE_PATH):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.path = path
+        self._entries: OrderedDict[str, tuple[float, int, str, List[Dict[str, Any]]]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self.errors = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread and process; sqlite connections must not cross either
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _shared_error(self, e: sqlite3.Error) -> None:
+        self.errors += 1
+        print(f'Shared result store unavailable, using this process only: {e}')
+
+    def _share(self, result_id: str, kind: str, data: str, parent: Optional[str], expires_in: float) -> None:
+        try:
+            self._connect().execute(
+                'INSERT INTO result_sets (id, kind, records, parent, size, expires_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (result_id, kind, data, parent, len(data), time.time() + expires_in))
+            self._writes += 1
+            # Size accounting needs a table scan, so only check every few writes
+            if self._writes % 32 == 0:
+                self.evict()
+        except sqlite3.Error as e:
+            self._shared_error(e)
+
+    def put(self, kind: str, records: List[Dict[str, Any]]) -> str:
+        '''Store `records` and return their ID.'''
+        result_id = uuid.uuid4().hex[:12]
+        data = _dumps(records)
+        if self.path:
+            self._share(result_id, kind, data, None, self.ttl)
+        self._remember(result_id, kind, records, len(data), time.monotonic() + self.ttl)
+        return result_id
+
+    def derive(self, result_id: str, order: List[int]) -> Optional[str]:
+        '''
+        Store the records of `result_id` at the positions in `order` as a set
+        of their own, expiring with it, and return its ID; None if it is
+        unknown or expired.
+        '''
+        entry = self._entry(result_id)
+        if entry is None:
+            return None
+        expires_at, size, kind, records = entry
+        derived_id = uuid.uuid4().hex[:12]
+        if self.path:
+            self._share(derived_id, kind, _dumps(order), result_id, expires_at - time.monotonic())
+        # Sized pro rata from the parent set rather than serializing the records again
+        self._remember(derived_id, kind, [records[i] for i in order], size * len(order) // max(len(records), 1),
+                       expires_at)
+        return derived_id
+
+    def _remember(self, result_id: str, kind: str, records: List[Dict[str, Any]], size: int,
+                  expires_at: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if result_id in self._entries:
+                return
+            self._entries[result_id] = (expires_at, size, kind, records)
+            self._bytes += size
+            # The oldest entries are dropped first, along with expired ones at the front. The new entry is
+            # kept even when it alone exceeds max_bytes, so its result_id can still be paged.
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+                                              or next(iter(self._entries.values()))[0] <= now):
+                self._bytes -= self._entries.popitem(last=False)[1][1]
+
+    def _entry(self, result_id: str) -> Optional[tuple[float, int, str, List[Dict[str, Any]]]]:
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[result_id]
+                self._bytes -= entry[1]
+                entry = None
+        if entry is not None or not self.path:
+            return entry
+        # Stored by another process, or dropped from this one's memory first
+        try:
+            row = self._connect().execute('SELECT kind, records, parent, size, expires_at FROM result_sets '
+                                          'WHERE id = ? AND expires_at > ?', (result_id, time.time())).fetchone()
+        except sqlite3.Error as e:
+            self._shared_error(e)
+            return None
+        if row is None:
+            return None
+        kind, data, parent, size, expires_at = row
+        records = json.loads(data)
+        if parent is not None:
+            parent_entry = self._entry(parent)
+            if parent_entry is None:
+                return None
+            parent_records = parent_entry[3]
+            size = parent_entry[1] * len(records) // max(len(parent_records), 1)
+            records = [parent_records[i] for i in records]
+        expires_at = time.monotonic() + expires_at - time.time()
+        self._remember(result_id, kind, records, size, expires_at)
+        return expires_at, size, kind, records
+
+    def get(self, result_id: str) -> Optional[tuple[str, List[Dict[str, Any]]]]:
+        entry = self._entry(result_id)
+        return entry[2:] if entry is not None else None
+
+    def evict(self) -> int:
+        '''Drop expired shared result sets, then the oldest until under `max_entries` and `max_bytes`.'''
+        conn = self._connect()
+        evicted = conn.execute('DELETE FROM result_sets WHERE expires_at <= ?', (time.time(),)).rowcount
+        entries, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM result_sets').fetchone()
+        while entries > self.max_entries or total > self.max_bytes:
+            rows = conn.execute('SELECT id, size FROM result_sets ORDER BY expires_at LIMIT 64').fetchall()
+            if not rows:
+                break
+            conn.execute(f"DELETE FROM result_sets WHERE id IN ({','.join('?' * len(rows))})",
+                         [result_id for result_id, _ in rows])
+            entries -= len(rows)
+            total -= sum(size for _, size in rows)
+            evicted += len(rows)
+        return evicted
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+# Process-wide store shared by all sessions
+result_store = ResultStore()
+
+_SUMMARIZERS = {
+    'flights': summarize_flight,
+    'hotels': summarize_hotel,
+}
+
+
+def store_result(result: Any) -> Optional[str]:
+    '''Keep the flights or hotels of a search result in `result_store` and return its ID.'''
+    if isinstance(result, dict):
+        for kind in _SUMMARIZERS:
+            if isinstance(result.get(kind), list):
+                return result_store.put(kind, result[kind])
+    return None
+
+
+def result_page(result_id: str, offset: int = 0, limit: int = RESULT_PAGE_SIZE,
+                summarize: bool = True) -> Optional[Dict[str, Any]]:
+    '''
+    Return one page of a stored result set, or None if it is unknown or expired.
+
+    The page holds the options' summaries, or the full records with
+    `summarize=False`, along with the total count and, while more remain,
+    the `next_offset` to ask for.
+    '''
+    entry = result_store.get(result_id)
+    if entry is None:
+        return None
+    kind, records = entry
+    offset, limit = max(offset, 0), max(limit, 1)
+    options = records[offset:offset + limit]
+    if summarize:
+        options = [_SUMMARIZERS[kind](r).model_dump(exclude_none=True) for r in options]
+    page = {'result_id': result_id, kind: options, 'offset': offset, 'total': len(records)}
+    if offset + limit < len(records):
+        page['next_offset'] = offset + limit
+    return page
+
+
+def first_page(result: Any, summarize: bool = True) -> Any:
+    '''
+    Store the flights or hotels of a search result in `result_store` and
+    return the first page of them instead, keeping any "notice" about stale
+    data; anything else, such as an error, is returned as-is.
+    '''
+    if not isinstance(result, dict) or 'result_id' in result:
+        # Not a search result, or already a page of a stored one
+        return result
+    result_id = store_result(result)
+    if result_id is None:
+        return result
+    page = result_page(result_id, summarize=summarize)
+    if result.get('notice'):
+        page['notice'] = result['notice']
+    return page
+
+
+def compact_result(result: Any) -> str:
+    '''
+    Serialize a tool result for the LLM.
+
+    Flight and hotel lists are stored in full in `result_store` and replaced
+    by the typed summaries of their first page plus the result ID (see
+    `first_page`); anything else is serialized as-is.
+    '''
+    result = first_page(result)
+    return result if isinstance(result, str) else _dumps(result)
+
+
+class ResultDetailsInput(BaseModel):
+    result_id: str = Field(description='The result_id returned with a flights or hotels search result')
+    index: int = Field(description='Zero-based position of the option within that result')
+
+
+def get_result_details(params: ResultDetailsInput) -> Dict[str, Any]:
+    '''
+    Get the full details of one flight or hotel option from an earlier search,
+    such as layover times, amenities, nearby places or booking links.
+
+    Args:
+        params (ResultDetailsInput): The result ID and option index
+
+    Returns:
+        dict: The full record of the option.
+    '''
+    entry = result_store.get(params.result_id)
+    if entry is None:
+        return {"error": f"Unknown or expired result_id {params.result_id}, search again."}
+    kind, records = entry
+    if not 0 <= params.index < len(records):
+        return {"error": f"index must be between 0 and {len(records) - 1}"}
+    return {kind[:-1]: records[params.index]}
+
+
+class MoreResultsInput(BaseModel):
+    result_id: str = Field(description='The result_id returned with a flights or hotels search result')
+    offset: int = Field(description='Position of the first option to return, usually the next_offset of the previous page')
+    limit: int = Field(default=RESULT_PAGE_SIZE, description=f'Number of options to return. Default to {RESULT_PAGE_SIZE}.')
+
+
+def get_more_results(params: MoreResultsInput) -> Dict[str, Any]:
+    '''
+    Get more flight or hotel options from an earlier search without searching
+    again. Use it when the user asks for more or other options.
+
+    Args:
+        params (MoreResultsInput): The result ID, offset and number of options
+
+    Returns:
+        dict: Summaries of the requested options, the total count and the next offset.
+    '''
+    page = result_page(params.result_id, params.offset, params.limit)
+    if page is None:
+        return {"error": f"Unknown or expired result_id {params.result_id}, search again."}
+    if params.offset >= page['total']:
+        return {"error": f"All {page['total']} options have been shown."}
+    return page
@@ -0,0 +1,155 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Optional, Dict, Any
+
+from tools.upstream import UpstreamGovernor
+
+# Initialize httpx as None to avoid unbound variable errors
+httpx = None
+HTTPX_AVAILABLE = False
+
+# Try to import httpx
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    pass
+
+
+# SerpAPI endpoint, overridable so a local fake upstream can be used
+SERPAPI_BASE_URL = os.getenv('SERPAPI_BASE_URL', 'https://serpapi.com')
+SERPAPI_TIMEOUT = float(os.getenv('SERPAPI_TIMEOUT', '20'))
+SERPAPI_MAX_CONNECTIONS = int(os.getenv('SERPAPI_MAX_CONNECTIONS', '20'))
+
+
+class SearchError(Exception):
+    '''Raised when the upstream search API answers with an error status.'''
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+def is_upstream_fault(error: Exception) -> bool:
+    '''Whether a failed search says something about the upstream's health rather than the request.'''
+    if isinstance(error, SearchError) and error.status is not None:
+        return error.status == 429 or error.status >= 500
+    return True
+
+
+class SearchClient:
+    '''
+    Pooled HTTP client for the SerpAPI search endpoint.
+
+    One keep-alive connection pool is kept for synchronous callers and one per
+    running event loop for asynchronous callers, so repeated searches reuse
+    connections instead of paying a TCP/TLS handshake every time. Every
+    request goes through the `governor`, which rate limits, bounds concurrency
+    and stops calling the upstream while it is failing.
+    '''
+
+    def __init__(self, base_url: Optional[str] = None, timeout: Optional[float] = None,
+                 max_connections: Optional[int] = None, governor: Optional[UpstreamGovernor] = None):
+        self.base_url = (base_url or SERPAPI_BASE_URL).rstrip('/')
+        self.timeout = timeout if timeout is not None else SERPAPI_TIMEOUT
+        self.max_connections = max_connections or SERPAPI_MAX_CONNECTIONS
+        self.governor = governor or UpstreamGovernor(is_fault=is_upstream_fault)
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _limits(self):
+        return httpx.Limits(max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_connections)
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(base_url=self.base_url, timeout=self.timeout, limits=self._limits())
+            return self._client
+
+    def _get_async_client(self):
+        # httpx async connections are bound to the loop that opened them
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self._limits())
+            self._async_clients[loop] = client
+        return client
+
+    @staticmethod
+    def _prepare(params: Dict[str, Any]) -> Dict[str, Any]:
+        query = {k: v for k, v in params.items() if v is not None}
+        query.setdefault('api_key', os.environ.get('SERPAPI_API_KEY'))
+        query.setdefault('output', 'json')
+        return query
+
+    @staticmethod
+    def _parse(response) -> Dict[str, Any]:
+        if response.status_code >= 400:
+            try:
+                detail = response.json().get('error', response.text)
+            except ValueError:
+                detail = response.text
+            raise SearchError(f'SerpAPI returned {response.status_code}: {detail}', response.status_code)
+        return response.json()
+
+    def search(self, params: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        '''Run a search on the shared connection pool and return the decoded JSON.'''
+        def call():
+            response = self._get_client().get('/search', params=self._prepare(params),
+                                              timeout=timeout if timeout is not None else self.timeout)
+            return self._parse(response)
+
+        return self.governor.call(call)
+
+    async def asearch(self, params: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        '''Async version of `search` that does not block the event loop.'''
+        async def call():
+            response = await self._get_async_client().get('/search', params=self._prepare(params),
+                                                           timeout=timeout if timeout is not None else self.timeout)
+            return self._parse(response)
+
+        return await self.governor.acall(call)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self) -> None:
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+        self.close()
+
+
+_search_client: Optional[SearchClient] = None
+_search_client_lock = threading.Lock()
+
+
+def get_search_client() -> SearchClient:
+    '''Return the process-wide search client, creating it on first use.'''
+    global _search_client
+    with _search_client_lock:
+        if _search_client is None:
+            _search_client = SearchClient()
+        return _search_client
+
+
+async def aclose_search_client() -> None:
+    '''Release the pooled connections of the process-wide search client.'''
+    if _search_client is not None:
+        await _search_client.aclose()
+
+
+def search_unavailable() -> Optional[Dict[str, Any]]:
+    '''Return an error payload when searches cannot be made, otherwise None.'''
+    if not HTTPX_AVAILABLE:
+        return {"error": "httpx is not available. Please install httpx package."}
+    if not os.environ.get('SERPAPI_API_KEY'):
+        return {"error": "SERPAPI_API_KEY environment variable is not set."}
+    return None
@@ -0,0 +1,401 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from metrics import (
+    UPSTREAM_BREAKER_STATE,
+    UPSTREAM_CONCURRENCY_LIMIT,
+    UPSTREAM_RATE_LIMIT_FALLBACKS,
+    UPSTREAM_REJECTIONS,
+    UPSTREAM_THROTTLE_SECONDS,
+)
+
+
+# Host-wide request rate towards SerpAPI (requests per second, 0 disables) and burst size
+SERPAPI_RATE_LIMIT = float(os.getenv('SERPAPI_RATE_LIMIT', '10'))
+SERPAPI_RATE_BURST = float(os.getenv('SERPAPI_RATE_BURST', '20'))
+# Longest a search may wait for a rate limit token before failing fast
+SERPAPI_RATE_MAX_WAIT = float(os.getenv('SERPAPI_RATE_MAX_WAIT', '5'))
+# Token bucket state shared by every process on the host
+SERPAPI_RATE_LIMIT_PATH = os.getenv('SERPAPI_RATE_LIMIT_PATH',
+                                    os.path.join(tempfile.gettempdir(), 'travel-agent-ratelimit.sqlite3'))
+# Concurrent upstream searches per process shrink towards the minimum while latency exceeds the target
+SERPAPI_MIN_CONCURRENCY = int(os.getenv('SERPAPI_MIN_CONCURRENCY', '2'))
+SERPAPI_MAX_CONCURRENCY = int(os.getenv('SERPAPI_MAX_CONCURRENCY', os.getenv('SERPAPI_MAX_CONNECTIONS', '20')))
+SERPAPI_TARGET_LATENCY = float(os.getenv('SERPAPI_TARGET_LATENCY', '4'))
+# Consecutive upstream failures that open the circuit, and how long it stays open
+SERPAPI_BREAKER_FAILURES = int(os.getenv('SERPAPI_BREAKER_FAILURES', '5'))
+SERPAPI_BREAKER_COOLDOWN = float(os.getenv('SERPAPI_BREAKER_COOLDOWN', '30'))
+
+
+class UpstreamUnavailable(Exception):
+    '''Raised without calling the upstream when it is rate limited or its circuit is open.'''
+
+
+class TokenBucket:
+    '''
+    Token bucket rate limiter, shared across processes through SQLite.
+
+    Tokens refill at `rate` per second up to `burst`. With a `path`, the
+    bucket lives in a small SQLite table updated in an immediate transaction,
+    so all processes on the host draw from one budget; without one, it is a
+    per-process bucket. A call that cannot use the database, even after one
+    retry on a new connection, is served by the per-process bucket instead,
+    and the next call tries the database again.
+    '''
+
+    def __init__(self, rate: float = SERPAPI_RATE_LIMIT, burst: float = SERPAPI_RATE_BURST,
+                 path: Optional[str] = SERPAPI_RATE_LIMIT_PATH, name: str = 'serpapi'):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.path = path
+        self.name = name
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.time()
+        # Whether the last call fell back to the per-process bucket, so only changes are logged
+        self.degraded = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS token_bucket '
+                         '(name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _take(self, tokens: float, updated: float) -> tuple[float, float, float]:
+        # Returns the new state and how long to wait before a token is available
+        now = time.time()
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            return tokens - 1, now, 0.0
+        return tokens, now, (1 - tokens) / self.rate
+
+    def _disconnect(self) -> None:
+        conn, self._local.conn = getattr(self._local, 'conn', None), None
+        if conn is not None:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def _take_shared(self) -> float:
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM token_bucket WHERE name = ?', (self.name,)).fetchone()
+            tokens, updated, wait = self._take(*(row or (self.burst, time.time())))
+            conn.execute('INSERT OR REPLACE INTO token_bucket (name, tokens, updated) VALUES (?, ?, ?)',
+                         (self.name, tokens, updated))
+        finally:
+            conn.execute('COMMIT')
+        return wait
+
+    def try_acquire(self) -> float:
+        '''Take a token and return 0, or return the seconds to wait before retrying.'''
+        if self.rate <= 0:
+            return 0.0
+        if self.path:
+            error = None
+            for _ in range(2):
+                try:
+                    wait = self._take_shared()
+                except sqlite3.Error as e:
+                    # Retry once on a new connection, e.g. after a lock timeout or a replaced file
+                    error = e
+                    self._disconnect()
+                    continue
+                if self.degraded:
+                    print(f'Shared rate limiter {self.name} is available again')
+                    self.degraded = False
+                return wait
+            if not self.degraded:
+                print(f'Shared rate limiter {self.name} unavailable, limiting per process until it recovers: {error}')
+                self.degraded = True
+            UPSTREAM_RATE_LIMIT_FALLBACKS.labels(self.name).inc()
+        with self._lock:
+            self._tokens, self._updated, wait = self._take(self._tokens, self._updated)
+            return wait
+
+    async def acquire(self, max_wait: float = SERPAPI_RATE_MAX_WAIT) -> None:
+        '''Wait for a token, raising UpstreamUnavailable if that would take longer than `max_wait`.'''
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = await asyncio.to_thread(self.try_acquire) if self.path else self.try_acquire()
+            if wait == 0:
+                return
+            if time.monotonic() + wait > deadline:
+                UPSTREAM_REJECTIONS.labels('rate_limited').inc()
+                raise UpstreamUnavailable('Search rate limit reached, please try again in a moment.')
+            UPSTREAM_THROTTLE_SECONDS.inc(wait)
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, max_wait: float = SERPAPI_RATE_MAX_WAIT) -> None:
+        '''Blocking version of `acquire`.'''
+        deadline = time.monotonic() + max_wait
+        while (wait := self.try_acquire()) > 0:
+            if time.monotonic() + wait > deadline:
+                UPSTREAM_REJECTIONS.labels('rate_limited').inc()
+                raise UpstreamUnavailable('Search rate limit reached, please try again in a moment.')
+            UPSTREAM_THROTTLE_SECONDS.inc(wait)
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    '''
+    Concurrency limit that adapts to upstream latency (AIMD).
+
+    Each call that finishes within `target_latency` raises the limit by
+    1/limit, so it grows by about one per round of calls; a slower or failed
+    call cuts it by a quarter, at most once per `target_latency` so one slow
+    burst is not punished repeatedly. Waiters from any thread or event loop
+    are served in FIFO order.
+    '''
+
+    def __init__(self, min_limit: int = SERPAPI_MIN_CONCURRENCY, max_limit: int = SERPAPI_MAX_CONCURRENCY,
+                 target_latency: float = SERPAPI_TARGET_LATENCY):
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.target_latency = target_latency
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+        UPSTREAM_CONCURRENCY_LIMIT.set(self.limit)
+
+    def _has_room(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def has_spare(self) -> bool:
+        '''True while nothing is queued and at most half of the limit is in use.'''
+        with self._lock:
+            return not self._waiters and self.in_flight < int(self.limit) // 2
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._has_room() and not self._waiters:
+                self.in_flight += 1
+                return
+            waiter = (loop, future)
+            self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove(waiter)
+                    queued = True
+                except ValueError:
+                    queued = False
+            # A slot handed over just before the cancellation must be given back
+            if not queued and future.done() and not future.cancelled():
+                self._release_slot()
+            raise
+
+    def acquire_sync(self) -> None:
+        event = threading.Event()
+        with self._lock:
+            if self._has_room() and not self._waiters:
+                self.in_flight += 1
+                return
+            self._waiters.append((None, event))
+        event.wait()
+
+    def _wake(self, future: asyncio.Future) -> None:
+        if future.done():
+            # The waiter was cancelled before it got the slot
+            self._release_slot()
+        else:
+            future.set_result(None)
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            woken = []
+            while self._waiters and self._has_room():
+                woken.append(self._waiters.popleft())
+                self.in_flight += 1
+        for loop, waiter in woken:
+            if loop is None:
+                waiter.set()
+            else:
+                loop.call_soon_threadsafe(self._wake, waiter)
+
+    def release(self, latency: Optional[float], ok: bool = True) -> None:
+        '''Give back a slot and adapt the limit to how the call went; None for a call that never finished.'''
+        if latency is None:
+            self._release_slot()
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not ok or latency > self.target_latency:
+                if now - self._last_decrease >= self.target_latency:
+                    self.limit = max(self.min_limit, self.limit * 0.75)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            limit = self.limit
+        UPSTREAM_CONCURRENCY_LIMIT.set(limit)
+        self._release_slot()
+
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    '''
+    Stops calling an unhealthy upstream.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls fail immediately for `cooldown` seconds. Then a single probe call
+    is let through (half-open): success closes the circuit, failure opens it
+    for another cooldown.
+    '''
+
+    def __init__(self, failure_threshold: int = SERPAPI_BREAKER_FAILURES,
+                 cooldown: float = SERPAPI_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        UPSTREAM_BREAKER_STATE.set(_STATE_VALUES[CLOSED])
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            print(f'Upstream circuit {self.state} -> {state}')
+            self.state = state
+            UPSTREAM_BREAKER_STATE.set(_STATE_VALUES[state])
+
+    def before_call(self) -> bool:
+        '''
+        Raise UpstreamUnavailable unless a call may go through now. Returns
+        True if the call is the half-open probe.
+        '''
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED:
+                return False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+        UPSTREAM_REJECTIONS.labels('circuit_open').inc()
+        raise UpstreamUnavailable('Search is temporarily unavailable, please try again in a minute.')
+
+    def abandon_probe(self) -> None:
+        '''Let another call probe when the probe never reached the upstream.'''
+        with self._lock:
+            self._probing = False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.failures = 0
+                self._set_state(CLOSED)
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+
+class UpstreamGovernor:
+    '''
+    Rate limiting, adaptive concurrency and circuit breaking around upstream calls.
+
+    A call first passes the circuit breaker, then takes a rate limit token and
+    a concurrency slot. Its outcome feeds both the breaker and the limiter.
+    `is_fault` decides which exceptions count against the upstream's health;
+    errors caused by the request itself, such as invalid parameters, do not.
+    '''
+
+    def __init__(self, bucket: Optional[TokenBucket] = None, limiter: Optional[AdaptiveLimiter] = None,
+                 breaker: Optional[CircuitBreaker] = None, is_fault: Callable[[Exception], bool] = lambda e: True):
+        self.bucket = bucket or TokenBucket()
+        self.limiter = limiter or AdaptiveLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.is_fault = is_fault
+
+    async def acall(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        probe = self.breaker.before_call()
+        try:
+            await self.bucket.acquire()
+            await self.limiter.acquire()
+        except BaseException:
+            if probe:
+                self.breaker.abandon_probe()
+            raise
+        ok = None
+        start = time.monotonic()
+        try:
+            result = await call()
+            ok = True
+            return result
+        except Exception as e:
+            ok = not self.is_fault(e)
+            raise
+        finally:
+            self._settle(probe, time.monotonic() - start, ok)
+
+    def call(self, call: Callable[[], Any]) -> Any:
+        probe = self.breaker.before_call()
+        try:
+            self.bucket.acquire_sync()
+            self.limiter.acquire_sync()
+        except BaseException:
+            if probe:
+                self.breaker.abandon_probe()
+            raise
+        ok = None
+        start = time.monotonic()
+        try:
+            result = call()
+            ok = True
+            return result
+        except Exception as e:
+            ok = not self.is_fault(e)
+            raise
+        finally:
+            self._settle(probe, time.monotonic() - start, ok)
+
+    def has_spare_capacity(self) -> bool:
+        '''Whether optional calls, such as prefetches, can go through without delaying others.'''
+        return self.breaker.state == CLOSED and self.limiter.has_spare()
+
+    def _settle(self, probe: bool, latency: float, ok: Optional[bool]) -> None:
+        if ok is None:
+            # Cancelled, e.g. by the user interrupting; says nothing about the upstream
+            self.limiter.release(None)
+            if probe:
+                self.breaker.abandon_probe()
+            return
+        self.limiter.release(latency, ok)
+        self.breaker.record(ok)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'concurrency_limit': round(self.limiter.limit, 2),
+            'in_flight': self.limiter.in_flight,
+            'rate_limit': self.bucket.rate,
+        }
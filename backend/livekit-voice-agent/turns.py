@@ -0,0 +1,123 @@
+import asyncio
+import os
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+from metrics import TURN_QUEUE_DEPTH, TURN_QUEUE_SECONDS, TURNS_SUPERSEDED
+
+
+# Chat turns running graph work at once per process; further turns wait for a slot
+MAX_CONCURRENT_TURNS = int(os.getenv('MAX_CONCURRENT_TURNS', '8'))
+
+T = TypeVar('T')
+
+
+class TurnLimiter:
+    '''
+    Caps the chat turns running at once across all sessions of a process.
+
+    Turns past `limit` wait in FIFO order; how many are waiting and for how
+    long is exported as `travel_agent_turn_queue_depth` and
+    `travel_agent_turn_queue_seconds`.
+    '''
+
+    def __init__(self, limit: int = MAX_CONCURRENT_TURNS):
+        self.limit = max(limit, 1)
+        self.waiting = 0
+        self.running = 0
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        # Semaphores are bound to the loop they first wait on
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.limit)
+        self.waiting += 1
+        TURN_QUEUE_DEPTH.inc()
+        start = time.perf_counter()
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+            TURN_QUEUE_DEPTH.dec()
+            TURN_QUEUE_SECONDS.observe(time.perf_counter() - start)
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            semaphore.release()
+
+
+_turn_limiter = TurnLimiter()
+
+
+class Turn:
+    '''One user turn of a session; stale as soon as a newer turn starts.'''
+
+    __slots__ = ('generation', 'interrupted', '_manager')
+
+    def __init__(self, manager: 'TurnManager', generation: int, interrupted: bool):
+        self.generation = generation
+        # Whether an earlier turn was cancelled part way, possibly leaving tool calls unanswered
+        self.interrupted = interrupted
+        self._manager = manager
+
+    @property
+    def current(self) -> bool:
+        return self._manager.generation == self.generation
+
+
+class TurnManager:
+    '''
+    Runs a session's chat turns so that a new turn supersedes the one in flight.
+
+    Every turn bumps the session's generation and cancels the previous turn's
+    task, which cancels its pending LLM and tool calls. The new turn starts
+    once the old one has unwound. A turn must check `turn.current` before it
+    publishes anything, so a reply that lost the race is never sent. Turns of
+    all sessions share `limiter`, so a busy worker queues turns instead of
+    running them all at once.
+    '''
+
+    def __init__(self, limiter: Optional[TurnLimiter] = None):
+        self.limiter = limiter or _turn_limiter
+        self.generation = 0
+        self.superseded = 0
+        self._task: Optional[asyncio.Task] = None
+        self._interrupted = False
+
+    def supersede(self) -> None:
+        '''Make the turn in flight stale and cancel it, e.g. when the user barges in.'''
+        self.generation += 1
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            self._interrupted = True
+            self.superseded += 1
+            TURNS_SUPERSEDED.inc()
+
+    async def run(self, work: Callable[[Turn], Awaitable[T]]) -> Optional[T]:
+        '''Run `work` as the session's current turn; None if a newer turn superseded it.'''
+        previous = self._task
+        self.supersede()
+        turn = Turn(self, self.generation, self._interrupted)
+        self._interrupted = False
+
+        async def guarded() -> T:
+            if previous is not None:
+                await asyncio.wait([previous])
+            async with self.limiter.slot():
+                return await work(turn)
+
+        task = self._task = asyncio.create_task(guarded())
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                # The caller itself was cancelled, not superseded
+                raise
+            return None